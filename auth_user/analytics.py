@@ -0,0 +1,175 @@
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Holdings
+from .response_cache import STOCKS_SCOPE, get_config as get_cache_config, get_version
+from .valuation import build_price_matrix, money, price_rows
+
+
+'''
+Portfolio analytics. Configure through settings.PORTFOLIO_ANALYTICS:
+
+    WINDOW_DAYS     days of price history behind the risk metrics
+    TOP             exposures listed under `top` unless ?top= is given
+    BENCHMARK       symbol beta is measured against unless ?benchmark= is given
+    RISK_FREE_RATE  annual rate subtracted in the Sharpe ratio
+    TRADING_DAYS    periods per year used to annualize
+
+Results are memoized in the response cache (RESPONSE_CACHE['CACHE'], unless it is
+disabled), keyed by the portfolio's version and the stocks version, which writes to
+the portfolio or its holdings and to stocks (and load_prices) bump, plus the as-of
+date and parameters.
+'''
+DEFAULTS = {
+    'WINDOW_DAYS': 365,
+    'TOP': 5,
+    'BENCHMARK': None,
+    'RISK_FREE_RATE': 0.0,
+    'TRADING_DAYS': 252,
+}
+MAX_TOP = 50
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'PORTFOLIO_ANALYTICS', {})}
+
+
+def cached_analytics(portfolio_id, as_of, benchmark_id=None, top=None):
+    """
+    Memoized portfolio_analytics, per (portfolio version, stocks version, as-of date).
+    """
+    config = get_cache_config()
+    if not config['ENABLED']:
+        return portfolio_analytics(portfolio_id, as_of, benchmark_id, top)
+    cache = caches[config['CACHE']]
+    key = (
+        f"{config['KEY_PREFIX']}analytics:{portfolio_id}:{get_version(f'portfolio:{portfolio_id}')}:"
+        f"{get_version(STOCKS_SCOPE)}:{as_of.isoformat()}:{benchmark_id}:{top}"
+    )
+    result = cache.get(key)
+    if result is None:
+        result = portfolio_analytics(portfolio_id, as_of, benchmark_id, top)
+        cache.set(key, result, config['TTL'])
+    return result
+
+
+def portfolio_analytics(portfolio_id, as_of, benchmark_id=None, top=None):
+    """
+    Allocation, concentration and risk metrics for a portfolio's current holdings,
+    priced as of `as_of`.
+
+    One query loads the holdings and one the window's closes for them and the
+    benchmark. Everything else is array arithmetic: the price matrix (days x stocks)
+    times the quantity vector gives the value series, its row-over-row ratios the
+    return matrix, and weights, sector sums (bincount), the Herfindahl index and the
+    risk statistics are reductions over those arrays. A holding with no close yet is
+    valued at its purchase price, as in the valuation endpoint. Market values are
+    quantized decimal strings; weights and risk statistics are floats.
+    """
+    config = get_config()
+    top = top or config['TOP']
+    holdings = list(
+        Holdings.objects.filter(portfolio_id=portfolio_id).order_by('id')
+        .values_list('id', 'stock_id', 'stock__symbol', 'stock__sector', 'quantity', 'purchase_price')
+    )
+    start = as_of - timedelta(days=config['WINDOW_DAYS'])
+    result = {'as_of': as_of, 'start': start}
+    if not holdings:
+        return {**result, 'market_value': money(0), 'holdings': [], 'sectors': [], 'hhi': None,
+                'effective_holdings': None, 'top': [], 'risk': None}
+
+    ids, stock_ids, symbols, sectors, quantities, purchase_prices = zip(*holdings)
+    quantities = np.array(quantities, dtype=float)
+    purchase_prices = np.array(purchase_prices, dtype=float)
+
+    # The benchmark rides along in the same matrix, as an extra column unless it is held
+    columns = list(stock_ids)
+    if benchmark_id is not None and benchmark_id not in columns:
+        columns.append(benchmark_id)
+    dates, matrix = build_price_matrix(list(price_rows(columns, start, as_of)), columns)
+    benchmark = matrix[:, columns.index(benchmark_id)] if benchmark_id is not None else None
+    prices = np.where(np.isnan(matrix[:, :len(stock_ids)]), purchase_prices, matrix[:, :len(stock_ids)])
+    last_prices = prices[-1] if len(dates) else purchase_prices
+
+    market_values = quantities * last_prices
+    total = market_values.sum()
+    weights = market_values / total if total else np.zeros_like(market_values)
+
+    sector_names, sector_index = np.unique([sector or '' for sector in sectors], return_inverse=True)
+    sector_values = np.bincount(sector_index, weights=market_values, minlength=len(sector_names))
+    sector_order = np.argsort(-sector_values, kind='stable')
+
+    hhi = float(np.square(weights).sum())
+    top_order = np.argsort(-weights, kind='stable')[:top]
+
+    return {
+        **result,
+        'market_value': money(total),
+        'holdings': [
+            {
+                'id': ids[i], 'symbol': symbols[i], 'sector': sectors[i] or None,
+                'market_value': money(market_values[i]), 'weight': _round(weights[i], 6),
+            }
+            for i in range(len(ids))
+        ],
+        'sectors': [
+            {
+                'sector': str(sector_names[i]) or None, 'market_value': money(sector_values[i]),
+                'weight': _round(sector_values[i] / total if total else 0, 6),
+            }
+            for i in sector_order
+        ],
+        'hhi': _round(hhi, 6),
+        'effective_holdings': _round(1 / hhi, 4) if hhi else None,
+        'top': [{'symbol': symbols[i], 'weight': _round(weights[i], 6)} for i in top_order],
+        'risk': _risk(dates, prices @ quantities, benchmark, config),
+    }
+
+
+def _risk(dates, series, benchmark, config):
+    """
+    Volatility, Sharpe ratio, max drawdown and beta from the daily value series;
+    None until the window holds two days of prices.
+    """
+    if len(dates) < 2:
+        return None
+    periods = config['TRADING_DAYS']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily_returns = series[1:] / series[:-1] - 1
+    returns = daily_returns[np.isfinite(daily_returns)]
+    volatility = returns.std(ddof=1) * np.sqrt(periods) if len(returns) > 1 else None
+    annual_return = returns.mean() * periods if len(returns) else None
+    sharpe = (annual_return - config['RISK_FREE_RATE']) / volatility if volatility else None
+    drawdowns = series / np.maximum.accumulate(series) - 1
+
+    beta = None
+    if benchmark is not None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            benchmark_returns = benchmark[1:] / benchmark[:-1] - 1
+        # Only days where both moved from a known close
+        valid = np.isfinite(benchmark_returns) & np.isfinite(daily_returns)
+        if valid.sum() > 1:
+            covariance = np.cov(daily_returns[valid], benchmark_returns[valid])
+            beta = covariance[0, 1] / covariance[1, 1] if covariance[1, 1] else None
+
+    return {
+        'start': dates[0],
+        'end': dates[-1],
+        'observations': len(dates),
+        'volatility': _round_or_none(volatility, 6),
+        'annual_return': _round_or_none(annual_return, 6),
+        'sharpe': _round_or_none(sharpe, 4),
+        'max_drawdown': _round(np.nan_to_num(drawdowns.min()), 6),
+        'beta': _round_or_none(beta, 4),
+    }
+
+
+def _round(value, places=4):
+    return round(float(value), places)
+
+
+def _round_or_none(value, places):
+    return None if value is None else _round(value, places)
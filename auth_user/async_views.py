@@ -0,0 +1,109 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.shortcuts import aget_object_or_404
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+from .authentication import CachedTokenAuthentication
+from .models import Portfolio
+from .routers import use_replicas
+from .valuation import price_rows, valuation_window, value_portfolio
+from .views import HoldingsViewSet, PortfolioViewSet, get_date_param
+
+
+'''
+Async read endpoints for deployments served over ASGI (seed/asgi.py). They reuse the
+sync viewsets' querysets, filters, pagination and serializers, so responses match the
+sync endpoints byte for byte, but database waits no longer pin a worker thread.
+'''
+
+
+def async_api_view(viewset_class, action):
+    """
+    Turns a coroutine into a GET-only view that authenticates and renders like DRF.
+
+    The coroutine receives a `viewset_class` instance bound to the request plus the
+    URL kwargs, and returns the response data.
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        async def wrapper(request, **kwargs):
+            drf_request = Request(request, authenticators=())
+            view = viewset_class(request=drf_request, args=(), kwargs=kwargs, format_kwarg=None, action=action)
+            try:
+                if request.method != 'GET':
+                    raise exceptions.MethodNotAllowed(request.method)
+                authenticated = await CachedTokenAuthentication().aauthenticate(request)
+                if authenticated is None:
+                    raise exceptions.NotAuthenticated()
+                drf_request.user, drf_request.auth = authenticated
+                # Every async view is a read
+                use_replicas(drf_request.user.pk)
+                data = await view_func(view, **kwargs)
+            except Exception as exc:
+                response = exception_handler(exc, {'request': drf_request, 'view': view})
+                if response is None:
+                    raise
+                return render(response.data, response.status_code, response.headers)
+            return render(data, status.HTTP_200_OK)
+        return wrapper
+    return decorator
+
+
+def render(data, status_code, headers=None):
+    response = HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+    for name, value in (headers or {}).items():
+        response[name] = value
+    if status_code == status.HTTP_401_UNAUTHORIZED:
+        response['WWW-Authenticate'] = CachedTokenAuthentication.keyword
+    return response
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def serialize(view, instance, many=False):
+    serializer = view.get_serializer(instance, many=many)
+    if view.request.query_params.get('include'):
+        # ?include=market_value calls the quote provider, which may block on the network
+        return await sync_to_async(lambda: serializer.data)()
+    return serializer.data
+
+
+@async_api_view(PortfolioViewSet, 'list')
+async def portfolio_list(view):
+    page = await view.paginator.apaginate_queryset(view.get_queryset(), view.request, view)
+    return view.paginator.get_paginated_response(await serialize(view, page, many=True)).data
+
+
+@async_api_view(PortfolioViewSet, 'retrieve')
+async def portfolio_detail(view, pk):
+    portfolio = await aget_object_or_404(view.get_queryset(), pk=pk)
+    return await serialize(view, portfolio)
+
+
+@async_api_view(PortfolioViewSet, 'valuation')
+async def portfolio_valuation(view, pk):
+    """
+    Async counterpart of PortfolioViewSet.valuation. The async ORM runs every query on
+    the one thread-sensitive executor, so the lookups are awaited in sequence; the
+    portfolio goes first so an unknown id 404s before the other two queries run.
+    """
+    request = view.request
+    start, end = valuation_window(get_date_param(request, 'start'), get_date_param(request, 'end'))
+    portfolio = await aget_object_or_404(Portfolio.objects.filter(user=request.user), pk=pk)
+    holdings = await alist(view.get_holdings_queryset().filter(portfolio=portfolio))
+    rows = await alist(price_rows([holding.stock_id for holding in holdings], start, end))
+    return {'portfolio': portfolio.id, **value_portfolio(holdings, start=start, end=end, rows=rows)}
+
+
+@async_api_view(HoldingsViewSet, 'list')
+async def holdings_list(view):
+    queryset = view.filter_queryset(view.get_queryset())
+    page = await view.paginator.apaginate_queryset(queryset, view.request, view)
+    return view.paginator.get_paginated_response(await serialize(view, page, many=True)).data
@@ -0,0 +1,107 @@
+import copy
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+
+from .cache import TTLCache
+
+
+'''
+Token authentication with the token/user lookup cached per process and, optionally,
+in a shared Django cache. Configure through settings.TOKEN_AUTH_CACHE:
+
+    MAX_SIZE     entries kept in the in-process LRU
+    TTL          seconds an entry lives in the in-process LRU
+    SHARED_CACHE alias from settings.CACHES used as a second level, or None
+    SHARED_TTL   seconds an entry lives in the shared cache
+
+Entries are written on commit of token creation and evicted when a token is deleted or
+its user is saved (deactivated, password changed). The cached user carries no password
+hash: the field is deferred, and loads from the database if a view ever reads it. Other processes only see evictions
+through the shared cache, so TTL bounds how long a revoked token survives in their LRU.
+'''
+DEFAULTS = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    'SHARED_CACHE': None,
+    'SHARED_TTL': 300,
+}
+SHARED_KEY_PREFIX = 'auth_token:'
+
+_local_cache = None
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+def get_local_cache():
+    global _local_cache
+    if _local_cache is None:
+        config = get_config()
+        _local_cache = TTLCache(max_size=config['MAX_SIZE'], ttl=config['TTL'])
+    return _local_cache
+
+
+def get_shared_cache():
+    alias = get_config()['SHARED_CACHE']
+    return caches[alias] if alias else None
+
+
+def cache_token(token):
+    """
+    Stores a token, with its user loaded, in both cache levels.
+    """
+    token = copy.deepcopy(token)
+    # Authentication never needs the hash, and it must not be pickled into a shared cache.
+    # A field missing from __dict__ is deferred, so save() also leaves it untouched.
+    token.user.__dict__.pop('password', None)
+    get_local_cache().set(token.key, token)
+    shared = get_shared_cache()
+    if shared is not None:
+        shared.set(SHARED_KEY_PREFIX + token.key, token, get_config()['SHARED_TTL'])
+
+
+def invalidate_token(key):
+    """
+    Evicts a token key from both cache levels.
+    """
+    get_local_cache().delete(key)
+    shared = get_shared_cache()
+    if shared is not None:
+        shared.delete(SHARED_KEY_PREFIX + key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for TokenAuthentication that skips the Token/user join
+    when the key is cached.
+    """
+    def authenticate_credentials(self, key):
+        token = get_local_cache().get(key)
+        if token is None:
+            shared = get_shared_cache()
+            token = shared.get(SHARED_KEY_PREFIX + key) if shared is not None else None
+            if token is not None:
+                get_local_cache().set(key, token)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache_token(token)
+        # Hand each request its own copy so views never mutate the cached instances
+        token = copy.deepcopy(token)
+        return (token.user, token)
+
+    async def aauthenticate(self, request):
+        """
+        Async entry point used by the async views. Locally cached tokens are served on
+        the event loop; misses and malformed headers go through authenticate() in a thread.
+        """
+        auth = get_authorization_header(request).split()
+        if len(auth) == 2 and auth[0].lower() == self.keyword.lower().encode():
+            token = get_local_cache().get(auth[1].decode(errors='replace'))
+            if token is not None:
+                token = copy.deepcopy(token)
+                return (token.user, token)
+        return await sync_to_async(self.authenticate)(request)
@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+UserModel = get_user_model()
+
+
+class EmailTokenBackend(ModelBackend):
+    """
+    ModelBackend that joins the user's auth token onto the credential lookup, so
+    login can hand back the existing token without a second query.
+    """
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.select_related('auth_token').get(
+                **{UserModel.USERNAME_FIELD: username}
+            )
+        except UserModel.DoesNotExist:
+            # Hash anyway so unknown emails take as long as wrong passwords
+            UserModel().set_password(password)
+            return None
+        # check_password re-hashes with the preferred hasher when the stored hash is outdated
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -1,8 +1,13 @@
-from django_filters import filters
+from django_filters import rest_framework as filters
+from rest_framework.filters import OrderingFilter
 from .models import Stock, Holdings
 
 
 class StocksFilter(filters.FilterSet):
+    # Symbol autocomplete: symbols are stored upper-case, so a case-sensitive
+    # prefix match on the upper-cased input can use the symbol's pattern index.
+    prefix = filters.CharFilter(method='filter_prefix')
+
     class Meta:
         model = Stock
         fields = {
@@ -10,6 +15,9 @@ class StocksFilter(filters.FilterSet):
             'symbol': ['exact', 'icontains'],
         }
 
+    def filter_prefix(self, queryset, name, value):
+        return queryset.filter(symbol__startswith=value.strip().upper())
+
     
 class HoldingsFilter(filters.FilterSet):
     class Meta:
@@ -19,4 +27,20 @@ class HoldingsFilter(filters.FilterSet):
             'quantity': ['exact', 'gte', 'lte'],
             'purchase_price': ['exact', 'gte', 'lte'],
             'purchase_date': ['exact', 'gte', 'lte'],
-        }
\ No newline at end of file
+        }
+
+
+class AliasedOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter that accepts the view's ordering_fields and orders by the names
+    they map to in view.ordering_aliases, e.g. an aggregate over the field.
+    """
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        aliases = view.ordering_aliases
+        return [
+            ('-' if field.startswith('-') else '') + aliases.get(field.lstrip('-'), field.lstrip('-'))
+            for field in ordering
+        ]
@@ -0,0 +1,12 @@
+from django.contrib.auth.hashers import Argon2PasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2id at the OWASP baseline (19 MiB, 2 passes, 1 lane). A login costs tens of
+    milliseconds instead of the hundreds PBKDF2 needs, while staying memory-hard.
+    Hashes made with other parameters are upgraded on the user's next login.
+    """
+    time_cost = 2
+    memory_cost = 19456
+    parallelism = 1
@@ -0,0 +1,151 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+
+'''
+Idempotent writes and optimistic concurrency for holdings. Configure through
+settings.IDEMPOTENCY:
+
+    TTL   seconds a key and its stored response are kept; reusing a key after that
+          runs the write again
+
+A write sent with an Idempotency-Key header stores its response under the key in the
+same transaction as the write, so a retry either finds the stored response and gets it
+back unchanged, or finds nothing because the write never committed and runs it. The key
+row is inserted first: a concurrent retry waits on its unique index until the original
+commits. Writes that raise (validation errors, failed preconditions) store nothing.
+'''
+DEFAULTS = {
+    'TTL': 24 * 60 * 60,
+}
+HEADER = 'Idempotency-Key'
+KEY_MAX_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'IDEMPOTENCY', {})}
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used for a different request."
+    default_code = 'idempotency_key_reused'
+
+
+class IdempotencyKeyInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still being processed."
+    default_code = 'idempotency_key_in_progress'
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "The holding was changed by another request; fetch it again and retry."
+    default_code = 'precondition_failed'
+
+    def __init__(self, detail=None, code=None, **extra):
+        super().__init__(detail, code)
+        # Extras such as the current version reach the client as they are, not as strings
+        self.detail = {'detail': self.detail, **extra}
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def get_expected_version(request):
+    """
+    The version a write expects to replace: If-Match: "3" (or W/"3"), else the body's
+    `version`. None when the client sends neither, or If-Match: *.
+    """
+    if_match = request.headers.get('If-Match')
+    if if_match:
+        etags = parse_etags(if_match)
+        if etags == ['*']:
+            return None
+        if len(etags) != 1:
+            raise serializers.ValidationError({'If-Match': "Send the one version the write expects, e.g. \"3\"."})
+        value = etags[0].removeprefix('W/').strip('"')
+        name = 'If-Match'
+    else:
+        value = request.data.get('version') if hasattr(request.data, 'get') else None
+        name = 'version'
+        if value is None:
+            return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise serializers.ValidationError({name: "Enter the holding's version as a whole number."})
+
+
+def check_version(holding, expected):
+    """
+    Raises PreconditionFailed, with the current version, unless the (locked) holding
+    is still at the version the client read.
+    """
+    if expected is not None and expected != holding.version:
+        raise PreconditionFailed(id=holding.pk, version=holding.version)
+
+
+class IdempotentWriteMixin:
+    """
+    Makes create, update (and so partial_update) and destroy idempotent under an
+    Idempotency-Key header. Other write actions opt in through idempotent_response.
+    """
+    def create(self, request, *args, **kwargs):
+        return self.idempotent_response(request, lambda: super(IdempotentWriteMixin, self).create(request, *args, **kwargs))
+
+    def update(self, request, *args, **kwargs):
+        return self.idempotent_response(request, lambda: super(IdempotentWriteMixin, self).update(request, *args, **kwargs))
+
+    def destroy(self, request, *args, **kwargs):
+        return self.idempotent_response(request, lambda: super(IdempotentWriteMixin, self).destroy(request, *args, **kwargs))
+
+    def idempotent_response(self, request, respond):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return respond()
+        if not key or len(key) > KEY_MAX_LENGTH:
+            raise serializers.ValidationError({HEADER: f"Send a key of 1 to {KEY_MAX_LENGTH} characters."})
+
+        fingerprint = request_fingerprint(request)
+        with transaction.atomic():
+            # Expired keys are dropped first, which also frees this key if it has expired
+            cutoff = timezone.now() - timedelta(seconds=get_config()['TTL'])
+            IdempotencyKey.objects.filter(user=request.user, created_at__lt=cutoff).delete()
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(user=request.user, key=key, fingerprint=fingerprint)
+            except IntegrityError:
+                return self.replay(request, key, fingerprint)
+
+            response = respond()
+            if response.status_code >= 500:
+                transaction.set_rollback(True)
+                return response
+            # Stored as the renderer encodes it (Decimals included), so a replay is identical
+            body = json.loads(json.dumps(response.data, cls=JSONEncoder))
+            record.status_code, record.response = response.status_code, body
+            record.save(update_fields=['status_code', 'response'])
+        return response
+
+    def replay(self, request, key, fingerprint):
+        record = IdempotencyKey.objects.get(user=request.user, key=key)
+        if record.fingerprint != fingerprint:
+            raise IdempotencyKeyReused()
+        if record.status_code is None:
+            raise IdempotencyKeyInProgress()
+        return Response(record.response, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
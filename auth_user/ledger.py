@@ -0,0 +1,93 @@
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+
+from django.db import transaction
+from rest_framework import serializers
+
+from .models import Holdings, Transaction
+
+
+PRICE_QUANTUM = Decimal('0.0001')
+
+
+def apply_to_position(quantity, cost, entry):
+    """
+    Returns the (quantity, average cost) of a position after one ledger entry.
+
+    This is the single fold used both when recording a transaction (O(1) per trade)
+    and when replaying the ledger, so both paths always agree.
+    """
+    if entry.kind == Transaction.BUY:
+        new_quantity = quantity + entry.quantity
+        # Weighted average cost across the existing shares and the new lot
+        cost = ((quantity * cost + entry.quantity * entry.price) / new_quantity).quantize(PRICE_QUANTUM, ROUND_HALF_UP)
+        return new_quantity, cost
+    if entry.kind == Transaction.SELL:
+        if entry.quantity > quantity:
+            raise serializers.ValidationError({"quantity": f"Cannot sell {entry.quantity} shares; only {quantity} held."})
+        return quantity - entry.quantity, cost
+    if entry.kind == Transaction.SPLIT:
+        # Fractional shares left over by a split are dropped (paid out as cash in lieu)
+        new_quantity = int((quantity * entry.ratio).to_integral_value(ROUND_DOWN))
+        return new_quantity, (cost / entry.ratio).quantize(PRICE_QUANTUM, ROUND_HALF_UP)
+    if entry.kind == Transaction.ADJUST:
+        return entry.quantity, entry.price
+    # Dividends pay cash and leave the position unchanged
+    return quantity, cost
+
+
+def record_transaction(portfolio, stock, kind, quantity=0, price=None, ratio=None, trade_date=None):
+    """
+    Appends a ledger entry and applies it to the materialized Holdings row under a
+    row lock. A position that falls to zero shares is removed.
+    """
+    entry = Transaction(portfolio=portfolio, stock=stock, kind=kind, quantity=quantity, price=price, ratio=ratio)
+    if trade_date is not None:
+        entry.trade_date = trade_date
+
+    with transaction.atomic():
+        holding, created = Holdings.objects.select_for_update().get_or_create(
+            portfolio=portfolio, stock=stock, defaults={'quantity': 0, 'purchase_price': 0}
+        )
+        if created and kind != Transaction.BUY:
+            raise serializers.ValidationError({"kind": f"No position in {stock.symbol} to apply a {kind} to."})
+        new_quantity, new_cost = apply_to_position(holding.quantity, holding.purchase_price, entry)
+        entry.save()
+        if new_quantity == 0:
+            holding.delete()
+        elif (new_quantity, new_cost) != (holding.quantity, holding.purchase_price):
+            holding.quantity, holding.purchase_price = new_quantity, new_cost
+            holding.version += 1
+            holding.save(update_fields=['quantity', 'purchase_price', 'version'])
+    return entry
+
+
+def adjust_holding(holding, quantity=None, price=None):
+    """
+    Applies a manual correction of a holding's quantity or purchase price through the
+    ledger, as an adjustment entry, so replaying the ledger still yields the holding.
+    Call it with the holding locked; returns the holding as stored afterwards.
+    """
+    quantity = holding.quantity if quantity is None else quantity
+    price = holding.purchase_price if price is None else price
+    if (quantity, price) != (holding.quantity, holding.purchase_price):
+        record_transaction(holding.portfolio, holding.stock, Transaction.ADJUST, quantity=quantity, price=price)
+        holding.refresh_from_db()
+    return holding
+
+
+def replay_positions(entries):
+    """
+    Folds ledger entries ordered by (portfolio, stock, id) into positions, yielding
+    ((portfolio_id, stock_id), quantity, cost) as soon as each pair is complete so
+    the caller can stream the ledger in constant memory.
+    """
+    pair, quantity, cost = None, 0, Decimal(0)
+    for entry in entries:
+        entry_pair = (entry.portfolio_id, entry.stock_id)
+        if entry_pair != pair:
+            if pair is not None:
+                yield pair, quantity, cost
+            pair, quantity, cost = entry_pair, 0, Decimal(0)
+        quantity, cost = apply_to_position(quantity, cost, entry)
+    if pair is not None:
+        yield pair, quantity, cost
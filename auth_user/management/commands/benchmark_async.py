@@ -0,0 +1,141 @@
+import asyncio
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from .generate_data import BENCH_EMAIL_PREFIX, BENCH_PASSWORD
+
+
+def latency_summary(timings, wall_seconds):
+    cuts = statistics.quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+    return {
+        'requests': len(timings),
+        'throughput_rps': round(len(timings) / wall_seconds, 1),
+        'p50_ms': round(cuts[49], 3),
+        'p95_ms': round(cuts[94], 3),
+        'p99_ms': round(cuts[98], 3),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the sync read endpoints behind a fixed pool of WSGI worker threads with the "
+        "async endpoints on one ASGI event loop, under the same number of concurrent clients. "
+        "Run generate_data (with --price-days for valuation) first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint and mode.")
+        parser.add_argument('--concurrency', type=int, default=100, help="Concurrent clients.")
+        parser.add_argument('--threads', type=int, default=8, help="WSGI worker threads serving the clients.")
+        parser.add_argument('--email', default=f"{BENCH_EMAIL_PREFIX}0@example.com", help="Generated user to benchmark as.")
+        parser.add_argument('--password', default=BENCH_PASSWORD)
+        parser.add_argument('--cache', action='store_true',
+                            help="Leave the response cache on, so repeated reads are timed as cache hits.")
+        parser.add_argument('--endpoints', help="Comma separated subset of endpoints to run.")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['threads'] < 1:
+            raise CommandError("--concurrency and --threads must be at least 1.")
+        # The test clients send Host: testserver. The async views have no response cache,
+        # so the sync side runs without it too unless --cache is given.
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            RESPONSE_CACHE={**getattr(settings, 'RESPONSE_CACHE', {}), 'ENABLED': options['cache']},
+        ):
+            endpoints, auth = self.prepare(options)
+            self.stdout.write(f"{'endpoint':<18}{'mode':<6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+            for name, (sync_url, async_url) in endpoints.items():
+                for mode, row in (
+                    ('wsgi', self.run_wsgi(sync_url, auth, options)),
+                    ('asgi', asyncio.run(self.run_asgi(async_url, auth, options))),
+                ):
+                    self.stdout.write(
+                        f"{name:<18}{mode:<6}{row['throughput_rps']:>10}{row['p50_ms']:>10}"
+                        f"{row['p95_ms']:>10}{row['p99_ms']:>10}"
+                    )
+
+    def prepare(self, options):
+        client = Client()
+        login = client.post(reverse('login'), {'email': options['email'], 'password': options['password']},
+                            content_type='application/json')
+        if login.status_code != 200:
+            raise CommandError(f"Cannot log in as {options['email']}; run generate_data first.")
+        token = login.json()['token']
+        portfolios = client.get(reverse('portfolio-list'), HTTP_AUTHORIZATION=f"Token {token}").json()['results']
+        if not portfolios:
+            raise CommandError(f"{options['email']} has no portfolios; run generate_data first.")
+        pk = {'pk': portfolios[0]['id']}
+
+        endpoints = {
+            'portfolio_list': (reverse('portfolio-list'), reverse('async-portfolio-list')),
+            'portfolio_detail': (reverse('portfolio-detail', kwargs=pk), reverse('async-portfolio-detail', kwargs=pk)),
+            'valuation': (reverse('portfolio-valuation', kwargs=pk), reverse('async-portfolio-valuation', kwargs=pk)),
+            'holdings_list': (reverse('holdings-list'), reverse('async-holdings-list')),
+        }
+        if options['endpoints']:
+            wanted = options['endpoints'].split(',')
+            unknown = set(wanted) - endpoints.keys()
+            if unknown:
+                raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+            endpoints = {name: endpoints[name] for name in wanted}
+        return endpoints, token
+
+    def split(self, options):
+        # Closed loop: each client sends its share of the requests one after another
+        clients = min(options['concurrency'], options['requests'])
+        return [options['requests'] // clients + (n < options['requests'] % clients) for n in range(clients)]
+
+    def run_wsgi(self, url, token, options):
+        """
+        One thread per client; a semaphore sized --threads plays the WSGI worker pool, so
+        latency includes the time a request queues for a free worker.
+        """
+        workers = threading.Semaphore(options['threads'])
+        timings, errors = [], []
+
+        def client_loop(count):
+            client = Client(HTTP_AUTHORIZATION=f"Token {token}")
+            for _ in range(count):
+                started = time.perf_counter()
+                with workers:
+                    response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+
+        threads = [threading.Thread(target=client_loop, args=(count,)) for count in self.split(options)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+        if errors:
+            raise CommandError(f"{url} returned {errors[0]}")
+        return latency_summary(timings, wall)
+
+    async def run_asgi(self, url, token, options):
+        """
+        Every client is a coroutine on a single event loop, served by the ASGI handler.
+        """
+        client = AsyncClient()
+        headers = {'Authorization': f"Token {token}"}
+        timings = []
+
+        async def client_loop(count):
+            for _ in range(count):
+                started = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    raise CommandError(f"{url} returned {response.status_code}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(count) for count in self.split(options)))
+        return latency_summary(timings, time.perf_counter() - started)
@@ -0,0 +1,70 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from auth_user.models import Holdings
+from auth_user.renderers import ORJSONRenderer
+from auth_user.serializers import HoldingsSerializer, ValuesRowSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Microbenchmark of the holdings list rendering paths on synthetic rows (no database): "
+        "model instances + HoldingsSerializer + JSONRenderer versus values() rows + "
+        "ValuesRowSerializer + ORJSONRenderer. Reports rows/sec and checks the bytes match."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per path; the best is reported.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        today = date.today()
+        rows = []
+        for n in range(1, options['rows'] + 1):
+            quantity = rng.randint(1, 500)
+            price = (Decimal(rng.randint(100, 10000000)) / 10000).quantize(Decimal('0.0001'))
+            rows.append({
+                'id': n,
+                'quantity': quantity,
+                'purchase_price': price,
+                'purchase_date': today - timedelta(days=rng.randint(0, 2000)),
+                'total_amount': (quantity * price).quantize(Decimal('0.0001')),
+                'version': rng.randint(1, 5),
+            })
+
+        def serializer_path():
+            holdings = []
+            for row in rows:
+                holding = Holdings(id=row['id'], quantity=row['quantity'], purchase_price=row['purchase_price'],
+                                   purchase_date=row['purchase_date'], version=row['version'])
+                holding.total_amount = row['total_amount']
+                holdings.append(holding)
+            return JSONRenderer().render(HoldingsSerializer(holdings, many=True).data)
+
+        def fast_path():
+            return ORJSONRenderer().render(ValuesRowSerializer(HoldingsSerializer()).to_representation(rows))
+
+        if serializer_path() != fast_path():
+            raise CommandError("The fast path does not produce the same bytes as the serializer path.")
+
+        results = {}
+        for name, path in (('serializer', serializer_path), ('values+orjson', fast_path)):
+            best = min(self.time(path) for _ in range(options['repeat']))
+            results[name] = len(rows) / best
+            self.stdout.write(f"{name:<16}{best * 1000:>10.1f} ms{results[name]:>14,.0f} rows/s")
+        self.stdout.write(self.style.SUCCESS(
+            f"values+orjson renders {results['values+orjson'] / results['serializer']:.1f}x the rows/s "
+            f"at {len(rows)} holdings, byte for byte identical."
+        ))
+
+    def time(self, path):
+        started = time.perf_counter()
+        path()
+        return time.perf_counter() - started
@@ -0,0 +1,125 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from auth_user.models import CustomUser, Portfolio, Stock, Holdings, StockPrice, Transaction
+from auth_user.utils import batched
+
+
+BENCH_EMAIL_PREFIX = 'bench-'
+BENCH_PASSWORD = 'benchpassword123'
+BENCH_SYMBOL_PREFIX = 'BN'
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates synthetic users, portfolios, holdings and stocks with bulk inserts. "
+        f"Users are bench-<n>@example.com with password '{BENCH_PASSWORD}'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--portfolios', type=int, default=5, help="Portfolios per user.")
+        parser.add_argument('--holdings', type=int, default=20, help="Holdings per portfolio.")
+        parser.add_argument('--stocks', type=int, default=500, help="Size of the stock universe.")
+        parser.add_argument('--price-days', type=int, default=0, help="Days of synthetic closing prices per stock.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true', help="Delete previously generated data first.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        holdings_per_portfolio = min(options['holdings'], options['stocks'])
+
+        with transaction.atomic():
+            if options['clear']:
+                CustomUser.objects.filter(email__startswith=BENCH_EMAIL_PREFIX).delete()
+                Stock.objects.filter(symbol__startswith=BENCH_SYMBOL_PREFIX).delete()
+
+            stocks = self.create_stocks(options['stocks'], batch_size)
+            users = self.create_users(options['users'], batch_size)
+            portfolios = Portfolio.objects.bulk_create(
+                [Portfolio(user=user, name=f"Portfolio {n}") for user in users for n in range(options['portfolios'])],
+                batch_size=batch_size,
+            )
+
+            # Each portfolio holds a random sample of the universe, so pairs stay unique
+            holdings = (
+                Holdings(
+                    portfolio=portfolio,
+                    stock=stock,
+                    quantity=rng.randint(1, 500),
+                    purchase_price=Decimal(rng.randint(100, 100000)) / 100,
+                )
+                for portfolio in portfolios
+                for stock in rng.sample(stocks, holdings_per_portfolio)
+            )
+            holding_count = 0
+            for batch in batched(holdings, batch_size):
+                Holdings.objects.bulk_create(batch)
+                Transaction.objects.bulk_create([
+                    Transaction(portfolio=h.portfolio, stock=h.stock, kind=Transaction.BUY,
+                                quantity=h.quantity, price=h.purchase_price)
+                    for h in batch
+                ])
+                holding_count += len(batch)
+
+            price_count = self.create_prices(stocks, options['price_days'], rng, batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(users)} users, {len(portfolios)} portfolios, {holding_count} holdings, "
+            f"{len(stocks)} stocks and {price_count} prices."
+        ))
+
+    def create_stocks(self, count, batch_size):
+        symbols = [f"{BENCH_SYMBOL_PREFIX}{n}" for n in range(count)]
+        Stock.objects.bulk_create(
+            [Stock(symbol=symbol, name=f"Benchmark Stock {symbol}") for symbol in symbols],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        return list(Stock.objects.filter(symbol__in=symbols))
+
+    def create_users(self, count, batch_size):
+        # Hash once; every generated user shares the same password
+        password = make_password(BENCH_PASSWORD)
+        start = CustomUser.objects.filter(email__startswith=BENCH_EMAIL_PREFIX).count()
+        users = CustomUser.objects.bulk_create(
+            [
+                CustomUser(username=f"bench{n}", email=f"{BENCH_EMAIL_PREFIX}{n}@example.com", password=password)
+                for n in range(start, start + count)
+            ],
+            batch_size=batch_size,
+        )
+        # bulk_create skips the post_save signal that normally creates tokens
+        Token.objects.bulk_create(
+            [Token(key=Token.generate_key(), user=user) for user in users],
+            batch_size=batch_size,
+        )
+        return users
+
+    def create_prices(self, stocks, days, rng, batch_size):
+        if not days:
+            return 0
+        today = timezone.localdate()
+        count = 0
+
+        def prices():
+            for stock in stocks:
+                # Random walk of daily closes ending today
+                close = rng.uniform(10, 1000)
+                for offset in range(days, 0, -1):
+                    close = max(close * (1 + rng.gauss(0, 0.02)), 0.01)
+                    yield StockPrice(stock=stock, date=today - timedelta(days=offset - 1), close=round(Decimal(close), 4))
+
+        for batch in batched(prices(), batch_size):
+            StockPrice.objects.bulk_create(batch, ignore_conflicts=True)
+            count += len(batch)
+        return count
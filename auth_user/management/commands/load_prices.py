@@ -0,0 +1,53 @@
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from auth_user.models import StockPrice
+from auth_user.response_cache import invalidate_stock_responses
+from auth_user.services import iter_csv_rows, upsert_stocks
+from auth_user.utils import batched
+
+
+class Command(BaseCommand):
+    help = "Loads daily closing prices from local CSV files with symbol,date,close columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="CSV files to load.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, paths, batch_size, **options):
+        total = 0
+        for path in paths:
+            try:
+                with open(path, newline='') as handle, transaction.atomic():
+                    for batch in batched(iter_csv_rows(handle), batch_size):
+                        total += self.load_batch(batch, path)
+            except OSError as exc:
+                raise CommandError(f"Cannot read {path}: {exc}")
+        # bulk_create sends no signals; cached analytics depend on prices
+        if total:
+            invalidate_stock_responses()
+        self.stdout.write(self.style.SUCCESS(f"Loaded {total} prices."))
+
+    def load_batch(self, batch, path):
+        try:
+            # Keyed by (symbol, date) so a repeated row keeps its last close
+            closes = {
+                (row['symbol'].strip().upper(), date.fromisoformat(row['date'].strip())): Decimal(row['close'])
+                for row in batch
+            }
+        # A short row leaves its missing columns as None, which Decimal rejects with TypeError
+        except (KeyError, AttributeError, TypeError, ValueError, InvalidOperation) as exc:
+            raise CommandError(f"Invalid row in {path}: {exc!r}")
+
+        stock_ids = upsert_stocks({symbol for symbol, _ in closes})
+        # Re-loading a file overwrites the close for existing (stock, date) rows
+        StockPrice.objects.bulk_create(
+            [StockPrice(stock_id=stock_ids[symbol], date=day, close=close) for (symbol, day), close in closes.items()],
+            update_conflicts=True,
+            unique_fields=['stock', 'date'],
+            update_fields=['close'],
+        )
+        return len(closes)
@@ -0,0 +1,40 @@
+import os
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auth_user.services import get_onboarding_config, iter_csv_rows, onboard_users, password_hasher_pool
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates users and their auth tokens from a CSV with a header row "
+        "(email, username, password, first_name, last_name, date_of_birth). The file is "
+        "streamed, passwords are hashed in a process pool and rows are inserted in batches. "
+        "Accounts whose email already exists are skipped, so the command can be re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file to read, or - for standard input.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Hashing processes; 1 hashes inline.")
+        parser.add_argument('--batch-size', type=int, default=get_onboarding_config()['BATCH_SIZE'],
+                            help="Users inserted per transaction.")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError("--workers and --batch-size must be at least 1.")
+        try:
+            # Only a file the command opened is closed afterwards, never standard input
+            source = nullcontext(sys.stdin) if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(f"Cannot read {options['path']}: {exc}")
+
+        with source as handle, password_hasher_pool(options['workers']) as pool:
+            created, skipped, errors = onboard_users(iter_csv_rows(handle), options['batch_size'], pool)
+
+        for error in errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created} users, skipped {skipped} existing, {len(errors)} rows rejected."
+        ))
@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from auth_user.models import PhotoTask
+from auth_user.photos import PERMANENT_ERRORS, claim_tasks, fail_task, finish_task, render_photo
+
+
+class Command(BaseCommand):
+    help = (
+        "Processes queued profile photos: claims pending PhotoTask rows, strips metadata, "
+        "downscales and writes WebP/JPEG thumbnails in a process pool. Runs until stopped, "
+        "or until the queue is empty with --once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes; 1 runs inline.")
+        parser.add_argument('--batch-size', type=int, default=None, help="Tasks claimed at a time; defaults to 4 per worker.")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit once no task is left.")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or (options['batch_size'] is not None and options['batch_size'] < 1):
+            raise CommandError("--workers and --batch-size must be at least 1.")
+        batch_size = options['batch_size'] or options['workers'] * 4
+
+        done = failed = 0
+        pool = None
+        if options['workers'] > 1:
+            # Workers start lazily on the first batch, after the parent has connected to the
+            # database, so they are spawned rather than forked to never share its connections.
+            # A spawned interpreter loads the app registry before unpickling any task.
+            pool = ProcessPoolExecutor(
+                max_workers=options['workers'], mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        try:
+            while True:
+                task_ids = claim_tasks(batch_size)
+                if not task_ids:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                batch_done, batch_failed = self.process(pool, task_ids)
+                done, failed = done + batch_done, failed + batch_failed
+        except KeyboardInterrupt:
+            # Claimed tasks left running are reclaimed after the lock timeout
+            pass
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        self.stdout.write(self.style.SUCCESS(f"Processed {done} photos, {failed} failed."))
+
+    def process(self, pool, task_ids):
+        """
+        Renders the claimed photos, inline or in the pool, and records each outcome.
+        Returns (done, failed).
+        """
+        tasks = list(PhotoTask.objects.filter(pk__in=task_ids).values_list('id', 'source', 'user_id'))
+        if pool is None:
+            outcomes = (self.run(task_id, render_photo, source, user_id) for task_id, source, user_id in tasks)
+        else:
+            futures = {pool.submit(render_photo, source, user_id): task_id for task_id, source, user_id in tasks}
+            outcomes = ((futures[future], *self.result(future)) for future in as_completed(futures))
+
+        done = failed = 0
+        for task_id, result, error in outcomes:
+            if error is None:
+                finish_task(task_id, result)
+                done += 1
+            else:
+                fail_task(task_id, error, permanent=isinstance(error, PERMANENT_ERRORS))
+                self.stderr.write(f"Photo task {task_id}: {error}")
+                failed += 1
+        return done, failed
+
+    def run(self, task_id, func, *args):
+        try:
+            return task_id, func(*args), None
+        except Exception as exc:
+            return task_id, None, exc
+
+    def result(self, future):
+        try:
+            return future.result(), None
+        except Exception as exc:
+            return None, exc
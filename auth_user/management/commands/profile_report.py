@@ -0,0 +1,71 @@
+import json
+import statistics
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Aggregates RequestProfilingMiddleware logs into slow-endpoint and duplicate-query reports."
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="Log files containing the JSON profiling lines.")
+        parser.add_argument('--top', type=int, default=10)
+
+    def handle(self, *args, paths, top, **options):
+        by_view = defaultdict(list)
+        duplicates = Counter()
+        duplicate_views = defaultdict(set)
+        for record in self.read_records(paths):
+            view = record.get('view') or record.get('path')
+            by_view[view].append(record)
+            for duplicate in record.get('duplicates', []):
+                duplicates[duplicate['fingerprint']] += duplicate['count']
+                duplicate_views[duplicate['fingerprint']].add(view)
+        if not by_view:
+            raise CommandError("No profiling records found.")
+
+        rows = []
+        for view, records in by_view.items():
+            totals = sorted(record['total_ms'] for record in records)
+            rows.append((
+                view,
+                len(records),
+                totals[len(totals) // 2],
+                totals[min(len(totals) - 1, int(len(totals) * 0.95))],
+                statistics.fmean(record['db_ms'] for record in records),
+                statistics.fmean(record['serialize_ms'] for record in records),
+                statistics.fmean(record['queries'] for record in records),
+            ))
+        rows.sort(key=lambda row: row[3], reverse=True)
+
+        self.stdout.write(f"Top {top} slowest endpoints by p95:")
+        self.stdout.write(f"{'view':<32}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'db ms':>10}{'ser ms':>10}{'queries':>10}")
+        for view, count, p50, p95, db_ms, serialize_ms, queries in rows[:top]:
+            self.stdout.write(f"{view:<32}{count:>8}{p50:>10.1f}{p95:>10.1f}{db_ms:>10.1f}{serialize_ms:>10.1f}{queries:>10.1f}")
+
+        self.stdout.write(f"\nTop {top} repeated queries (possible N+1):")
+        if not duplicates:
+            self.stdout.write("None.")
+        for sql, count in duplicates.most_common(top):
+            views = ', '.join(sorted(duplicate_views[sql]))
+            self.stdout.write(f"{count:>8}  [{views}] {sql[:160]}")
+
+    def read_records(self, paths):
+        for path in paths:
+            try:
+                handle = open(path)
+            except OSError as exc:
+                raise CommandError(f"Cannot read {path}: {exc}")
+            with handle:
+                for line in handle:
+                    # Tolerate log prefixes such as timestamps before the JSON payload
+                    start = line.find('{')
+                    if start == -1:
+                        continue
+                    try:
+                        record = json.loads(line[start:])
+                    except ValueError:
+                        continue
+                    if isinstance(record, dict) and 'total_ms' in record:
+                        yield record
@@ -0,0 +1,117 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from rest_framework import serializers
+
+from auth_user.ledger import replay_positions
+from auth_user.models import Holdings, Portfolio, Transaction
+from auth_user.response_cache import invalidate_portfolio, invalidate_user_responses
+from auth_user.utils import batched
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays the transaction ledger to verify, and with --repair fix, materialized holdings. "
+        "Holdings without any ledger entry (e.g. created before the ledger) are reported too; "
+        "--repair backfills an opening buy for them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help="Rewrite holdings that disagree with the ledger.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Positions compared per query.")
+        parser.add_argument('--portfolio', type=int, help="Only replay this portfolio id.")
+
+    def handle(self, *args, repair, batch_size, portfolio, **options):
+        self.verbosity = options['verbosity']
+        entries = Transaction.objects.order_by('portfolio_id', 'stock_id', 'id')
+        if portfolio is not None:
+            entries = entries.filter(portfolio_id=portfolio)
+        # Stream the ledger; each position is folded and released before the next one
+        positions = replay_positions(entries.iterator(chunk_size=batch_size * 5))
+
+        checked = mismatched = 0
+        try:
+            for batch in batched(positions, batch_size):
+                checked += len(batch)
+                mismatched += self.compare_batch(batch, repair)
+        except serializers.ValidationError as exc:
+            self.stderr.write(f"Ledger cannot be replayed: {exc.detail}")
+            return
+
+        # The replay only sees pairs with ledger rows; holdings with none are drift too
+        unrecorded = Holdings.objects.filter(~Exists(Transaction.objects.filter(
+            portfolio_id=OuterRef('portfolio_id'), stock_id=OuterRef('stock_id')
+        ))).order_by('id')
+        if portfolio is not None:
+            unrecorded = unrecorded.filter(portfolio_id=portfolio)
+        for batch in batched(unrecorded.iterator(chunk_size=batch_size), batch_size):
+            checked += len(batch)
+            mismatched += self.backfill_batch(batch, repair)
+
+        action = "repaired" if repair else "found"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} positions, {action} {mismatched} mismatches."))
+
+    def compare_batch(self, batch, repair):
+        # Fetch a superset by id lists and match the exact pairs in memory
+        current = {
+            (holding.portfolio_id, holding.stock_id): holding
+            for holding in Holdings.objects.filter(
+                portfolio_id__in={pair[0] for pair, _, _ in batch},
+                stock_id__in={pair[1] for pair, _, _ in batch},
+            )
+        }
+
+        to_create, to_update, to_delete = [], [], []
+        for pair, quantity, cost in batch:
+            holding = current.get(pair)
+            if holding is None:
+                if not quantity:
+                    continue
+                to_create.append(Holdings(portfolio_id=pair[0], stock_id=pair[1], quantity=quantity, purchase_price=cost))
+            elif not quantity:
+                to_delete.append(holding.pk)
+            elif (holding.quantity, holding.purchase_price) != (quantity, cost):
+                holding.quantity, holding.purchase_price = quantity, cost
+                holding.version += 1
+                to_update.append(holding)
+            else:
+                continue
+            if self.verbosity > 1:
+                self.stdout.write(f"Position {pair}: ledger says {quantity} @ {cost}")
+
+        mismatches = len(to_create) + len(to_update) + len(to_delete)
+        if repair and mismatches:
+            with transaction.atomic():
+                Holdings.objects.bulk_create(to_create)
+                Holdings.objects.bulk_update(to_update, ['quantity', 'purchase_price', 'version'])
+                Holdings.objects.filter(pk__in=to_delete).delete()
+                # Bulk writes send no per-holding signals, so drop the owners' cached reads
+                portfolio_ids = {pair[0] for pair, _, _ in batch}
+                owners = Portfolio.objects.filter(pk__in=portfolio_ids).values_list('user_id', flat=True)
+                for user_id in set(owners):
+                    invalidate_user_responses(user_id)
+                for portfolio_id in portfolio_ids:
+                    invalidate_portfolio(portfolio_id)
+        return mismatches
+
+    def backfill_batch(self, holdings, repair):
+        """
+        Reports holdings the ledger knows nothing about. The holding is the only record
+        of such a position, so the repair is an opening buy that replays to it rather
+        than deleting it.
+        """
+        if self.verbosity > 1:
+            for holding in holdings:
+                self.stdout.write(
+                    f"Position {(holding.portfolio_id, holding.stock_id)}: no ledger entries for "
+                    f"{holding.quantity} @ {holding.purchase_price}"
+                )
+        if repair:
+            Transaction.objects.bulk_create([
+                Transaction(
+                    portfolio_id=holding.portfolio_id, stock_id=holding.stock_id, kind=Transaction.BUY,
+                    quantity=holding.quantity, price=holding.purchase_price, trade_date=holding.purchase_date,
+                )
+                for holding in holdings
+            ])
+        return len(holdings)
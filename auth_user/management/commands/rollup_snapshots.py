@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+from django.utils import timezone
+from rest_framework import serializers
+
+from auth_user.models import Portfolio, PortfolioSnapshot, Transaction
+from auth_user.snapshots import build_snapshots
+from auth_user.utils import batched
+
+
+def rollup_chunk(work, end, rebuild):
+    """
+    Writes the snapshots for a chunk of (portfolio_id, start) pairs and returns
+    (days written, errors). Runs in a worker process, or inline with --workers 1.
+    """
+    written, errors = 0, []
+    for portfolio_id, start in work:
+        try:
+            snapshots = build_snapshots(portfolio_id, start, end)
+        except serializers.ValidationError as exc:
+            errors.append(f"Portfolio {portfolio_id}: ledger cannot be replayed: {exc.detail}")
+            continue
+        with transaction.atomic():
+            if rebuild:
+                PortfolioSnapshot.objects.filter(portfolio_id=portfolio_id, date__gte=start).delete()
+            # ignore_conflicts lets an overlapping run skip days it already wrote
+            PortfolioSnapshot.objects.bulk_create(snapshots, batch_size=1000, ignore_conflicts=True)
+        written += len(snapshots)
+    return written, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills in daily PortfolioSnapshot rows for every day since each portfolio's last snapshot "
+        "(or its first trade), spreading chunks of portfolios across a process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help="Last day to snapshot (YYYY-MM-DD); defaults to today.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes; 1 runs inline.")
+        parser.add_argument('--chunk-size', type=int, default=100, help="Portfolios per worker task.")
+        parser.add_argument('--portfolio', type=int, action='append', help="Only roll up these portfolio ids.")
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Recompute every day from the first trade, e.g. after back-dated trades or prices.")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['chunk_size'] < 1:
+            raise CommandError("--workers and --chunk-size must be at least 1.")
+        end = options['date'] or timezone.localdate()
+        work = self.pending(end, options['portfolio'], options['rebuild'])
+        chunks = list(batched(work, options['chunk_size']))
+
+        written, errors = 0, []
+        if options['workers'] == 1 or len(chunks) <= 1:
+            results = (rollup_chunk(chunk, end, options['rebuild']) for chunk in chunks)
+            written, errors = self.collect(results)
+        else:
+            # Workers are spawned rather than forked, as in process_photos, so they never share
+            # this process's database connections; each loads the app registry first.
+            with ProcessPoolExecutor(
+                max_workers=options['workers'], mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            ) as pool:
+                results = pool.map(rollup_chunk, chunks, [end] * len(chunks), [options['rebuild']] * len(chunks))
+                written, errors = self.collect(results)
+
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} snapshots for {len(work)} portfolios up to {end.isoformat()}."
+        ))
+
+    def collect(self, results):
+        written, errors = 0, []
+        for chunk_written, chunk_errors in results:
+            written += chunk_written
+            errors.extend(chunk_errors)
+        return written, errors
+
+    def pending(self, end, portfolio_ids, rebuild):
+        """
+        Returns (portfolio_id, first missing day) for every portfolio behind `end`.
+        """
+        portfolios = Portfolio.objects.annotate(
+            first_trade=Subquery(
+                Transaction.objects.filter(portfolio=OuterRef('pk')).values('portfolio')
+                .annotate(first=Min('trade_date')).values('first')
+            ),
+            last_snapshot=Subquery(
+                PortfolioSnapshot.objects.filter(portfolio=OuterRef('pk')).values('portfolio')
+                .annotate(last=Max('date')).values('last')
+            ),
+        ).order_by('id')
+        if portfolio_ids:
+            portfolios = portfolios.filter(pk__in=portfolio_ids)
+
+        work = []
+        for portfolio_id, first_trade, last_snapshot in portfolios.values_list('id', 'first_trade', 'last_snapshot'):
+            if first_trade is None:
+                continue
+            start = first_trade if rebuild or last_snapshot is None else last_snapshot + timedelta(days=1)
+            if start <= end:
+                work.append((portfolio_id, start))
+        return work
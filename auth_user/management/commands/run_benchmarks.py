@@ -0,0 +1,189 @@
+import json
+import platform
+import statistics
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from auth_user.models import CustomUser
+from .generate_data import BENCH_EMAIL_PREFIX, BENCH_PASSWORD
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_kb():
+    """
+    Peak resident set size of this process in KiB, or None where unsupported.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports KiB
+    return peak // 1024 if platform.system() == 'Darwin' else peak
+
+
+def summarize(timings, query_counts, response_sizes):
+    cuts = statistics.quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+    return {
+        'requests': len(timings),
+        'p50_ms': round(cuts[49], 3),
+        'p95_ms': round(cuts[94], 3),
+        'p99_ms': round(cuts[98], 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries_per_request': round(statistics.fmean(query_counts), 2),
+        'mean_response_bytes': round(statistics.fmean(response_sizes)),
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives the /api/v1/users/ endpoints through the Django test client and reports "
+        "p50/p95/p99 latency, queries per request and peak RSS. Run generate_data first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--email', default=f"{BENCH_EMAIL_PREFIX}0@example.com", help="Generated user to benchmark as.")
+        parser.add_argument('--password', default=BENCH_PASSWORD)
+        parser.add_argument('--endpoints', help="Comma separated subset of endpoints to run.")
+        parser.add_argument('--cache', action='store_true',
+                            help="Leave the response cache on, so repeated reads are timed as cache hits.")
+        parser.add_argument('--output', help="Write the results as a JSON baseline to this path.")
+        parser.add_argument('--compare', help="Baseline JSON to diff the results against.")
+
+    def handle(self, *args, **options):
+        # The test client sends Host: testserver. The login endpoint logs in every
+        # iteration, so the login throttles are turned off for the run, and reads hit
+        # the views rather than the response cache unless --cache is given.
+        throttle_rates = {**settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_RATES', {}), 'login_ip': None, 'login_account': None}
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': throttle_rates},
+            RESPONSE_CACHE={**getattr(settings, 'RESPONSE_CACHE', {}), 'ENABLED': options['cache']},
+        ):
+            results = self.run(options)
+
+        self.print_table(results)
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'iterations': options['iterations'],
+                'database': connection.vendor,
+                'python': platform.python_version(),
+            },
+            'endpoints': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f"Baseline written to {options['output']}")
+        if options['compare']:
+            with open(options['compare']) as handle:
+                self.print_diff(json.load(handle)['endpoints'], results)
+
+    def run(self, options):
+        client = Client()
+        login = client.post(reverse('login'), {'email': options['email'], 'password': options['password']},
+                            content_type='application/json')
+        if login.status_code != 200:
+            raise CommandError(f"Cannot log in as {options['email']}; run generate_data first.")
+        auth = {'HTTP_AUTHORIZATION': f"Token {login.json()['token']}"}
+
+        portfolio = client.get(reverse('portfolio-list'), **auth).json()['results']
+        if not portfolio:
+            raise CommandError(f"{options['email']} has no portfolios; run generate_data first.")
+        portfolio = portfolio[0]
+        holdings = client.get(reverse('holdings-list'), **auth).json()['results']
+        holding_id = holdings[0]['id'] if holdings else None
+        registered = []
+
+        def register(n):
+            email = f"{BENCH_EMAIL_PREFIX}register-{uuid.uuid4().hex}@example.com"
+            registered.append(email)
+            return client.post(reverse('register'), {
+                'username': email[:150], 'email': email,
+                'password': BENCH_PASSWORD, 'password2': BENCH_PASSWORD,
+            }, content_type='application/json')
+
+        def holdings_crud(n):
+            symbol = f"BC{uuid.uuid4().hex[:8].upper()}"
+            created = client.post(reverse('holdings-list'), {
+                'portfolio_name': portfolio['name'], 'symbol': symbol, 'quantity': 5, 'purchase_price': '10.5',
+            }, content_type='application/json', **auth)
+            url = reverse('holdings-detail', kwargs={'pk': created.json()['id']})
+            client.patch(url, {'quantity': 6}, content_type='application/json', **auth)
+            return client.delete(url, **auth)
+
+        endpoints = {
+            'register': register,
+            'login': lambda n: client.post(reverse('login'), {'email': options['email'], 'password': options['password']},
+                                           content_type='application/json'),
+            'portfolio_list': lambda n: client.get(reverse('portfolio-list'), **auth),
+            'portfolio_detail': lambda n: client.get(reverse('portfolio-detail', kwargs={'pk': portfolio['id']}), **auth),
+            'holdings_list': lambda n: client.get(reverse('holdings-list'), **auth),
+            'holdings_search': lambda n: client.get(reverse('holdings-list') + '?search=BN1', **auth),
+            'holdings_detail': lambda n: client.get(reverse('holdings-detail', kwargs={'pk': holding_id}), **auth),
+            'holdings_crud': holdings_crud,
+        }
+        if holding_id is None:
+            del endpoints['holdings_detail']
+        if options['endpoints']:
+            wanted = options['endpoints'].split(',')
+            unknown = set(wanted) - endpoints.keys()
+            if unknown:
+                raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+            endpoints = {name: endpoints[name] for name in wanted}
+
+        results = {}
+        try:
+            for name, call in endpoints.items():
+                for n in range(options['warmup']):
+                    call(n)
+                timings, query_counts, sizes = [], [], []
+                for n in range(options['iterations']):
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        response = call(n)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    if response.status_code >= 400:
+                        raise CommandError(f"{name} returned {response.status_code}: {response.content[:200]!r}")
+                    query_counts.append(len(queries))
+                    sizes.append(len(response.content))
+                results[name] = summarize(timings, query_counts, sizes)
+        finally:
+            CustomUser.objects.filter(email__in=registered).delete()
+        return results
+
+    def print_table(self, results):
+        self.stdout.write(f"{'endpoint':<18}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}{'bytes':>10}{'rss KiB':>12}")
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<18}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+                f"{row['queries_per_request']:>10}{row['mean_response_bytes']:>10}{str(row['peak_rss_kb']):>12}"
+            )
+
+    def print_diff(self, baseline, results):
+        self.stdout.write("\nChange against baseline (p50 / p95 / queries):")
+        for name, row in results.items():
+            before = baseline.get(name)
+            if before is None:
+                self.stdout.write(f"{name:<18} new endpoint")
+                continue
+            changes = []
+            for key in ('p50_ms', 'p95_ms', 'queries_per_request'):
+                delta = row[key] - before[key]
+                percent = f" ({delta / before[key]:+.1%})" if before[key] else ""
+                changes.append(f"{delta:+.2f}{percent}")
+            self.stdout.write(f"{name:<18} " + " / ".join(changes))
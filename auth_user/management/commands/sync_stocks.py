@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auth_user.services import STOCK_SYNC_BATCH_SIZE, iter_csv_rows, iter_ndjson_rows, sync_stocks
+
+
+FORMATS = ('csv', 'json', 'ndjson')
+
+
+class Command(BaseCommand):
+    help = (
+        "Syncs stock reference data from a security master file with symbol, name, exchange, "
+        "sector and currency columns (CSV with a header row, a JSON array, or NDJSON). The file "
+        "is diffed against the stored stocks and only new or changed rows are written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read, or - for standard input.")
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help="Input format; defaults to the file extension (.csv, .json, .ndjson/.jsonl).")
+        parser.add_argument('--batch-size', type=int, default=STOCK_SYNC_BATCH_SIZE,
+                            help="Symbols looked up and rows written per query.")
+        parser.add_argument('--dry-run', action='store_true', help="Report the changes without writing them.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        input_format = options['format'] or self.guess_format(options['path'])
+        try:
+            # Only a file the command opened is closed afterwards, never standard input
+            source = nullcontext(sys.stdin) if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(f"Cannot read {options['path']}: {exc}")
+
+        with source as handle:
+            if input_format == 'csv':
+                rows = iter_csv_rows(handle)
+            elif input_format == 'ndjson':
+                rows = iter_ndjson_rows(handle)
+            else:
+                try:
+                    rows = json.load(handle)
+                except ValueError as exc:
+                    raise CommandError(f"Invalid JSON in {options['path']}: {exc}")
+                if not isinstance(rows, list):
+                    raise CommandError("A JSON security master must be an array of objects.")
+            created, updated, unchanged, errors = sync_stocks(rows, options['batch_size'], options['dry_run'])
+
+        for error in errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        prefix = "Would have created" if options['dry_run'] else "Created"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {created} stocks, updated {updated}, {unchanged} unchanged, {len(errors)} rows rejected."
+        ))
+
+    def guess_format(self, path):
+        extension = os.path.splitext(path)[1].lower().lstrip('.')
+        if extension == 'jsonl':
+            return 'ndjson'
+        if extension not in FORMATS:
+            raise CommandError("Cannot tell the format from the file name; pass --format.")
+        return extension
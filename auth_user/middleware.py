@@ -0,0 +1,106 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .profiling import RequestProfile, current_profile
+from .routers import get_config as get_routing_config, mark_sticky, routing_state
+
+
+'''
+Per-request SQL and timing instrumentation. Configure through settings.REQUEST_PROFILING:
+
+    SAMPLE_RATE  fraction of requests profiled; 0 removes the middleware entirely
+    LOGGER       logger that receives one JSON line per profiled request
+    MAX_FINGERPRINTS  duplicate-query fingerprints kept per request
+
+Profiled responses carry a Server-Timing header (db, serialize, total) and the JSON log
+lines can be aggregated with `python manage.py profile_report <logfile>`.
+'''
+DEFAULTS = {
+    'SAMPLE_RATE': 0,
+    'LOGGER': 'auth_user.profiling',
+    'MAX_FINGERPRINTS': 10,
+}
+
+class RequestProfilingMiddleware:
+    """
+    Samples requests and records view name, query count, SQL time, duplicate query
+    fingerprints (N+1 detection), serializer time and response size.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = {**DEFAULTS, **getattr(settings, 'REQUEST_PROFILING', {})}
+        if not self.config['SAMPLE_RATE']:
+            raise MiddlewareNotUsed
+        self.logger = logging.getLogger(self.config['LOGGER'])
+
+    def __call__(self, request):
+        if random.random() >= self.config['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.record_query))
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        db_ms = profile.db_seconds * 1000
+        serialize_ms = profile.serialize_seconds * 1000
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={db_ms:.2f};desc="{profile.queries} queries"',
+            f'serialize;dur={serialize_ms:.2f}',
+            f'total;dur={total_ms:.2f}',
+        ])
+
+        match = request.resolver_match
+        duplicates = [
+            {'fingerprint': sql, 'count': count}
+            for sql, count in profile.fingerprints.most_common(self.config['MAX_FINGERPRINTS'])
+            if count > 1
+        ]
+        self.logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 3),
+            'db_ms': round(db_ms, 3),
+            'queries': profile.queries,
+            'serialize_ms': round(serialize_ms, 3),
+            'response_bytes': None if response.streaming else len(response.content),
+            'duplicates': duplicates,
+        }))
+        return response
+
+
+class DatabaseRoutingMiddleware:
+    """
+    Scopes replica routing to each request. After a request that wrote, the user's reads
+    stay on the primary for STICKY_SECONDS, so they always see their own writes.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not get_routing_config()['REPLICAS']:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        with routing_state() as state:
+            response = self.get_response(request)
+        # DRF copies the token-authenticated user onto the Django request
+        user = getattr(request, 'user', None)
+        if state.wrote and user is not None and user.is_authenticated:
+            mark_sticky(user.pk)
+        return response
+
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_user', '0003_alter_holdings_quantity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='holdings',
+            index=models.Index(fields=['portfolio', 'id'], name='holdings_portfolio_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='holdings',
+            index=models.Index(fields=['portfolio', 'quantity', 'id'], name='holdings_portfolio_qty_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='holdings',
+            index=models.Index(fields=['portfolio', 'purchase_price', 'id'], name='holdings_portfolio_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='holdings',
+            index=models.Index(fields=['portfolio', 'purchase_date', 'id'], name='holdings_portfolio_date_idx'),
+        ),
+    ]
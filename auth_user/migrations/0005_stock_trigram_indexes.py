@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:33
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+
+TRIGRAM_INDEXES = [
+    django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='stock_name_trgm_idx'),
+    django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('symbol'), name='gin_trgm_ops'), name='stock_symbol_trgm_idx'),
+]
+
+
+# Trigram GIN indexes only exist on Postgres; other backends (e.g. SQLite in tests) skip them.
+# They are not part of the migration state either: SQLite rebuilds a table from the state
+# on many schema changes, and would otherwise try to recreate these indexes.
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    Stock = apps.get_model('auth_user', 'Stock')
+    for index in TRIGRAM_INDEXES:
+        schema_editor.add_index(Stock, index)
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Stock = apps.get_model('auth_user', 'Stock')
+    for index in TRIGRAM_INDEXES:
+        schema_editor.remove_index(Stock, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_user', '0004_holdings_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_user', '0005_stock_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('close', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='auth_user.stock')),
+            ],
+            options={
+                'verbose_name': 'Stock price',
+                'unique_together': {('stock', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def seed_opening_buys(apps, schema_editor):
+    # Give every existing holding an opening buy so the ledger replays to today's positions
+    Holdings = apps.get_model('auth_user', 'Holdings')
+    Transaction = apps.get_model('auth_user', 'Transaction')
+    batch = []
+    for holding in Holdings.objects.order_by('id').iterator(chunk_size=2000):
+        batch.append(Transaction(
+            portfolio_id=holding.portfolio_id,
+            stock_id=holding.stock_id,
+            kind='buy',
+            quantity=holding.quantity,
+            price=holding.purchase_price,
+            trade_date=holding.purchase_date,
+        ))
+        if len(batch) >= 2000:
+            Transaction.objects.bulk_create(batch)
+            batch = []
+    Transaction.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_user', '0006_stockprice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Transaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('buy', 'Buy'), ('sell', 'Sell'), ('dividend', 'Dividend'), ('split', 'Split')], max_length=8)),
+                ('quantity', models.IntegerField(default=0)),
+                ('price', models.DecimalField(blank=True, decimal_places=4, max_digits=10, null=True)),
+                ('ratio', models.DecimalField(blank=True, decimal_places=4, max_digits=10, null=True)),
+                ('trade_date', models.DateField(default=django.utils.timezone.localdate)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='auth_user.portfolio')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='auth_user.stock')),
+            ],
+            options={
+                'verbose_name': 'Transaction',
+                'indexes': [models.Index(fields=['portfolio', 'stock', 'id'], name='transaction_position_idx')],
+            },
+        ),
+        migrations.RunPython(seed_opening_buys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_user', '0007_transaction_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('market_value', models.DecimalField(decimal_places=4, max_digits=24)),
+                ('cost_basis', models.DecimalField(decimal_places=4, max_digits=24)),
+                ('pnl', models.DecimalField(decimal_places=4, max_digits=24)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='auth_user.portfolio')),
+            ],
+            options={
+                'verbose_name': 'Portfolio snapshot',
+                'unique_together': {('portfolio', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_user', '0009_photo_tasks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='sector',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_user', '0011_holdings_version_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='currency',
+            field=models.CharField(blank=True, default='', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='exchange',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+    ]
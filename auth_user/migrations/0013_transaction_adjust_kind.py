@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_user', '0012_stock_exchange_currency'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='kind',
+            field=models.CharField(choices=[('buy', 'Buy'), ('sell', 'Sell'), ('dividend', 'Dividend'), ('split', 'Split'), ('adjust', 'Adjust')], max_length=8),
+        ),
+    ]
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.conf import settings
 
@@ -36,6 +39,8 @@ class CustomUser(AbstractUser):
     """
     date_of_birth = models.DateField(null=True, blank=True)
     profile_photo = models.ImageField(upload_to='profile_photos/', null=True, blank=True)
+    # Storage names of the generated thumbnails, keyed by size then format ({"128": {"webp": ...}})
+    profile_photo_thumbnails = models.JSONField(default=dict, blank=True)
 
     email = models.EmailField(unique=True, max_length=255)
     username = models.CharField(max_length=150, unique=True)
@@ -73,12 +78,55 @@ class Stock(models.Model):
             ("can_view_stocks", "Can view stocks"),
             ("can_manage_stocks", "Can manage stocks"),
         ]
+        # icontains lookups compile to UPPER(col) LIKE '%x%' and are served by trigram
+        # indexes on name and symbol. Migration 0005 creates them on Postgres only; they
+        # stay out of the model so other backends never have to build them.
     name = models.CharField(max_length=100)
     symbol = models.CharField(max_length=10, unique=True)
+    # Blank until classified; groups the sector weights of portfolio analytics
+    sector = models.CharField(max_length=64, blank=True, default='')
+    # Reference data from the security master loaded by sync_stocks, e.g. XNAS and USD
+    exchange = models.CharField(max_length=16, blank=True, default='')
+    currency = models.CharField(max_length=3, blank=True, default='')
     
     def __str__(self):
         return self.symbol
 
+# Precision of computed money values: quantity (integer) times a 10,4 purchase price.
+AMOUNT_FIELD = DecimalField(max_digits=24, decimal_places=4)
+
+
+class PortfolioQuerySet(models.QuerySet):
+    """
+    QuerySet for portfolios with totals aggregated in the database.
+    """
+    def with_totals(self):
+        """
+        Annotates each portfolio with holding_count, cost_basis and total_value.
+        Until market prices are stored, holdings are valued at their purchase price.
+        """
+        cost = ExpressionWrapper(
+            F('holdings__quantity') * F('holdings__purchase_price'), output_field=AMOUNT_FIELD
+        )
+        return self.annotate(
+            holding_count=Count('holdings'),
+            cost_basis=Coalesce(Sum(cost), Value(0), output_field=AMOUNT_FIELD),
+        ).annotate(total_value=F('cost_basis'))
+
+
+class HoldingsQuerySet(models.QuerySet):
+    """
+    QuerySet for holdings with per-row amounts computed in the database.
+    """
+    def with_total_amount(self):
+        """
+        Annotates each holding with total_amount (quantity * purchase_price).
+        """
+        return self.annotate(total_amount=ExpressionWrapper(
+            F('quantity') * F('purchase_price'), output_field=AMOUNT_FIELD
+        ))
+
+
 '''
  Holdings (Through) Model, an intermediary table for the many-to-many relationship between Portfolios and Stocks.
  This model tracks the quantity of each stock in a portfolio and the purchase price.
@@ -94,6 +142,8 @@ class Portfolio(models.Model):
     name = models.CharField(max_length=100)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='portfolios')
     stocks = models.ManyToManyField(Stock, through='Holdings', related_name='portfolios_stocks')
+
+    objects = PortfolioQuerySet.as_manager()
     
 
 class Holdings(models.Model):
@@ -108,9 +158,168 @@ class Holdings(models.Model):
     quantity = models.IntegerField(default=1)
     purchase_price = models.DecimalField(max_digits=10, decimal_places=4)
     purchase_date = models.DateField(auto_now_add=True)
-    
+    # Bumped by every write; clients send it back (If-Match or `version`) so a stale edit is refused
+    version = models.PositiveIntegerField(default=1)
+
+    objects = HoldingsQuerySet.as_manager()
+
     class Meta:
         # Ensures that each portfolio-stock combination is unique
         unique_together = ('portfolio', 'stock')
+        # Keyset pages seek on (ordering field, id) within each of the user's portfolios
+        indexes = [
+            models.Index(fields=['portfolio', 'id'], name='holdings_portfolio_id_idx'),
+            models.Index(fields=['portfolio', 'quantity', 'id'], name='holdings_portfolio_qty_idx'),
+            models.Index(fields=['portfolio', 'purchase_price', 'id'], name='holdings_portfolio_price_idx'),
+            models.Index(fields=['portfolio', 'purchase_date', 'id'], name='holdings_portfolio_date_idx'),
+        ]
+
+
+class StockPrice(models.Model):
+    """
+    Daily closing price of a stock. One row per (stock, date); the unique index
+    doubles as the access path for per-stock date range scans.
+    """
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='prices')
+    date = models.DateField()
+    close = models.DecimalField(max_digits=14, decimal_places=4)
+
+    class Meta:
+        verbose_name = 'Stock price'
+        unique_together = ('stock', 'date')
+
+    def __str__(self):
+        return f"{self.stock_id} {self.date} {self.close}"
+
+
+class PortfolioSnapshot(models.Model):
+    """
+    End-of-day value of a portfolio, precomputed by the rollup_snapshots command so
+    history charts read one row per day instead of revaluing every holding.
+    """
+    portfolio = models.ForeignKey('Portfolio', on_delete=models.CASCADE, related_name='snapshots')
+    date = models.DateField()
+    market_value = models.DecimalField(max_digits=24, decimal_places=4)
+    cost_basis = models.DecimalField(max_digits=24, decimal_places=4)
+    pnl = models.DecimalField(max_digits=24, decimal_places=4)
+
+    class Meta:
+        verbose_name = 'Portfolio snapshot'
+        # The unique index serves the (portfolio, date range) scans of the history endpoint
+        unique_together = ('portfolio', 'date')
+
+    def __str__(self):
+        return f"{self.portfolio_id} {self.date} {self.market_value}"
+
+
+class Transaction(models.Model):
+    """
+    Append-only ledger entry for a (portfolio, stock) pair. Holdings rows are the
+    materialized position, updated incrementally as each transaction is recorded.
+    """
+    BUY = 'buy'
+    SELL = 'sell'
+    DIVIDEND = 'dividend'
+    SPLIT = 'split'
+    # A manual correction: the position becomes exactly quantity shares at price
+    ADJUST = 'adjust'
+    KIND_CHOICES = [
+        (BUY, 'Buy'),
+        (SELL, 'Sell'),
+        (DIVIDEND, 'Dividend'),
+        (SPLIT, 'Split'),
+        (ADJUST, 'Adjust'),
+    ]
+
+    portfolio = models.ForeignKey(Portfolio, on_delete=models.CASCADE, related_name='transactions')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='transactions')
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    # Shares bought or sold, or held after an adjustment; unused for dividends and splits
+    quantity = models.IntegerField(default=0)
+    # Price per share for buys and sells, average cost after an adjustment, amount per share for dividends
+    price = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
+    # New shares per old share for splits (e.g. 2 for a 2-for-1, 0.1 for a 1-for-10)
+    ratio = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
+    trade_date = models.DateField(default=timezone.localdate)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Transaction'
+        # Replays walk each position's entries in the order they were recorded
+        indexes = [
+            models.Index(fields=['portfolio', 'stock', 'id'], name='transaction_position_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Transactions are append-only and cannot be modified.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.kind} {self.quantity} {self.stock_id} @ {self.price}"
+
+
+class PhotoTask(models.Model):
+    """
+    Queued processing of an uploaded profile photo. Registration only streams the
+    original to storage and adds a row; the process_photos worker claims pending rows,
+    then resizes the image and writes its thumbnails.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='photo_tasks')
+    # Storage name of the untouched upload, deleted once processed
+    source = models.CharField(max_length=255)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When a worker claimed the task; a running task older than the lock timeout is reclaimed
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Photo task'
+        # Workers poll for the oldest tasks in a given status
+        indexes = [
+            models.Index(fields=['status', 'id'], name='phototask_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.source} {self.status}"
 
 
+class IdempotencyKey(models.Model):
+    """
+    The outcome of a write sent with an Idempotency-Key header. A retry with the same
+    key gets the stored response back instead of running the write again.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    # SHA-256 of the method, path and body, so a key reused for another request is refused
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    # The response body as rendered, replayed as is
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Idempotency key'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_uniq'),
+        ]
+        # Expired keys are purged per user by age
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='idempotency_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.key} {self.status_code}"
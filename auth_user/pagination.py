@@ -0,0 +1,149 @@
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination that seeks on the full ordering plus the primary key.
+
+    DRF's CursorPagination only seeks on the first ordering field and falls back to
+    OFFSET for ties, which degrades on non-unique columns such as quantity. Here the
+    cursor stores every ordering value and `id` breaks ties, so a page is a WHERE on
+    those values with LIMIT page_size + 1: no skipped rows are read, the cost does not
+    grow with the page number, and pages stay stable under any allowed ordering.
+    Lists scoped through a join (holdings by portfolio__user) still sort the rows past
+    the cursor, since no index leads with the user; the (portfolio, field, id) indexes
+    narrow that set per portfolio. Grouped rows without an `id` name their unique
+    column in `tiebreaker`.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('id',)
+    tiebreaker = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        # Append the tie-breaker, following the direction of the first field
+        if not any(field.lstrip('-') in (self.tiebreaker, 'pk') for field in ordering):
+            ordering += (('-' if ordering[0].startswith('-') else '') + self.tiebreaker,)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async variant of paginate_queryset for the async views; the page is read
+        with the async ORM.
+        """
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page([obj async for obj in queryset])
+
+    def _page_queryset(self, queryset, request, view):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        self.reverse = self.cursor.reverse if self.cursor else False
+        self.current_position = self.cursor.position if self.cursor else None
+
+        ordering = _reverse_ordering(self.ordering) if self.reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.current_position is not None:
+            queryset = queryset.filter(_keyset_filter(ordering, self.current_position))
+
+        # Fetch one extra row to know whether another page follows this one
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, results):
+        current_position = self.current_position
+        has_following = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = current_position is not None
+
+        if self.page:
+            self.previous_position = self._get_position_from_instance(self.page[0], self.ordering)
+            self.next_position = self._get_position_from_instance(self.page[-1], self.ordering)
+        else:
+            self.previous_position = self.next_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=json.dumps(self.next_position)))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=json.dumps(self.previous_position)))
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        try:
+            position = json.loads(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor._replace(position=position)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            field_name = field.lstrip('-')
+            value = instance[field_name] if isinstance(instance, dict) else getattr(instance, field_name)
+            values.append(str(value))
+        return values
+
+
+def _reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else '-' + field for field in ordering)
+
+
+def _keyset_filter(ordering, position):
+    """
+    Builds the row-value comparison `(a, b, id) > (x, y, z)` as an OR of equality prefixes,
+    honouring the direction of each ordering field.
+    """
+    condition = Q()
+    for index, field in enumerate(ordering):
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        clause = Q(**{f"{field.lstrip('-')}__{lookup}": position[index]})
+        for previous, value in zip(ordering[:index], position[:index]):
+            clause &= Q(**{previous.lstrip('-'): value})
+        condition |= clause
+    return condition
+
+
+class ConsolidatedPagination(KeysetCursorPagination):
+    """
+    Keyset pagination over holdings grouped by stock, where the stock id is unique.
+    """
+    ordering = ('stock_id',)
+    tiebreaker = 'stock_id'
@@ -0,0 +1,202 @@
+import os
+from datetime import timedelta
+from io import BytesIO
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import PhotoTask
+
+
+'''
+Background processing of profile photos. Configure through settings.PROFILE_PHOTOS:
+
+    UPLOAD_TO        storage directory for originals, processed photos and thumbnails
+    MAX_UPLOAD_SIZE  largest accepted upload in bytes
+    MAX_PIXELS       largest accepted width * height, checked from the header alone
+    FORMATS_ALLOWED  Pillow format names accepted on upload
+    MAX_SIZE         longest side of the stored photo in pixels
+    THUMBNAIL_SIZES  longest sides of the generated thumbnails
+    THUMBNAIL_FORMATS  encodings written for every thumbnail size ('webp', 'jpeg')
+    QUALITY          encoder quality for WebP and JPEG output
+    MAX_ATTEMPTS     tries before a task is marked failed
+    LOCK_TIMEOUT     seconds after which a running task is presumed lost and reclaimed
+'''
+DEFAULTS = {
+    'UPLOAD_TO': 'profile_photos/',
+    'MAX_UPLOAD_SIZE': 20 * 1024 * 1024,
+    'MAX_PIXELS': 50_000_000,
+    'FORMATS_ALLOWED': ('JPEG', 'PNG', 'WEBP', 'GIF'),
+    'MAX_SIZE': 1024,
+    'THUMBNAIL_SIZES': (256, 128, 64),
+    'THUMBNAIL_FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 82,
+    'MAX_ATTEMPTS': 3,
+    'LOCK_TIMEOUT': 300,
+}
+PIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+
+class PhotoError(Exception):
+    """
+    Raised when an upload cannot be processed into a profile photo.
+    """
+
+
+# Errors a retry cannot fix: the original is not a usable image or is gone
+PERMANENT_ERRORS = (PhotoError, UnidentifiedImageError, Image.DecompressionBombError, FileNotFoundError)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'PROFILE_PHOTOS', {})}
+
+
+def check_upload(upload):
+    """
+    Validates an upload from its size and image header only, so the check costs the
+    same for any image size. Raises PhotoError with a message for the client.
+    """
+    config = get_config()
+    if upload.size > config['MAX_UPLOAD_SIZE']:
+        raise PhotoError(f"Upload a photo of at most {config['MAX_UPLOAD_SIZE'] // (1024 * 1024)} MB.")
+    try:
+        # Image.open reads the header; pixel data is never decoded here
+        with Image.open(upload) as image:
+            image_format, (width, height) = image.format, image.size
+    except (OSError, Image.DecompressionBombError):
+        raise PhotoError("Upload a valid image.")
+    finally:
+        upload.seek(0)
+    if image_format not in config['FORMATS_ALLOWED']:
+        raise PhotoError(f"Upload one of: {', '.join(config['FORMATS_ALLOWED'])}.")
+    if width * height > config['MAX_PIXELS']:
+        raise PhotoError("The photo has too many pixels.")
+
+
+def enqueue_photo(user, upload):
+    """
+    Streams the original upload to storage chunk by chunk and queues its processing.
+    """
+    extension = os.path.splitext(upload.name)[1].lower()
+    source = default_storage.save(f"{get_config()['UPLOAD_TO']}originals/{uuid4().hex}{extension}", upload)
+    try:
+        return PhotoTask.objects.create(user=user, source=source)
+    except Exception:
+        default_storage.delete(source)
+        raise
+
+
+def claim_tasks(limit):
+    """
+    Marks up to limit pending (or abandoned) tasks as running and returns their ids.
+
+    Each claim is a conditional UPDATE, so two workers never take the same task; on
+    databases with SKIP LOCKED the candidates other workers are claiming are skipped.
+    """
+    now = timezone.now()
+    claimable = Q(status=PhotoTask.PENDING) | Q(
+        status=PhotoTask.RUNNING, locked_at__lt=now - timedelta(seconds=get_config()['LOCK_TIMEOUT'])
+    )
+    claimed = []
+    with transaction.atomic():
+        candidates = PhotoTask.objects.filter(claimable).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        for pk in candidates.values_list('id', flat=True)[:limit]:
+            if PhotoTask.objects.filter(claimable, pk=pk).update(
+                status=PhotoTask.RUNNING, locked_at=now, attempts=F('attempts') + 1
+            ):
+                claimed.append(pk)
+    return claimed
+
+
+def render_photo(source, user_id):
+    """
+    Builds the stored photo and its thumbnails from an original in storage and returns
+    {'photo': name, 'thumbnails': {size: {format: name}}}. Touches storage but not
+    the database, so it can run in a worker process.
+
+    JPEGs are decoded at a reduced scale close to MAX_SIZE, which keeps the decoded
+    image small however large the upload. Orientation is applied from EXIF, then all
+    metadata (EXIF, GPS, ICC, comments) is dropped from every output.
+    """
+    config = get_config()
+    prefix = f"{config['UPLOAD_TO']}{user_id}/{uuid4().hex[:12]}"
+    with default_storage.open(source, 'rb') as original, Image.open(original) as image:
+        if image.width * image.height > config['MAX_PIXELS']:
+            raise PhotoError("The photo has too many pixels.")
+        image.draft('RGB', (config['MAX_SIZE'], config['MAX_SIZE']))
+        image = ImageOps.exif_transpose(image)
+        image = _flatten(image)
+    image.thumbnail((config['MAX_SIZE'], config['MAX_SIZE']), Image.Resampling.LANCZOS)
+
+    result = {'photo': _save(image, f'{prefix}.jpg', 'JPEG', config['QUALITY']), 'thumbnails': {}}
+    # Each thumbnail is scaled down from the next larger one rather than from the full photo
+    thumbnail = image
+    for size in sorted(config['THUMBNAIL_SIZES'], reverse=True):
+        thumbnail = thumbnail.copy()
+        thumbnail.thumbnail((size, size), Image.Resampling.LANCZOS)
+        result['thumbnails'][str(size)] = {
+            image_format: _save(thumbnail, f'{prefix}_{size}.{image_format}', PIL_FORMATS[image_format], config['QUALITY'])
+            for image_format in config['THUMBNAIL_FORMATS']
+        }
+    return result
+
+
+def _flatten(image):
+    # Composite transparency onto white, since the outputs include JPEG
+    image = image.convert('RGBA') if image.mode in ('P', 'LA', 'PA') or 'transparency' in image.info else image
+    if image.mode == 'RGBA':
+        flat = Image.new('RGB', image.size, (255, 255, 255))
+        flat.paste(image, mask=image.getchannel('A'))
+    else:
+        flat = image.convert('RGB')
+    # Encoders may pick EXIF, ICC profiles and comments up from info, so none is kept
+    flat.info = {}
+    return flat
+
+
+def _save(image, name, image_format, quality):
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=quality, optimize=image_format == 'JPEG')
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def finish_task(task_id, result):
+    """
+    Points the user at the processed photo and thumbnails, then removes the original
+    and the files they replace once the change is committed.
+    """
+    with transaction.atomic():
+        task = PhotoTask.objects.select_related('user').select_for_update().get(pk=task_id)
+        user = task.user
+        stale = [user.profile_photo.name] if user.profile_photo else []
+        stale += [name for formats in user.profile_photo_thumbnails.values() for name in formats.values()]
+        user.profile_photo = result['photo']
+        user.profile_photo_thumbnails = result['thumbnails']
+        user.save(update_fields=['profile_photo', 'profile_photo_thumbnails'])
+        PhotoTask.objects.filter(pk=task_id).update(status=PhotoTask.DONE, locked_at=None, error='')
+        transaction.on_commit(lambda: _delete_files([task.source, *stale]))
+
+
+def fail_task(task_id, error, permanent=False):
+    """
+    Returns a task to the queue, or marks it failed when the error is permanent or the
+    task has used its attempts. Failed tasks keep their original for inspection.
+    """
+    retry = Q(attempts__lt=get_config()['MAX_ATTEMPTS']) if not permanent else Q(pk__in=[])
+    PhotoTask.objects.filter(pk=task_id).update(
+        status=Case(When(retry, then=Value(PhotoTask.PENDING)), default=Value(PhotoTask.FAILED)),
+        locked_at=None, error=str(error),
+    )
+
+
+def _delete_files(names):
+    for name in names:
+        default_storage.delete(name)
@@ -0,0 +1,61 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+'''
+Request profile state shared by the profiling middleware, which opens a profile per
+sampled request, and the code it measures: serializers and the values() fast paths
+time themselves with timed_serialization().
+'''
+current_profile = ContextVar('request_profile', default=None)
+
+_IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def fingerprint(sql):
+    """
+    Normalizes a query so repeats that differ only in parameters compare equal.
+    """
+    return _LITERALS.sub('?', _IN_LIST.sub('IN (...)', sql))
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.serializing = False
+        self.fingerprints = Counter()
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Adds the block's duration to the profiled request's serialize time. Serializers call
+    it around .data and the values() fast path around rendering its rows; a block inside
+    another one is counted once, by the outermost. Costs one lookup when not profiling.
+    """
+    profile = current_profile.get()
+    if profile is None or profile.serializing:
+        yield
+        return
+    profile.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.serialize_seconds += time.perf_counter() - started
+        profile.serializing = False
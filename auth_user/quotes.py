@@ -0,0 +1,176 @@
+import csv
+import json
+import threading
+from concurrent.futures import Future
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .cache import TTLCache
+from .utils import batched
+
+
+'''
+Live-ish quotes behind a pluggable provider. Configure through settings.QUOTE_PROVIDER:
+
+    BACKEND     dotted path of a QuoteProvider subclass
+    OPTIONS     keyword arguments for the backend
+    TTL         seconds a quote stays cached
+    MAX_SIZE    quotes kept in the LRU cache
+    BATCH_SIZE  symbols sent per upstream call
+    TIMEOUT     seconds a request waits on another request's in-flight fetch
+'''
+DEFAULTS = {
+    'BACKEND': 'auth_user.quotes.LocalQuoteProvider',
+    'OPTIONS': {},
+    'TTL': 15,
+    'MAX_SIZE': 10000,
+    'BATCH_SIZE': 100,
+    'TIMEOUT': 10,
+}
+
+_service = None
+
+
+class QuoteProviderError(Exception):
+    """
+    Raised when quotes cannot be fetched from the upstream provider.
+    """
+
+
+class QuoteProvider:
+    """
+    Base class for quote sources. Subclasses fetch many symbols in one upstream call.
+    """
+    def fetch_quotes(self, symbols):
+        """
+        Returns a symbol -> Decimal price map; symbols the source does not know are omitted.
+        """
+        raise NotImplementedError
+
+
+class LocalQuoteProvider(QuoteProvider):
+    """
+    Offline provider serving quotes from a dict or from a local JSON ({"AAPL": "190.5"})
+    or CSV (symbol,price) file. A missing file simply yields no quotes.
+    """
+    def __init__(self, quotes=None, path=None):
+        self.path = Path(path) if path else None
+        self._quotes = {symbol.upper(): Decimal(str(price)) for symbol, price in (quotes or {}).items()}
+        self._loaded = quotes is not None
+
+    def fetch_quotes(self, symbols):
+        if not self._loaded:
+            self._quotes = self._read_file()
+            self._loaded = True
+        return {symbol: self._quotes[symbol] for symbol in symbols if symbol in self._quotes}
+
+    def _read_file(self):
+        if self.path is None or not self.path.exists():
+            return {}
+        try:
+            with self.path.open(newline='') as handle:
+                if self.path.suffix == '.csv':
+                    pairs = ((row['symbol'], row['price']) for row in csv.DictReader(handle))
+                else:
+                    pairs = json.load(handle).items()
+                return {symbol.strip().upper(): Decimal(str(price)) for symbol, price in pairs}
+        except (OSError, ValueError, KeyError, ArithmeticError) as exc:
+            raise QuoteProviderError(f"Cannot read quotes from {self.path}: {exc}")
+
+
+class QuoteService:
+    """
+    Front for a QuoteProvider that caches quotes with a TTL and LRU eviction, batches
+    cache misses into as few upstream calls as possible, and coalesces concurrent
+    requests so each symbol has at most one fetch in flight (single flight).
+    """
+    def __init__(self, provider, ttl=15, max_size=10000, batch_size=100, timeout=10):
+        self.provider = provider
+        self.cache = TTLCache(max_size=max_size, ttl=ttl)
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get_quotes(self, symbols):
+        """
+        Returns a symbol -> Decimal price map for the symbols that have a quote.
+        """
+        missing = object()
+        quotes = {}
+        misses = []
+        for symbol in {symbol.upper() for symbol in symbols}:
+            price = self.cache.get(symbol, missing)
+            if price is missing:
+                misses.append(symbol)
+            elif price is not None:
+                quotes[symbol] = price
+
+        # Claim the symbols nobody is fetching; wait on the others
+        owned, waiting = [], []
+        with self._lock:
+            for symbol in misses:
+                if symbol in self._in_flight:
+                    waiting.append((symbol, self._in_flight[symbol]))
+                else:
+                    self._in_flight[symbol] = Future()
+                    owned.append(symbol)
+
+        try:
+            for batch in batched(owned, self.batch_size):
+                self._fetch(batch)
+        finally:
+            with self._lock:
+                waiting.extend((symbol, self._in_flight.pop(symbol)) for symbol in owned)
+
+        for symbol, future in waiting:
+            price = future.result(timeout=self.timeout)
+            if price is not None:
+                quotes[symbol] = price
+        return quotes
+
+    def _fetch(self, batch):
+        futures = [self._in_flight[symbol] for symbol in batch]
+        try:
+            fetched = self.provider.fetch_quotes(batch)
+        except Exception as exc:
+            error = exc if isinstance(exc, QuoteProviderError) else QuoteProviderError(str(exc))
+            for future in futures:
+                future.set_exception(error)
+            return
+        for symbol, future in zip(batch, futures):
+            # Unknown symbols are cached as None so they are not re-fetched every request
+            price = fetched.get(symbol)
+            self.cache.set(symbol, price)
+            future.set_result(price)
+
+
+def get_quote_service():
+    global _service
+    if _service is None:
+        config = {**DEFAULTS, **getattr(settings, 'QUOTE_PROVIDER', {})}
+        provider = import_string(config['BACKEND'])(**config['OPTIONS'])
+        _service = QuoteService(
+            provider,
+            ttl=config['TTL'],
+            max_size=config['MAX_SIZE'],
+            batch_size=config['BATCH_SIZE'],
+            timeout=config['TIMEOUT'],
+        )
+    return _service
+
+
+def get_quotes(symbols):
+    return get_quote_service().get_quotes(symbols)
+
+
+@receiver(setting_changed)
+def reset_quote_service(*, setting, **kwargs):
+    global _service
+    if setting == 'QUOTE_PROVIDER':
+        _service = None
@@ -0,0 +1,30 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson, producing the same bytes as DRF's renderer.
+
+    Decimals, lazy strings and other non-native types go through DRF's JSONEncoder, and
+    datetimes are passed through to it too, so they keep DRF's millisecond, 'Z'-suffixed
+    format. Indented, non-compact or ASCII-only output, and installs without orjson,
+    use the stdlib path.
+    """
+    options = orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=self.encoder.default, option=self.options)
+        # Like DRF, escape the two separators that are valid JSON but break JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+
+'''
+Per-user cache of serialized portfolio and holdings reads. Configure through
+settings.RESPONSE_CACHE:
+
+    ENABLED      turns caching (and ETags) on or off
+    CACHE        alias from settings.CACHES; must be shared (Redis/Memcached) when
+                 several processes serve the API, or writes in one process go unseen
+    TTL          seconds a cached response lives
+    KEY_PREFIX   prefix for every key this module writes
+
+Entries are keyed by the user's version counter (plus a global one for stocks), which
+the signals in signals.py bump on every write. Each portfolio also has its own version,
+bumped on writes to it or its holdings, for results scoped to one portfolio. A bump makes all older entries
+unreachable, so a stale response is never served; they simply expire.
+'''
+DEFAULTS = {
+    'ENABLED': True,
+    'CACHE': 'default',
+    'TTL': 300,
+    'KEY_PREFIX': 'responses:',
+}
+STOCKS_SCOPE = 'stocks'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'RESPONSE_CACHE', {})}
+
+
+def _version_key(scope):
+    return f"{get_config()['KEY_PREFIX']}version:{scope}"
+
+
+def get_version(scope):
+    cache = caches[get_config()['CACHE']]
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock, so a counter lost to eviction never repeats an old value
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(scope):
+    cache = caches[get_config()['CACHE']]
+    key = _version_key(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+def invalidate(scope):
+    """
+    Bumps a version now and again on commit, so a read that raced the write cannot
+    keep its pre-commit result cached under the new version.
+    """
+    bump_version(scope)
+    transaction.on_commit(lambda: bump_version(scope))
+
+
+def invalidate_user_responses(user_id):
+    invalidate(f'user:{user_id}')
+
+
+def invalidate_portfolio(portfolio_id):
+    invalidate(f'portfolio:{portfolio_id}')
+
+
+def invalidate_stock_responses():
+    invalidate(STOCKS_SCOPE)
+
+
+def make_etag(data, media_type):
+    payload = json.dumps(data, cls=JSONEncoder, sort_keys=True, separators=(',', ':'))
+    return quote_etag(hashlib.sha256(f'{media_type}\n{payload}'.encode()).hexdigest()[:40])
+
+
+def etag_matches(etag, if_none_match):
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in (tag.removeprefix('W/') for tag in etags)
+
+
+class CachedReadMixin:
+    """
+    Serves list and retrieve from the per-user response cache, with strong ETags.
+
+    A request whose If-None-Match matches gets an empty 304 without touching the
+    database or the serializer. Requests asking for live extras (?include=) bypass
+    the cache, because quotes change without any write.
+    """
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedReadMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedReadMixin, self).retrieve(request, *args, **kwargs))
+
+    def cached_response(self, request, respond):
+        config = get_config()
+        if not config['ENABLED'] or request.query_params.get('include'):
+            return respond()
+
+        cache = caches[config['CACHE']]
+        user_version = get_version(f'user:{request.user.pk}')
+        path = hashlib.sha256(request.get_full_path().encode()).hexdigest()
+        key = (
+            f"{config['KEY_PREFIX']}{self.basename}:{request.user.pk}:{user_version}:"
+            f"{get_version(STOCKS_SCOPE)}:{request.accepted_media_type}:{path}"
+        )
+        entry = cache.get(key)
+        if entry is None:
+            response = respond()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = (response.data, make_etag(response.data, request.accepted_media_type))
+            cache.set(key, entry, config['TTL'])
+
+        data, etag = entry
+        if etag_matches(etag, request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        # Clients may keep the body but must revalidate it on every poll
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
@@ -0,0 +1,117 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+'''
+Primary/replica routing. Configure through settings.DATABASE_ROUTING:
+
+    REPLICAS        aliases from settings.DATABASES that replicate the default database
+    STICKY_SECONDS  how long a user's reads stay on the primary after they write;
+                    keep it above the replicas' usual lag
+    CACHE           alias from settings.CACHES holding the sticky markers; must be shared
+                    when several processes serve the API
+
+Reads only go to a replica once a read-only view calls use_replicas() for the request.
+Everything else (writes, transactions, reads outside those views, and all reads of a
+user who wrote in the last STICKY_SECONDS) uses the primary.
+'''
+DEFAULTS = {
+    'REPLICAS': (),
+    'STICKY_SECONDS': 5,
+    'CACHE': 'default',
+}
+
+_state = ContextVar('db_routing_state', default=None)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'DATABASE_ROUTING', {})}
+
+
+class RoutingState:
+    """
+    Per-request routing flags: whether replica reads are allowed and whether the
+    request has written.
+    """
+    def __init__(self):
+        self.replica_reads = False
+        self.wrote = False
+
+
+def _sticky_key(user_id):
+    return f'db:primary:{user_id}'
+
+
+def is_sticky(user_id):
+    config = get_config()
+    return caches[config['CACHE']].get(_sticky_key(user_id)) is not None
+
+
+def mark_sticky(user_id):
+    config = get_config()
+    caches[config['CACHE']].set(_sticky_key(user_id), 1, config['STICKY_SECONDS'])
+
+
+@contextmanager
+def routing_state():
+    """
+    Scopes routing flags to one request.
+    """
+    state = RoutingState()
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def use_replicas(user_id):
+    """
+    Lets the rest of the request read from a replica, unless the user wrote recently.
+    """
+    state = _state.get()
+    if state is not None and get_config()['REPLICAS'] and not is_sticky(user_id):
+        state.replica_reads = True
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends the reads of requests that called use_replicas() to a random replica and
+    everything else to the primary. After a request's first write, its remaining
+    reads stay on the primary.
+    """
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica_reads or state.wrote:
+            return DEFAULT_DB_ALIAS
+        # Reads inside a transaction must see its own writes and locks
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return self.choose_replica(get_config()['REPLICAS'])
+
+    def choose_replica(self, replicas):
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, *get_config()['REPLICAS']}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication
+        if db in get_config()['REPLICAS']:
+            return False
+        return None
@@ -1,7 +1,14 @@
+from concurrent.futures import TimeoutError
+from decimal import Decimal
+from operator import itemgetter
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
-from .models import Portfolio, Stock, Holdings, CustomUser
+from django.db import models, transaction
+from .models import Portfolio, Stock, Holdings, CustomUser, Transaction
+from .photos import PhotoError, check_upload, enqueue_photo
+from .quotes import QuoteProviderError, get_quotes
+from .profiling import timed_serialization
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -11,6 +18,8 @@ class UserSerializer(serializers.ModelSerializer):
     """
     password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
     password2 = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
+    # Checked from the image header only; the photo is resized later by the process_photos worker
+    profile_photo = serializers.FileField(write_only=True, required=False, allow_null=True)
     
     class Meta:
         model = CustomUser
@@ -24,23 +33,53 @@ class UserSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({"password": "Passwords do not match."})
         return data
 
+    def validate_profile_photo(self, upload):
+        if upload is not None:
+            try:
+                check_upload(upload)
+            except PhotoError as exc:
+                raise serializers.ValidationError(str(exc))
+        return upload
+
     def create(self, validated_data):
         """
         Creates and saves a new user with the validated data, securely hashing the password.
+        A profile photo is stored as uploaded and queued for processing.
         """
         # Exclude password2 from the validated_data before creating the user
         validated_data.pop('password2')
-        user = CustomUser.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password'],
-            date_of_birth=validated_data.get('date_of_birth'),
-            profile_photo=validated_data.get('profile_photo')
-        )
+        with transaction.atomic():
+            user = CustomUser.objects.create_user(
+                username=validated_data['username'],
+                email=validated_data['email'],
+                password=validated_data['password'],
+                date_of_birth=validated_data.get('date_of_birth'),
+            )
+            if validated_data.get('profile_photo'):
+                enqueue_photo(user, validated_data['profile_photo'])
         return user
 
 
 
+class OnboardUserSerializer(serializers.Serializer):
+    """
+    Validates one row of a bulk onboarding file. A blank password gives the
+    account an unusable password, as create_user does.
+    """
+    email = serializers.EmailField(max_length=255)
+    username = serializers.CharField(max_length=150)
+    password = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False)
+    first_name = serializers.CharField(required=False, allow_blank=True, max_length=150)
+    last_name = serializers.CharField(required=False, allow_blank=True, max_length=150)
+    date_of_birth = serializers.DateField(required=False, allow_null=True)
+
+    def to_internal_value(self, data):
+        # CSV cells are never missing, only empty
+        if isinstance(data, dict):
+            data = {key: value for key, value in data.items() if value not in ('', None) or key == 'password'}
+        return super().to_internal_value(data)
+
+
 class LoginSerializer(serializers.Serializer):
     email = serializers.CharField()
     password = serializers.CharField(write_only=True)
@@ -58,19 +97,91 @@ class LoginSerializer(serializers.Serializer):
             raise serializers.ValidationError("Invalid password or email.")
 
 
-class HoldingsSerializer(serializers.ModelSerializer):
+def get_query_list(request, name):
+    """
+    Returns a comma separated query parameter as a set, or None when it is absent or empty.
+    """
+    if request is None:
+        return None
+    values = {value.strip() for value in request.query_params.get(name, '').split(',')} - {''}
+    return values or None
+
+
+class TimedDataMixin:
+    """
+    Counts the serializer's .data towards the request profiler's serialize time.
+    """
+    @property
+    def data(self):
+        with timed_serialization():
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    """
+    The many=True counterpart of TimedDataMixin, set as Meta.list_serializer_class.
+    """
+
+
+class SparseFieldsMixin:
+    """
+    Lets GET requests trim a top-level serializer's output with ?fields=a,b and add the
+    relations in Meta.expandable_fields with ?expand=name at any nesting depth. The views
+    read the same parameters to narrow their querysets to match.
+    """
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return fields
+
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        expanded = (get_query_list(request, 'expand') or set()) & expandable.keys()
+        for name in expanded:
+            fields[name] = expandable[name]()
+
+        requested = get_query_list(request, 'fields')
+        if requested is not None and self.is_top_level:
+            unknown = requested - fields.keys()
+            if unknown:
+                raise serializers.ValidationError({"fields": f"Unknown fields: {', '.join(sorted(unknown))}."})
+            for name in list(fields):
+                if name not in requested and name not in expanded and not fields[name].write_only:
+                    del fields[name]
+        return fields
+
+    @property
+    def is_top_level(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+
+class StockSerializer(TimedDataMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Stock
+        fields = ['id', 'symbol', 'name']
+        list_serializer_class = TimedListSerializer
+
+
+class HoldingsSerializer(TimedDataMixin, SparseFieldsMixin, serializers.ModelSerializer):
     portfolio_name = serializers.CharField(write_only=True)
     symbol = serializers.CharField(write_only=True)
     total_amount = serializers.SerializerMethodField()
 
     class Meta:
         model = Holdings
-        fields = ['id', 'portfolio_name', 'symbol', 'quantity', 'purchase_price', 'purchase_date', 'total_amount']
-        read_only_fields = ['purchase_date']
+        fields = ['id', 'portfolio_name', 'symbol', 'quantity', 'purchase_price', 'purchase_date', 'total_amount', 'version']
+        read_only_fields = ['purchase_date', 'version']
+        list_serializer_class = TimedListSerializer
+        # Added with ?expand=stock
+        expandable_fields = {'stock': lambda: StockSerializer(read_only=True)}
         
-    #Get the total amount for each holding
+    #Get the total amount for each holding, preferring the value annotated in SQL
     def get_total_amount(self, obj):
-        return obj.quantity * obj.purchase_price
+        total_amount = getattr(obj, 'total_amount', None)
+        if total_amount is None:
+            total_amount = obj.quantity * obj.purchase_price
+        return total_amount
     
     # validation to ensure quantity and purchase_price are positive
     def validate(self, data):
@@ -84,10 +195,178 @@ class HoldingsSerializer(serializers.ModelSerializer):
     
 
 
-class PortfolioSerializer(serializers.ModelSerializer):
+class ConsolidatedPortfolioSerializer(serializers.Serializer):
+    """
+    One portfolio's share of a consolidated position.
+    """
+    portfolio_id = serializers.IntegerField()
+    portfolio_name = serializers.CharField()
+    quantity = serializers.IntegerField()
+    purchase_price = serializers.DecimalField(max_digits=10, decimal_places=4)
+    purchase_date = serializers.DateField()
+    total_amount = serializers.DecimalField(max_digits=24, decimal_places=4)
+
+
+class ConsolidatedHoldingSerializer(TimedDataMixin, serializers.Serializer):
+    """
+    A stock held across a user's portfolios: rows from the grouped holdings query,
+    with the per-portfolio rows under `portfolios`.
+    """
+    stock_id = serializers.IntegerField()
+    symbol = serializers.CharField()
+    name = serializers.CharField()
+    quantity = serializers.IntegerField(source='total_quantity')
+    average_cost = serializers.DecimalField(max_digits=24, decimal_places=4)
+    cost_basis = serializers.DecimalField(max_digits=24, decimal_places=4)
+    first_purchase_date = serializers.DateField()
+    portfolio_count = serializers.IntegerField()
+    portfolios = ConsolidatedPortfolioSerializer(many=True)
+
+    class Meta:
+        list_serializer_class = TimedListSerializer
+
+
+class TransactionSerializer(TimedDataMixin, serializers.ModelSerializer):
+    portfolio_name = serializers.CharField(source='portfolio.name')
+    symbol = serializers.CharField(source='stock.symbol')
+
+    class Meta:
+        model = Transaction
+        fields = ['id', 'portfolio_name', 'symbol', 'kind', 'quantity', 'price', 'ratio', 'trade_date', 'created_at']
+        read_only_fields = ['created_at']
+        list_serializer_class = TimedListSerializer
+
+    # validation of the fields each kind of transaction needs
+    def validate(self, data):
+        kind = data['kind']
+        if kind in (Transaction.BUY, Transaction.SELL, Transaction.ADJUST) and data.get('quantity', 0) <= 0:
+            raise serializers.ValidationError({"quantity": "Quantity must be a positive integer."})
+        if kind in (Transaction.BUY, Transaction.DIVIDEND, Transaction.ADJUST) and (data.get('price') is None or data['price'] <= 0):
+            raise serializers.ValidationError({"price": "Price must be a positive number."})
+        if kind == Transaction.SPLIT and (data.get('ratio') is None or data['ratio'] <= 0):
+            raise serializers.ValidationError({"ratio": "Split ratio must be a positive number."})
+        return data
+
+
+class PortfolioListSerializer(TimedListSerializer):
+    """
+    Fetches quotes for every portfolio on the page in one bulk call before rendering.
+    """
+    def to_representation(self, data):
+        portfolios = data.all() if isinstance(data, models.manager.BaseManager) else data
+        if 'market_value' in self.child.includes:
+            self.child.load_quotes(portfolios)
+        return super().to_representation(portfolios)
+
+
+class PortfolioSerializer(TimedDataMixin, SparseFieldsMixin, serializers.ModelSerializer):
     stocks = HoldingsSerializer(source='holdings_set', many=True, read_only=True)
+    # Aggregates annotated by Portfolio.objects.with_totals()
+    holding_count = serializers.IntegerField(read_only=True)
+    cost_basis = serializers.DecimalField(max_digits=24, decimal_places=4, read_only=True)
+    total_value = serializers.DecimalField(max_digits=24, decimal_places=4, read_only=True)
 
     class Meta:
         model = Portfolio
-        fields = ['id', 'name', 'user', 'stocks']
-        read_only_fields = ['user']
\ No newline at end of file
+        fields = ['id', 'name', 'user', 'stocks', 'holding_count', 'cost_basis', 'total_value']
+        read_only_fields = ['user']
+        list_serializer_class = PortfolioListSerializer
+
+    @property
+    def includes(self):
+        # Optional extras requested with ?include=market_value
+        request = self.context.get('request')
+        if request is None:
+            return set()
+        return set(filter(None, request.query_params.get('include', '').split(',')))
+
+    def load_quotes(self, portfolios):
+        """
+        Stores quotes for every stock held in the portfolios in the serializer context,
+        or None when the quote provider is unavailable.
+        """
+        symbols = {holding.stock.symbol for portfolio in portfolios for holding in portfolio.holdings_set.all()}
+        try:
+            self.context['quotes'] = get_quotes(symbols)
+        except (QuoteProviderError, TimeoutError):
+            self.context['quotes'] = None
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'market_value' in self.includes:
+            if 'quotes' not in self.context:
+                self.load_quotes([instance])
+            data['market_value'] = self.get_market_value(instance, self.context['quotes'])
+        return data
+
+    def get_market_value(self, portfolio, quotes):
+        # Holdings without a quote are valued at their purchase price
+        if quotes is None:
+            return None
+        value = sum(
+            (holding.quantity * quotes.get(holding.stock.symbol, holding.purchase_price)
+             for holding in portfolio.holdings_set.all()),
+            Decimal(0)
+        )
+        return str(value.quantize(Decimal('0.0001')))
+
+
+class ValuesRowSerializer:
+    """
+    Read-only fast path that renders values() rows for a ModelSerializer.
+
+    Each readable field's to_representation is looked up once per list instead of being
+    resolved per object, and rows are plain dicts, so rendering skips model instantiation
+    and DRF's per-object attribute resolution while producing identical output. Method
+    fields and related fields are expected to arrive already computed in the row (an
+    annotation, or the foreign key id). A nested serializer for a single object reads its
+    columns through the relation (`stock__symbol`), so values() adds the join. Nested
+    list serializers become `nested` children whose rows the caller attaches under the
+    field's source.
+    """
+    def __init__(self, serializer):
+        self.accessors = []
+        self.columns = []
+        self.nested = {}
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                child = ValuesRowSerializer(field.child)
+                self.nested[field.source] = child
+                getter, convert = itemgetter(field.source), child.to_representation
+            elif isinstance(field, serializers.BaseSerializer):
+                child = ValuesRowSerializer(field)
+                columns = {column: f'{field.source}__{column}' for column in child.columns}
+                self.columns.extend(columns.values())
+                getter, convert = self._related_getter(columns), self._single(child)
+            else:
+                source = field.field_name if field.source == '*' else field.source
+                self.columns.append(source)
+                getter = itemgetter(source)
+                # Method and related fields arrive computed (annotation, foreign key id)
+                is_computed = isinstance(field, (serializers.SerializerMethodField, serializers.RelatedField))
+                convert = None if is_computed else field.to_representation
+            self.accessors.append((field.field_name, getter, convert))
+
+    @staticmethod
+    def _related_getter(columns):
+        def getter(row):
+            values = {column: row[source] for column, source in columns.items()}
+            # A missing related row comes back as all NULLs
+            return None if all(value is None for value in values.values()) else values
+        return getter
+
+    @staticmethod
+    def _single(child):
+        return lambda row: child.to_representation([row])[0]
+
+    def to_representation(self, rows):
+        data = []
+        for row in rows:
+            item = {}
+            for name, getter, convert in self.accessors:
+                value = getter(row)
+                item[name] = value if value is None or convert is None else convert(value)
+            data.append(item)
+        return data
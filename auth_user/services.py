@@ -0,0 +1,518 @@
+import csv
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+
+from .models import CustomUser, Portfolio, Stock, Holdings, Transaction
+from .serializers import HoldingsSerializer, OnboardUserSerializer
+from .response_cache import invalidate_portfolio, invalidate_stock_responses, invalidate_user_responses
+from .idempotency import PreconditionFailed
+from .ledger import adjust_holding, record_transaction
+from .utils import batched
+
+
+IMPORT_BATCH_SIZE = 1000
+# Operations accepted by one holdings batch request
+BATCH_MAX_OPERATIONS = 500
+BATCH_OPERATIONS = ('create', 'update', 'delete')
+
+'''
+Bulk user onboarding (onboard_users command and API). Configure through
+settings.USER_ONBOARDING:
+
+    BATCH_SIZE    users validated, hashed and inserted per transaction
+    API_MAX_ROWS  rows one /onboard/ request may carry; the API hashes in the request's
+                  process, so larger files go through the command and its process pool
+'''
+ONBOARDING_DEFAULTS = {
+    'BATCH_SIZE': 1000,
+    'API_MAX_ROWS': 100,
+}
+# Passwords sent to a hashing process at a time
+HASH_CHUNK_SIZE = 50
+SYMBOL_MAX_LENGTH = Stock._meta.get_field('symbol').max_length
+# Reference-data columns sync_stocks reads from a security master, besides symbol
+STOCK_SYNC_FIELDS = ('name', 'exchange', 'sector', 'currency')
+STOCK_SYNC_BATCH_SIZE = 1000
+
+
+def iter_csv_rows(lines):
+    """
+    Yields one dict per CSV record from an iterable of byte or text lines with a header row.
+    """
+    decoded = (line.decode('utf-8') if isinstance(line, bytes) else line for line in lines)
+    yield from csv.DictReader(decoded)
+
+
+def iter_ndjson_rows(lines):
+    """
+    Yields one dict per non-blank NDJSON line; malformed lines yield their parse error instead.
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            yield exc
+
+
+def upsert_stocks(symbols):
+    """
+    Returns a symbol -> id map for the given upper-case symbols, creating missing
+    stocks (named after their symbol) with a single conflict-tolerant bulk insert.
+    """
+    stock_ids = dict(Stock.objects.filter(symbol__in=symbols).values_list('symbol', 'id'))
+    missing = set(symbols) - stock_ids.keys()
+    if missing:
+        Stock.objects.bulk_create([Stock(symbol=s, name=s) for s in missing], ignore_conflicts=True)
+        stock_ids.update(Stock.objects.filter(symbol__in=missing).values_list('symbol', 'id'))
+    return stock_ids
+
+
+def import_holdings(user, rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Imports holdings rows for a user inside a single transaction.
+
+    Portfolio names are resolved with one query up front. Each batch then upserts its
+    missing stock symbols and inserts its holdings with bulk_create. Invalid rows,
+    unknown portfolios and (portfolio, stock) pairs that already exist are reported
+    per row instead of aborting the import. Returns (created_count, errors).
+    """
+    portfolio_ids = {}
+    for portfolio_id, name in Portfolio.objects.filter(user=user).values_list('id', 'name'):
+        # A name shared by several portfolios is ambiguous for an import
+        portfolio_ids[name] = None if name in portfolio_ids else portfolio_id
+
+    created = 0
+    errors = []
+    with transaction.atomic():
+        for offset, batch in enumerate(batched(rows, batch_size)):
+            batch_created, batch_errors = _import_batch(
+                batch, portfolio_ids, first_row=offset * batch_size + 1
+            )
+            created += batch_created
+            errors.extend(batch_errors)
+        # bulk_create sends no signals, so drop the user's cached reads here
+        if created:
+            invalidate_user_responses(user.pk)
+            for portfolio_id in filter(None, portfolio_ids.values()):
+                invalidate_portfolio(portfolio_id)
+    return created, errors
+
+
+def _import_batch(batch, portfolio_ids, first_row):
+    errors = []
+    valid = []
+    for row_number, row in enumerate(batch, start=first_row):
+        if not isinstance(row, dict):
+            message = f"Invalid JSON: {row}" if isinstance(row, ValueError) else "Row must be an object."
+            errors.append({'row': row_number, 'errors': {'non_field_errors': [message]}})
+            continue
+        serializer = HoldingsSerializer(data=row)
+        if not serializer.is_valid():
+            errors.append({'row': row_number, 'errors': serializer.errors})
+            continue
+        data = serializer.validated_data
+        symbol = data['symbol'].strip().upper()
+        if len(symbol) > SYMBOL_MAX_LENGTH:
+            errors.append({'row': row_number, 'errors': {'symbol': [f"Ensure this field has no more than {SYMBOL_MAX_LENGTH} characters."]}})
+            continue
+        portfolio_id = portfolio_ids.get(data['portfolio_name'])
+        if portfolio_id is None:
+            errors.append({'row': row_number, 'errors': {'portfolio_name': ["Invalid portfolio name or you do not have permission to access this portfolio."]}})
+            continue
+        valid.append((row_number, portfolio_id, symbol, data))
+
+    if not valid:
+        return 0, errors
+
+    stock_ids = upsert_stocks({symbol for _, _, symbol, _ in valid})
+
+    # Skip pairs that already exist or repeat within the import
+    taken = set(Holdings.objects.filter(
+        portfolio_id__in={portfolio_id for _, portfolio_id, _, _ in valid},
+        stock_id__in=stock_ids.values(),
+    ).values_list('portfolio_id', 'stock_id'))
+    rows = []
+    for row_number, portfolio_id, symbol, data in valid:
+        pair = (portfolio_id, stock_ids[symbol])
+        if pair in taken:
+            errors.append({'row': row_number, 'errors': {'error': ["This stock already exists in your portfolio."]}})
+            continue
+        taken.add(pair)
+        rows.append((row_number, Holdings(
+            portfolio_id=portfolio_id,
+            stock_id=pair[1],
+            quantity=data.get('quantity', 1),
+            purchase_price=data['purchase_price'],
+        )))
+    holdings = _insert_holdings(rows, errors)
+    # Each imported position opens with a buy in the ledger, for the rows actually inserted
+    Transaction.objects.bulk_create([
+        Transaction(portfolio_id=holding.portfolio_id, stock_id=holding.stock_id, kind=Transaction.BUY,
+                    quantity=holding.quantity, price=holding.purchase_price)
+        for holding in holdings
+    ])
+    errors.sort(key=lambda error: error['row'])
+    return len(holdings), errors
+
+
+def _insert_holdings(rows, errors):
+    """
+    Inserts (row_number, holding) pairs with one bulk_create and returns the holdings
+    inserted. If a concurrent write took a pair since the duplicate check, the batch
+    is retried row by row, each in a savepoint, and the conflicting rows are reported.
+    """
+    holdings = [holding for _, holding in rows]
+    try:
+        with transaction.atomic():
+            Holdings.objects.bulk_create(holdings)
+        return holdings
+    except IntegrityError:
+        pass
+    inserted = []
+    for row_number, holding in rows:
+        holding.pk = None
+        try:
+            with transaction.atomic():
+                Holdings.objects.bulk_create([holding])
+        except IntegrityError:
+            errors.append({'row': row_number, 'errors': {'error': ["This stock already exists in your portfolio."]}})
+        else:
+            inserted.append(holding)
+    return inserted
+
+
+class BatchRejected(serializers.ValidationError):
+    """
+    A 400 listing the invalid operations of a batch by index.
+    """
+    def __init__(self, errors):
+        super().__init__()
+        # The indexes stay numbers rather than becoming error strings
+        self.detail = {'errors': errors}
+
+
+def apply_holdings_batch(user, operations):
+    """
+    Applies create, update and delete operations to a user's holdings in one
+    transaction: every operation succeeds or none does.
+
+    The holdings named by updates and deletes are locked with a single SELECT ... FOR
+    UPDATE in id order, so concurrent batches over overlapping holdings queue up
+    instead of deadlocking. An operation carrying `version` is refused when the holding
+    has moved on. Raises PreconditionFailed listing every stale operation, or
+    BatchRejected listing every invalid one; otherwise returns the per-operation
+    results in request order.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise serializers.ValidationError({"operations": "Send a non-empty list of operations."})
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        raise serializers.ValidationError({"operations": f"Send at most {BATCH_MAX_OPERATIONS} operations."})
+
+    errors = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in BATCH_OPERATIONS:
+            errors.append({'index': index, 'errors': {'op': [f"Choose one of: {', '.join(BATCH_OPERATIONS)}."]}})
+        elif operation['op'] != 'create' and (type(operation.get('id')) is not int):
+            errors.append({'index': index, 'errors': {'id': ["This field is required."]}})
+        elif operation.get('version') is not None and type(operation['version']) is not int:
+            errors.append({'index': index, 'errors': {'version': ["Enter the holding's version as a whole number."]}})
+    if errors:
+        raise BatchRejected(errors)
+
+    portfolio_ids = {}
+    if any(operation['op'] == 'create' for operation in operations):
+        for portfolio_id, name in Portfolio.objects.filter(user=user).values_list('id', 'name'):
+            portfolio_ids[name] = None if name in portfolio_ids else portfolio_id
+
+    results, conflicts = [], []
+    with transaction.atomic():
+        ids = {operation['id'] for operation in operations if operation['op'] != 'create'}
+        locked = {
+            holding.pk: holding
+            for holding in Holdings.objects.select_for_update(of=('self',)).select_related('portfolio', 'stock')
+            .filter(portfolio__user=user, pk__in=ids).order_by('id')
+        }
+        for index, operation in enumerate(operations):
+            if operation['op'] == 'create':
+                result, error = _batch_create(operation, portfolio_ids)
+            else:
+                holding = locked.get(operation['id'])
+                if holding is None:
+                    errors.append({'index': index, 'errors': {'id': ["Not found."]}})
+                    continue
+                if operation.get('version') is not None and operation['version'] != holding.version:
+                    conflicts.append({'index': index, 'id': holding.pk, 'version': holding.version})
+                    continue
+                if operation['op'] == 'update':
+                    result, error = _batch_update(holding, operation)
+                else:
+                    result, error = _batch_delete(holding, locked)
+            if error:
+                errors.append({'index': index, 'errors': error})
+            else:
+                results.append({'op': operation['op'], **result})
+
+        # Raising rolls back every operation already applied
+        if conflicts:
+            raise PreconditionFailed(conflicts=conflicts)
+        if errors:
+            raise BatchRejected(errors)
+    return results
+
+
+def _batch_create(operation, portfolio_ids):
+    serializer = HoldingsSerializer(data=operation)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    data = serializer.validated_data
+    portfolio_id = portfolio_ids.get(data.pop('portfolio_name'))
+    if portfolio_id is None:
+        return None, {'portfolio_name': ["Invalid portfolio name or you do not have permission to access this portfolio."]}
+    symbol = data.pop('symbol').strip().upper()
+    if len(symbol) > SYMBOL_MAX_LENGTH:
+        return None, {'symbol': [f"Ensure this field has no more than {SYMBOL_MAX_LENGTH} characters."]}
+    stock_id = upsert_stocks({symbol})[symbol]
+    # The savepoint lets a duplicate holding be reported without aborting the batch
+    try:
+        with transaction.atomic():
+            holding = serializer.save(portfolio_id=portfolio_id, stock_id=stock_id)
+    except IntegrityError:
+        return None, {'error': ["This stock already exists in your portfolio."]}
+    Transaction.objects.create(
+        portfolio_id=portfolio_id, stock_id=stock_id, kind=Transaction.BUY,
+        quantity=holding.quantity, price=holding.purchase_price
+    )
+    return {'id': holding.pk, 'holding': serializer.data}, None
+
+
+def _batch_update(holding, operation):
+    data = {field: value for field, value in operation.items() if field not in ('op', 'id', 'version')}
+    serializer = HoldingsSerializer(holding, data=data, partial=True)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    # Quantity and price change through the ledger; portfolio and stock stay as they are
+    data = serializer.validated_data
+    serializer.instance = adjust_holding(holding, data.get('quantity'), data.get('purchase_price'))
+    return {'id': holding.pk, 'holding': serializer.data}, None
+
+
+def _batch_delete(holding, locked):
+    # Closing a position is a sale of every remaining share, as in HoldingsViewSet
+    try:
+        record_transaction(holding.portfolio, holding.stock, Transaction.SELL, quantity=holding.quantity)
+    except serializers.ValidationError as exc:
+        return None, exc.detail
+    # A later operation on the same id finds nothing
+    del locked[holding.pk]
+    return {'id': holding.pk}, None
+
+
+def get_onboarding_config():
+    return {**ONBOARDING_DEFAULTS, **getattr(settings, 'USER_ONBOARDING', {})}
+
+
+@contextmanager
+def password_hasher_pool(workers):
+    """
+    Yields a process pool for hashing passwords, or None to hash inline when workers is 1.
+    Workers are spawned, so they never share the caller's database connections.
+    """
+    if workers <= 1:
+        yield None
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+    ) as pool:
+        yield pool
+
+
+def onboard_users(rows, batch_size=None, pool=None):
+    """
+    Creates users and their auth tokens from dict rows (email, username, password,
+    first_name, last_name, date_of_birth).
+
+    Rows are validated and inserted a batch at a time, each batch in its own transaction:
+    one lookup of the emails and usernames already taken, passwords hashed across the
+    pool, then bulk_create for the users and for their tokens. bulk_create sends no
+    signals, so the token and response-cache reset done by signals.py are done here.
+    Emails that already have an account are skipped, so an interrupted onboarding can
+    simply be run again. Returns (created, skipped, errors).
+    """
+    batch_size = batch_size or get_onboarding_config()['BATCH_SIZE']
+    created = skipped = 0
+    errors = []
+    seen = set()
+    for offset, batch in enumerate(batched(rows, batch_size)):
+        valid, batch_errors = _validate_users(batch, seen, first_row=offset * batch_size + 1)
+        errors.extend(batch_errors)
+        try:
+            batch_created, batch_skipped, batch_errors = _onboard_batch(valid, pool)
+        except IntegrityError:
+            # An account was registered concurrently; the retry sees it and skips it
+            batch_created, batch_skipped, batch_errors = _onboard_batch(valid, pool)
+        created += batch_created
+        skipped += batch_skipped
+        errors.extend(batch_errors)
+    errors.sort(key=lambda error: error['row'])
+    return created, skipped, errors
+
+
+def _validate_users(batch, seen, first_row):
+    valid, errors = [], []
+    for row_number, row in enumerate(batch, start=first_row):
+        serializer = OnboardUserSerializer(data=row)
+        if not serializer.is_valid():
+            errors.append({'row': row_number, 'errors': serializer.errors})
+            continue
+        data = dict(serializer.validated_data)
+        data['email'] = CustomUser.objects.normalize_email(data['email'])
+        # The same account twice in one file is a mistake in the file, not a re-run
+        for field in ('email', 'username'):
+            if (field, data[field]) in seen:
+                errors.append({'row': row_number, 'errors': {field: [f"Duplicate {field} in this file."]}})
+                break
+        else:
+            seen.update([('email', data['email']), ('username', data['username'])])
+            valid.append((row_number, data))
+    return valid, errors
+
+
+def _onboard_batch(valid, pool):
+    if not valid:
+        return 0, 0, []
+    errors = []
+    with transaction.atomic():
+        taken = CustomUser.objects.filter(
+            Q(email__in=[data['email'] for _, data in valid]) | Q(username__in=[data['username'] for _, data in valid])
+        ).values_list('id', 'email', 'username')
+        existing_ids = {email: user_id for user_id, email, _ in taken}
+        taken_usernames = {username: email for _, email, username in taken}
+
+        new = []
+        for row_number, data in valid:
+            if data['email'] in existing_ids:
+                continue
+            if data['username'] in taken_usernames:
+                errors.append({'row': row_number, 'errors': {'username': ["A user with that username already exists."]}})
+                continue
+            new.append(data)
+
+        # Hashing dominates; argon2 is CPU-bound, so it is spread over processes
+        passwords = [data.get('password') or None for data in new]
+        hashes = map(make_password, passwords) if pool is None else pool.map(
+            make_password, passwords, chunksize=HASH_CHUNK_SIZE
+        )
+        users = CustomUser.objects.bulk_create([
+            CustomUser(**{**data, 'password': password_hash}) for data, password_hash in zip(new, hashes)
+        ])
+        if users and users[0].pk is None:
+            # Backends that cannot return inserted primary keys (MySQL) need a lookup
+            ids = dict(CustomUser.objects.filter(email__in=[user.email for user in users]).values_list('email', 'id'))
+            for user in users:
+                user.pk = ids[user.email]
+
+        # Existing accounts from an interrupted run may still lack their token
+        user_ids = [user.pk for user in users] + list(existing_ids.values())
+        with_token = set(Token.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+        Token.objects.bulk_create([
+            Token(user_id=user_id, key=Token.generate_key()) for user_id in user_ids if user_id not in with_token
+        ])
+        for user in users:
+            invalidate_user_responses(user.pk)
+    return len(users), len(valid) - len(new) - len(errors), errors
+
+
+def sync_stocks(rows, batch_size=STOCK_SYNC_BATCH_SIZE, dry_run=False):
+    """
+    Brings the Stock table in line with a security master: rows (dicts keyed by symbol
+    and any of STOCK_SYNC_FIELDS) create missing stocks and update the ones whose
+    reference data differs. A column the file leaves out keeps its stored value, and
+    stocks missing from the file are left alone, since holdings and prices refer to them.
+
+    The stored rows for each batch of symbols are read with one query into a dict keyed
+    by symbol and diffed against the file in memory. Only new or changed rows are
+    written, with bulk_create and bulk_update in batches inside one transaction. A
+    later row for the same symbol wins. Returns (created, updated, unchanged, errors);
+    dry_run writes nothing.
+    """
+    errors = []
+    incoming = {}
+    for row_number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            message = f"Invalid JSON: {row}" if isinstance(row, ValueError) else "Row must be an object."
+            errors.append({'row': row_number, 'errors': {'non_field_errors': [message]}})
+            continue
+        symbol, data, row_errors = _clean_stock_row(row)
+        if row_errors:
+            errors.append({'row': row_number, 'errors': row_errors})
+        else:
+            incoming[symbol] = data
+
+    to_create, to_update = [], []
+    columns = ('id', 'symbol', *STOCK_SYNC_FIELDS)
+    for symbols in batched(incoming, batch_size):
+        current = {row[1]: row for row in Stock.objects.filter(symbol__in=symbols).values_list(*columns)}
+        for symbol in symbols:
+            data, existing = incoming[symbol], current.get(symbol)
+            if existing is None:
+                to_create.append(Stock(symbol=symbol, **{'name': symbol, **data}))
+                continue
+            stored = dict(zip(STOCK_SYNC_FIELDS, existing[2:]))
+            changed = {field for field, value in data.items() if stored[field] != value}
+            if changed:
+                to_update.append((Stock(id=existing[0], symbol=symbol, **{**stored, **data}), changed))
+
+    if not dry_run and (to_create or to_update):
+        with transaction.atomic():
+            # A stock created concurrently since the read is left for the next sync
+            Stock.objects.bulk_create(to_create, batch_size=batch_size, ignore_conflicts=True)
+            # Each batch sets only the columns some of its rows changed
+            for batch in batched(to_update, batch_size):
+                changed = set().union(*(fields for _, fields in batch))
+                Stock.objects.bulk_update(
+                    [stock for stock, _ in batch], [field for field in STOCK_SYNC_FIELDS if field in changed]
+                )
+            # Bulk writes send no signals, so drop the cached reads that include stocks
+            invalidate_stock_responses()
+    unchanged = len(incoming) - len(to_create) - len(to_update)
+    return len(to_create), len(to_update), unchanged, errors
+
+
+def _clean_stock_row(row):
+    """
+    Returns (symbol, {field: value}, errors) for one security-master row, with values
+    stripped, symbol, exchange and currency upper-cased, and lengths checked against
+    the model.
+    """
+    errors = {}
+    symbol = str(row.get('symbol') or '').strip().upper()
+    if not symbol:
+        errors['symbol'] = ["This field is required."]
+    elif len(symbol) > SYMBOL_MAX_LENGTH:
+        errors['symbol'] = [f"Ensure this field has no more than {SYMBOL_MAX_LENGTH} characters."]
+    data = {}
+    for field in STOCK_SYNC_FIELDS:
+        if field not in row:
+            continue
+        value = str(row[field] if row[field] is not None else '').strip()
+        if field in ('exchange', 'currency'):
+            value = value.upper()
+        max_length = Stock._meta.get_field(field).max_length
+        if len(value) > max_length:
+            errors[field] = [f"Ensure this field has no more than {max_length} characters."]
+        elif field == 'name' and not value:
+            errors[field] = ["This field may not be blank."]
+        data[field] = value
+    return symbol, data, errors
@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
 from django.conf import settings
+from .authentication import cache_token, invalidate_token
+from .models import Portfolio, Holdings, Stock
+from .response_cache import invalidate_portfolio, invalidate_user_responses, invalidate_stock_responses
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
@@ -11,3 +15,80 @@ def create_auth_token(sender, instance=None, created=False, **kwargs):
     """
     if created:
         Token.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Token)
+def cache_created_token(sender, instance=None, created=False, **kwargs):
+    """
+    Warms the token cache once a new token is committed.
+    """
+    if created:
+        transaction.on_commit(lambda: cache_token(instance))
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance=None, **kwargs):
+    """
+    Evicts a deleted token now and again on commit, so a concurrent request
+    cannot re-cache it before the delete is visible.
+    """
+    invalidate_token(instance.key)
+    transaction.on_commit(lambda: invalidate_token(instance.key))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def evict_user_tokens(sender, instance=None, created=False, **kwargs):
+    """
+    Evicts the user's cached token whenever an existing user is saved, so
+    deactivation and other account changes are seen on the next request.
+    """
+    update_fields = kwargs.get('update_fields')
+    if created or (update_fields and set(update_fields) == {'last_login'}):
+        return
+    for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+        invalidate_token(key)
+        transaction.on_commit(lambda key=key: invalidate_token(key))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reset_user_responses(sender, instance=None, created=False, **kwargs):
+    """
+    Starts a new user on a fresh response-cache version, so a reused primary key
+    can never see entries cached for an earlier account.
+    """
+    if created:
+        invalidate_user_responses(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Portfolio)
+def invalidate_portfolio_responses(sender, instance=None, **kwargs):
+    """
+    Drops the owner's cached portfolio and holdings responses.
+    """
+    invalidate_user_responses(instance.user_id)
+    invalidate_portfolio(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Holdings)
+def invalidate_holding_responses(sender, instance=None, origin=None, **kwargs):
+    """
+    Drops the owner's cached responses when one of their holdings changes.
+    """
+    # Cascades are covered by the parent's receiver; bulk writers invalidate for themselves
+    if origin is not None and not isinstance(origin, Holdings):
+        return
+    if Holdings.portfolio.is_cached(instance):
+        user_id = instance.portfolio.user_id
+    else:
+        user_id = Portfolio.objects.filter(pk=instance.portfolio_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        invalidate_user_responses(user_id)
+    invalidate_portfolio(instance.portfolio_id)
+
+
+@receiver([post_save, post_delete], sender=Stock)
+def invalidate_stock_dependent_responses(sender, **kwargs):
+    """
+    Stocks are shared by every user, so a change bumps the global stocks version.
+    """
+    invalidate_stock_responses()
@@ -0,0 +1,82 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+
+from .ledger import apply_to_position
+from .models import PortfolioSnapshot, Transaction
+from .valuation import forward_fill, price_rows
+
+
+AMOUNT_QUANTUM = Decimal('0.0001')
+
+
+def build_snapshots(portfolio_id, start, end):
+    """
+    Returns unsaved PortfolioSnapshot rows for every day from start to end (inclusive).
+
+    Positions come from replaying the portfolio's ledger, so each day is valued with the
+    shares actually held that day. Prices are forward filled over weekends and holidays,
+    seeded with each stock's last close before start (see valuation.price_rows); a
+    position with no close yet is valued at its average cost, as in the valuation endpoint.
+    """
+    days = (end - start).days + 1
+    if days <= 0:
+        return []
+    entries = list(
+        Transaction.objects.filter(portfolio_id=portfolio_id, trade_date__lte=end).order_by('trade_date', 'id')
+    )
+    stock_ids = sorted({entry.stock_id for entry in entries})
+    if not stock_ids:
+        return []
+    column_of = {stock_id: column for column, stock_id in enumerate(stock_ids)}
+
+    # Record each position on the day it changes (entries before start land on day 0),
+    # then forward fill so every day carries the position left by the last change
+    quantities = np.full((days, len(stock_ids)), np.nan)
+    costs = np.full((days, len(stock_ids)), np.nan)
+    positions = {}
+    for entry in entries:
+        quantity, cost = positions.get(entry.stock_id, (0, Decimal(0)))
+        quantity, cost = positions[entry.stock_id] = apply_to_position(quantity, cost, entry)
+        row, column = max((entry.trade_date - start).days, 0), column_of[entry.stock_id]
+        quantities[row, column], costs[row, column] = quantity, cost
+    quantities = np.nan_to_num(forward_fill(quantities))
+    costs = np.nan_to_num(forward_fill(costs))
+
+    prices = np.full((days, len(stock_ids)), np.nan)
+    for day, stock_id, close in price_rows(stock_ids, start, end):
+        prices[(day - start).days, column_of[stock_id]] = close
+    prices = forward_fill(prices)
+    prices = np.where(np.isnan(prices), costs, prices)
+
+    market_values = (quantities * prices).sum(axis=1)
+    cost_bases = (quantities * costs).sum(axis=1)
+    return [
+        PortfolioSnapshot(
+            portfolio_id=portfolio_id,
+            date=start + timedelta(days=offset),
+            market_value=_amount(market_values[offset]),
+            cost_basis=_amount(cost_bases[offset]),
+            pnl=_amount(market_values[offset] - cost_bases[offset]),
+        )
+        for offset in range(days)
+    ]
+
+
+def downsample(rows, interval):
+    """
+    Keeps the last row of each week or month from date-ordered rows whose first item
+    is the date; 'day' returns the rows unchanged.
+    """
+    if interval == 'day':
+        return list(rows)
+    period = (lambda day: day.isocalendar()[:2]) if interval == 'week' else (lambda day: (day.year, day.month))
+    sampled = {}
+    for row in rows:
+        sampled[period(row[0])] = row
+    return list(sampled.values())
+
+
+def _amount(value):
+    return Decimal(float(value)).quantize(AMOUNT_QUANTUM)
@@ -2,10 +2,42 @@ from django.test import TestCase
 
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework.authtoken.models import Token
-from .models import CustomUser, Portfolio, Holdings, Stock
+from .models import CustomUser, Portfolio, PortfolioSnapshot, PhotoTask, Holdings, IdempotencyKey, Stock, StockPrice, Transaction
+from .authentication import SHARED_KEY_PREFIX, get_local_cache
+from .cache import TTLCache
+from .quotes import LocalQuoteProvider, QuoteService
+from .ledger import record_transaction
+from .profiling import fingerprint
+from .photos import enqueue_photo
+from .renderers import ORJSONRenderer
+from .routers import PrimaryReplicaRouter, routing_state, use_replicas
+from .serializers import HoldingsSerializer, PortfolioSerializer
+from .services import _insert_holdings
+from .throttling import LoginAccountThrottle, LoginIPThrottle
+import io
+import pickle
 import json
+import os
+import tempfile
+import threading
+import numpy as np
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from django.db.models import Prefetch
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from django.contrib.auth.hashers import get_hasher, identify_hasher, make_password
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from unittest import mock
 
 class ViewsTestCase(APITestCase):
     """
@@ -105,5 +137,1512 @@ class ViewsTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Holdings.objects.filter(id=holding_id).exists())
 
+    def test_portfolio_totals_are_aggregated(self):
+        """
+        Test that portfolio totals are computed in the database with Decimal precision.
+        """
+        Holdings.objects.create(
+            portfolio=self.portfolio,
+            stock=Stock.objects.create(symbol="MSFT", name="Microsoft"),
+            quantity=3,
+            purchase_price='0.3333'
+        )
+        url = reverse('portfolio-detail', kwargs={'pk': self.portfolio.pk})
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['holding_count'], 2)
+        self.assertEqual(response.data['cost_basis'], '1500.9999')
+        self.assertEqual(response.data['total_value'], '1500.9999')
+        self.assertEqual(response.data['stocks'][1]['total_amount'], Decimal('0.9999'))
+
+    def test_create_portfolio_returns_totals(self):
+        """
+        Test that a newly created portfolio is returned with zeroed totals.
+        """
+        response = self.client.post(reverse('portfolio-list'), {'name': 'Empty'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['holding_count'], 0)
+        self.assertEqual(response.data['total_value'], '0.0000')
+
+
+class QueryCountTestCase(APITestCase):
+    """
+    Regression suite asserting that list endpoints run in a fixed number of queries
+    regardless of how many holdings the user owns.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="counter@example.com",
+            username="counter",
+            password="testpassword123",
+        )
+        self.token = Token.objects.get(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def create_holdings(self, total, per_portfolio=100):
+        """
+        Bulk creates `total` holdings spread across portfolios of `per_portfolio` holdings each.
+        """
+        stocks = Stock.objects.bulk_create(
+            [Stock(symbol=f"S{i}", name=f"Stock {i}") for i in range(min(total, per_portfolio))]
+        )
+        portfolio_count = -(-total // per_portfolio)
+        portfolios = Portfolio.objects.bulk_create(
+            [Portfolio(user=self.user, name=f"Portfolio {i}") for i in range(portfolio_count)]
+        )
+        holdings = [
+            Holdings(portfolio=portfolios[i // per_portfolio], stock=stocks[i % per_portfolio],
+                     quantity=1 + i % 7, purchase_price=10 + i % 13)
+            for i in range(total)
+        ]
+        Holdings.objects.bulk_create(holdings, batch_size=1000)
+
+    def assert_list_queries(self, url_name, total, expected):
+        self.create_holdings(total)
+        with self.assertNumQueries(expected):
+            response = self.client.get(reverse(url_name), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    # Token lookup, portfolios and one prefetch of holdings with their stocks
+    def test_portfolio_list_queries_1_holding(self):
+        self.assert_list_queries('portfolio-list', 1, 3)
+
+    def test_portfolio_list_queries_100_holdings(self):
+        self.assert_list_queries('portfolio-list', 100, 3)
+
+    def test_portfolio_list_queries_10k_holdings(self):
+        self.assert_list_queries('portfolio-list', 10000, 3)
+
+    # Token lookup and the holdings query joined with their stocks
+    def test_holdings_list_queries_1_holding(self):
+        self.assert_list_queries('holdings-list', 1, 2)
+
+    def test_holdings_list_queries_100_holdings(self):
+        self.assert_list_queries('holdings-list', 100, 2)
+
+    def test_holdings_list_queries_10k_holdings(self):
+        self.assert_list_queries('holdings-list', 10000, 2)
+
+    def test_portfolio_detail_queries(self):
+        self.create_holdings(100)
+        portfolio = Portfolio.objects.filter(user=self.user).first()
+        url = reverse('portfolio-detail', kwargs={'pk': portfolio.pk})
+        with self.assertNumQueries(3):
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['stocks']), 100)
+
+
+class PaginationTestCase(APITestCase):
+    """
+    Test suite for keyset cursor pagination on the list endpoints.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="pager@example.com",
+            username="pager",
+            password="testpassword123",
+        )
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+        portfolio = Portfolio.objects.create(user=self.user, name="Paged")
+        stocks = Stock.objects.bulk_create([Stock(symbol=f"P{i}", name=f"P{i}") for i in range(11)])
+        # Many ties on quantity so pages must break them on id
+        Holdings.objects.bulk_create([
+            Holdings(portfolio=portfolio, stock=stock, quantity=1 + i % 3, purchase_price=10)
+            for i, stock in enumerate(stocks)
+        ])
+
+    def walk(self, url, key):
+        ids = []
+        while url:
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data[key]
+        return ids
+
+    def test_holdings_pages_are_stable_under_ordering(self):
+        """
+        Test that walking forward then backward visits every holding exactly once in order.
+        """
+        expected = list(
+            Holdings.objects.order_by('-quantity', '-id').values_list('id', flat=True)
+        )
+        url = reverse('holdings-list') + '?ordering=-quantity&page_size=4'
+        forward = self.walk(url, 'next')
+        self.assertEqual(forward, expected)
+
+        last_page = self.client.get(url, format='json')
+        while last_page.data['next']:
+            last_page = self.client.get(last_page.data['next'], format='json')
+        backward = self.walk(last_page.data['previous'], 'previous')
+        self.assertCountEqual(backward, expected[:8])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('holdings-list') + '?cursor=bogus', format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
+class TokenCacheTestCase(APITestCase):
+    """
+    Test suite for CachedTokenAuthentication and its signal-driven invalidation.
+    Doubles as a benchmark of the queries saved on the holdings read path.
+    """
+
+    def setUp(self):
+        get_local_cache().clear()
+        self.user = CustomUser.objects.create_user(
+            email="cached@example.com",
+            username="cached",
+            password="testpassword123",
+        )
+        self.token = Token.objects.get(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.url = reverse('holdings-list')
+
+    def test_cached_token_skips_lookup(self):
+        # Cold request: token/user join plus the holdings query
+        with self.assertNumQueries(2):
+            self.client.get(self.url, format='json')
+        # Warm requests: only the holdings query remains
+        for _ in range(3):
+            with self.assertNumQueries(1):
+                response = self.client.get(self.url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(TOKEN_AUTH_CACHE={'SHARED_CACHE': 'default'})
+    def test_cached_user_has_no_password_hash(self):
+        cache.clear()
+        self.client.get(self.url, format='json')
+        for token in (get_local_cache().get(self.token.key), cache.get(SHARED_KEY_PREFIX + self.token.key)):
+            self.assertIn('password', token.user.get_deferred_fields())
+        self.assertNotIn(self.user.password.encode(), pickle.dumps(cache.get(SHARED_KEY_PREFIX + self.token.key)))
+
+        # A view that needs the hash loads it; saving the cached user keeps it
+        user = get_local_cache().get(self.token.key).user
+        self.assertTrue(user.check_password("testpassword123"))
+        cached = cache.get(SHARED_KEY_PREFIX + self.token.key).user
+        cached.first_name = "Cached"
+        cached.save()
+        self.assertTrue(CustomUser.objects.get(pk=self.user.pk).check_password("testpassword123"))
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(self.url, format='json')
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_is_rejected(self):
+        self.client.get(self.url, format='json')
+        self.token.delete()
+        response = self.client.get(self.url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_ttl_cache_expiry_and_lru_eviction(self):
+        now = [0]
+        cache = TTLCache(max_size=2, ttl=10, timer=lambda: now[0])
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        now[0] = 10
+        self.assertIsNone(cache.get('a'))
+
+
+class BulkImportTestCase(APITestCase):
+    """
+    Test suite for the bulk holdings import endpoint.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="importer@example.com",
+            username="importer",
+            password="testpassword123",
+        )
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+        self.portfolio = Portfolio.objects.create(user=self.user, name="Broker")
+        Holdings.objects.create(
+            portfolio=self.portfolio,
+            stock=Stock.objects.create(symbol="AAPL", name="Apple"),
+            quantity=1,
+            purchase_price=100
+        )
+        self.url = reverse('holdings-bulk-import')
+
+    def test_json_import_reports_row_errors(self):
+        rows = [
+            {"portfolio_name": "Broker", "symbol": "nvda", "quantity": 2, "purchase_price": "10.5"},
+            {"portfolio_name": "Broker", "symbol": "AAPL", "quantity": 1, "purchase_price": "1"},
+            {"portfolio_name": "Unknown", "symbol": "MSFT", "quantity": 1, "purchase_price": "1"},
+            {"portfolio_name": "Broker", "symbol": "MSFT", "quantity": -1, "purchase_price": "1"},
+            {"portfolio_name": "Broker", "symbol": "NVDA", "quantity": 3, "purchase_price": "1"},
+        ]
+        response = self.client.post(self.url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 4, 5])
+        holding = Holdings.objects.get(stock__symbol="NVDA")
+        self.assertEqual(holding.quantity, 2)
+        self.assertEqual(holding.portfolio, self.portfolio)
+
+    def test_csv_import_runs_in_constant_queries(self):
+        lines = ["portfolio_name,symbol,quantity,purchase_price"]
+        lines += [f"Broker,S{i},{i + 1},12.5" for i in range(100)]
+        # Token, portfolios, savepoint pair, then stocks lookup/insert/reload, existing pairs,
+        # holdings insert in its own savepoint and ledger insert (100 rows fit one insert even
+        # under SQLite's bind-parameter limit)
+        with self.assertNumQueries(12):
+            response = self.client.post(self.url, "\n".join(lines), content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 100)
+        self.assertEqual(Holdings.objects.filter(portfolio=self.portfolio).count(), 101)
+
+    def test_ndjson_import_reports_malformed_lines(self):
+        body = '{"portfolio_name": "Broker", "symbol": "TSLA", "purchase_price": "5"}\n{oops\n'
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+
+    def test_pair_taken_after_the_duplicate_check_gets_no_ledger_entry(self):
+        # A concurrent import inserted AAPL between the duplicate check and the insert
+        apple, msft = Stock.objects.get(symbol="AAPL"), Stock.objects.create(symbol="MSFT", name="MSFT")
+        rows = [
+            (1, Holdings(portfolio=self.portfolio, stock=apple, quantity=2, purchase_price=1)),
+            (2, Holdings(portfolio=self.portfolio, stock=msft, quantity=3, purchase_price=1)),
+        ]
+        errors = []
+        inserted = _insert_holdings(rows, errors)
+        self.assertEqual([holding.stock_id for holding in inserted], [msft.id])
+        self.assertEqual([error['row'] for error in errors], [1])
+        self.assertEqual(Holdings.objects.get(stock=apple).quantity, 1)
+
+
+class ExportTestCase(APITestCase):
+    """
+    Test suite for the streaming CSV/NDJSON exports.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="exporter@example.com",
+            username="exporter",
+            password="testpassword123",
+        )
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+        portfolio = Portfolio.objects.create(user=self.user, name="Main")
+        for symbol, price in [("AAPL", 100), ("MSFT", 300), ("NVDA", 900)]:
+            Holdings.objects.create(
+                portfolio=portfolio,
+                stock=Stock.objects.create(symbol=symbol, name=symbol),
+                quantity=2,
+                purchase_price=price
+            )
+
+    def test_holdings_csv_export_applies_filters(self):
+        url = reverse('holdings-export') + '?purchase_price__gte=200'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,portfolio_name,symbol,quantity,purchase_price,purchase_date,total_amount')
+        self.assertEqual([line.split(',')[2] for line in lines[1:]], ['MSFT', 'NVDA'])
+
+    def test_portfolio_ndjson_export(self):
+        response = self.client.get(reverse('portfolio-export') + '?as=ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['holding_count'], 3)
+        self.assertEqual(Decimal(rows[0]['total_value']), Decimal('2600'))
+
+
+class StockFilterTestCase(APITestCase):
+    """
+    Test suite for the stock lookup endpoint and the filtersets wired into the viewsets.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="filters@example.com",
+            username="filters",
+            password="testpassword123",
+        )
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+        Stock.objects.bulk_create([
+            Stock(symbol="AAPL", name="Apple Inc."),
+            Stock(symbol="AMD", name="Advanced Micro Devices"),
+            Stock(symbol="AMZN", name="Amazon.com Inc."),
+            Stock(symbol="MSFT", name="Microsoft Corporation"),
+        ])
+
+    def test_symbol_prefix_autocomplete(self):
+        response = self.client.get(reverse('stocks-list') + '?prefix=am', format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([stock['symbol'] for stock in response.data['results']], ['AMD', 'AMZN'])
+
+    def test_name_icontains(self):
+        response = self.client.get(reverse('stocks-list') + '?name__icontains=inc', format='json')
+        self.assertEqual([stock['symbol'] for stock in response.data['results']], ['AAPL', 'AMZN'])
+
+    def test_holdings_filter_ranges(self):
+        portfolio = Portfolio.objects.create(user=self.user, name="Ranges")
+        for stock, price in zip(Stock.objects.order_by('symbol'), [50, 150, 250, 350]):
+            Holdings.objects.create(portfolio=portfolio, stock=stock, quantity=1, purchase_price=price)
+        url = reverse('holdings-list') + '?purchase_price__gte=100&purchase_price__lte=300&portfolio__name=Ranges'
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class ValuationTestCase(APITestCase):
+    """
+    Test suite for the price loader and the portfolio valuation action.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="valuer@example.com",
+            username="valuer",
+            password="testpassword123",
+        )
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+        self.portfolio = Portfolio.objects.create(user=self.user, name="Valued")
+        self.aapl = Stock.objects.create(symbol="AAPL", name="Apple")
+        self.msft = Stock.objects.create(symbol="MSFT", name="Microsoft")
+        Holdings.objects.create(portfolio=self.portfolio, stock=self.aapl, quantity=10, purchase_price=100)
+        Holdings.objects.create(portfolio=self.portfolio, stock=self.msft, quantity=2, purchase_price=300)
+
+    def load_prices(self, text):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write(text)
+        self.addCleanup(os.remove, handle.name)
+        call_command('load_prices', handle.name, stdout=io.StringIO())
+
+    def test_load_prices_upserts(self):
+        self.load_prices("symbol,date,close\naapl,2024-01-02,1\nNVDA,2024-01-02,500\n")
+        self.load_prices("symbol,date,close\nAAPL,2024-01-02,110\n")
+        self.assertEqual(StockPrice.objects.get(stock=self.aapl).close, Decimal('110'))
+        self.assertTrue(Stock.objects.filter(symbol="NVDA").exists())
+
+    def test_load_prices_rejects_short_rows(self):
+        with self.assertRaisesMessage(CommandError, "Invalid row"):
+            self.load_prices("symbol,date,close\nAAPL,2024-01-02\n")
+        self.assertFalse(StockPrice.objects.exists())
+
+    def test_valuation_forward_fills_and_computes_returns(self):
+        self.load_prices(
+            "symbol,date,close\n"
+            "AAPL,2024-01-02,110\nMSFT,2024-01-02,300\n"
+            "AAPL,2024-01-03,121\n"
+            "AAPL,2024-01-04,110\nMSFT,2024-01-04,330\n"
+        )
+        url = reverse('portfolio-valuation', kwargs={'pk': self.portfolio.pk})
+        with self.assertNumQueries(4):
+            response = self.client.get(url + '?start=2024-01-01&end=2024-01-31', format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['cost_basis'], '1600.0000')
+        self.assertEqual(response.data['market_value'], '1760.0000')
+        self.assertEqual(response.data['unrealized_pnl'], '160.0000')
+        self.assertEqual([point['market_value'] for point in response.data['series']],
+                         ['1700.0000', '1810.0000', '1760.0000'])
+        self.assertEqual(response.data['series'][1]['daily_return'], round(1810 / 1700 - 1, 6))
+
+    def test_valuation_seeds_each_stock_with_its_close_before_the_window(self):
+        self.load_prices(
+            "symbol,date,close\n"
+            "AAPL,2023-12-28,90\nAAPL,2023-12-29,120\nMSFT,2023-12-29,310\n"
+            "MSFT,2024-01-02,330\n"
+            "AAPL,2024-01-03,132\n"
+        )
+        url = reverse('portfolio-valuation', kwargs={'pk': self.portfolio.pk})
+        response = self.client.get(url + '?start=2024-01-01&end=2024-01-31', format='json')
+        # 2024-01-01 carries the seeds; AAPL is not valued at its purchase price before its first close
+        series = response.data['series']
+        self.assertEqual([point['date'] for point in series], [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3)])
+        self.assertEqual([point['market_value'] for point in series], ['1820.0000', '1860.0000', '1980.0000'])
+        self.assertEqual(series[1]['daily_return'], round(1860 / 1820 - 1, 6))
+        async_url = reverse('async-portfolio-valuation', kwargs={'pk': self.portfolio.pk})
+        async_response = self.client.get(async_url + '?start=2024-01-01&end=2024-01-31')
+        self.assertEqual(async_response.json()['series'], response.json()['series'])
+
+    def test_valuation_without_prices_uses_purchase_price(self):
+        url = reverse('portfolio-valuation', kwargs={'pk': self.portfolio.pk})
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.data['market_value'], '1600.0000')
+        self.assertEqual(response.data['series'], [])
+
+
+class QuoteServiceTestCase(APITestCase):
+    """
+    Test suite for the quote service and ?include=market_value on portfolios.
+    """
+
+    class CountingProvider(LocalQuoteProvider):
+        def __init__(self, quotes, gate=None):
+            super().__init__(quotes=quotes)
+            self.calls = []
+            self.gate = gate
+
+        def fetch_quotes(self, symbols):
+            self.calls.append(sorted(symbols))
+            if self.gate:
+                self.gate.wait(5)
+            return super().fetch_quotes(symbols)
+
+    def test_batches_and_caches_quotes(self):
+        provider = self.CountingProvider({"AAPL": "190.5", "MSFT": "400"})
+        service = QuoteService(provider, batch_size=2)
+        quotes = service.get_quotes(["aapl", "MSFT", "NOPE"])
+        self.assertEqual(quotes, {"AAPL": Decimal("190.5"), "MSFT": Decimal("400")})
+        self.assertEqual(sum(len(call) for call in provider.calls), 3)
+        self.assertEqual(len(provider.calls), 2)
+        # Known and unknown symbols are both served from the cache now
+        service.get_quotes(["AAPL", "NOPE"])
+        self.assertEqual(len(provider.calls), 2)
+
+    def test_concurrent_requests_share_one_fetch(self):
+        gate = threading.Event()
+        provider = self.CountingProvider({"AAPL": "190.5"}, gate=gate)
+        service = QuoteService(provider)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(service.get_quotes(["AAPL"]))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        gate.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(provider.calls), 1)
+        self.assertEqual(results, [{"AAPL": Decimal("190.5")}] * 5)
+
+    def test_portfolio_market_value_include(self):
+        user = CustomUser.objects.create_user(email="quotes@example.com", username="quotes", password="testpassword123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=user).key)
+        portfolio = Portfolio.objects.create(user=user, name="Quoted")
+        Holdings.objects.create(portfolio=portfolio, stock=Stock.objects.create(symbol="AAPL", name="Apple"), quantity=2, purchase_price=100)
+        Holdings.objects.create(portfolio=portfolio, stock=Stock.objects.create(symbol="ZZZ", name="Unquoted"), quantity=1, purchase_price=5)
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as handle:
+            json.dump({"AAPL": "150.25"}, handle)
+        self.addCleanup(os.remove, handle.name)
+
+        with self.settings(QUOTE_PROVIDER={'OPTIONS': {'path': handle.name}}):
+            with self.assertNumQueries(3):
+                response = self.client.get(reverse('portfolio-list') + '?include=market_value', format='json')
+            self.assertEqual(response.data['results'][0]['market_value'], '305.5000')
+            detail = self.client.get(reverse('portfolio-detail', kwargs={'pk': portfolio.pk}) + '?include=market_value')
+            self.assertEqual(detail.data['market_value'], '305.5000')
+        self.assertNotIn('market_value', self.client.get(reverse('portfolio-list')).data['results'][0])
+
+
+class LedgerTestCase(APITestCase):
+    """
+    Test suite for the transaction ledger and the materialized holdings it maintains.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="ledger@example.com",
+            username="ledger",
+            password="testpassword123",
+        )
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+        self.portfolio = Portfolio.objects.create(user=self.user, name="Ledger")
+        self.url = reverse('transactions-list')
+
+    def post(self, **data):
+        return self.client.post(self.url, {"portfolio_name": "Ledger", "symbol": "NVDA", **data}, format='json')
+
+    def holding(self):
+        return Holdings.objects.get(portfolio=self.portfolio, stock__symbol="NVDA")
+
+    def test_buys_sells_and_splits_update_the_position(self):
+        self.assertEqual(self.post(kind="buy", quantity=10, price="100").status_code, status.HTTP_201_CREATED)
+        self.post(kind="buy", quantity=30, price="120")
+        self.assertEqual((self.holding().quantity, self.holding().purchase_price), (40, Decimal('115.0000')))
+
+        self.post(kind="sell", quantity=15, price="130")
+        self.post(kind="dividend", price="0.25")
+        self.post(kind="split", ratio="2")
+        self.assertEqual((self.holding().quantity, self.holding().purchase_price), (50, Decimal('57.5000')))
+
+        response = self.post(kind="sell", quantity=51, price="1")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.post(kind="sell", quantity=50, price="60")
+        self.assertFalse(Holdings.objects.filter(portfolio=self.portfolio).exists())
+        self.assertEqual(Transaction.objects.filter(portfolio=self.portfolio).count(), 6)
+
+    def test_holdings_create_and_delete_are_recorded(self):
+        response = self.client.post(reverse('holdings-list'), {
+            "portfolio_name": "Ledger", "symbol": "NVDA", "quantity": 5, "purchase_price": 200
+        }, format='json')
+        self.client.delete(reverse('holdings-detail', kwargs={'pk': response.data['id']}))
+        kinds = list(Transaction.objects.order_by('id').values_list('kind', 'quantity'))
+        self.assertEqual(kinds, [('buy', 5), ('sell', 5)])
+
+    def test_holdings_updates_are_recorded_as_adjustments(self):
+        response = self.client.post(reverse('holdings-list'), {
+            "portfolio_name": "Ledger", "symbol": "NVDA", "quantity": 10, "purchase_price": 200
+        }, format='json')
+        url = reverse('holdings-detail', kwargs={'pk': response.data['id']})
+        response = self.client.patch(url, {"quantity": 5}, format='json')
+        self.assertEqual((response.data['quantity'], response.data['version']), (5, 2))
+
+        out = io.StringIO()
+        call_command('rebuild_positions', stdout=out)
+        self.assertIn("found 0 mismatches", out.getvalue())
+
+        self.client.delete(url)
+        kinds = list(Transaction.objects.order_by('id').values_list('kind', 'quantity'))
+        self.assertEqual(kinds, [('buy', 10), ('adjust', 5), ('sell', 5)])
+        out = io.StringIO()
+        call_command('rebuild_positions', '--repair', stdout=out)
+        self.assertIn("repaired 0 mismatches", out.getvalue())
+        self.assertFalse(Holdings.objects.filter(portfolio=self.portfolio).exists())
+
+    def test_rebuild_positions_reports_holdings_without_ledger_entries(self):
+        stock = Stock.objects.create(symbol="OLD", name="Pre-ledger")
+        holding = Holdings.objects.create(portfolio=self.portfolio, stock=stock, quantity=7, purchase_price=Decimal('12.5'))
+        out = io.StringIO()
+        call_command('rebuild_positions', stdout=out)
+        self.assertIn("Checked 1 positions, found 1 mismatches", out.getvalue())
+
+        call_command('rebuild_positions', '--repair', stdout=io.StringIO())
+        entry = Transaction.objects.get(portfolio=self.portfolio, stock=stock)
+        self.assertEqual((entry.kind, entry.quantity, entry.price), ('buy', 7, Decimal('12.5')))
+        self.assertEqual(Holdings.objects.get(pk=holding.pk).quantity, 7)
+        out = io.StringIO()
+        call_command('rebuild_positions', stdout=out)
+        self.assertIn("found 0 mismatches", out.getvalue())
+
+    def test_rebuild_positions_verifies_and_repairs(self):
+        self.post(kind="buy", quantity=10, price="100")
+        self.post(kind="buy", quantity=10, price="200")
+        Holdings.objects.filter(portfolio=self.portfolio).update(quantity=3)
+
+        out = io.StringIO()
+        call_command('rebuild_positions', stdout=out)
+        self.assertIn("found 1 mismatches", out.getvalue())
+        self.assertEqual(self.holding().quantity, 3)
+
+        call_command('rebuild_positions', '--repair', stdout=io.StringIO())
+        self.assertEqual((self.holding().quantity, self.holding().purchase_price), (20, Decimal('150.0000')))
+
+
+class BenchmarkCommandTestCase(TestCase):
+    """
+    Smoke test for the synthetic data generator and the benchmark runner.
+    """
+
+    def test_generate_and_benchmark(self):
+        call_command('generate_data', users=2, portfolios=2, holdings=3, stocks=5, price_days=3, stdout=io.StringIO())
+        self.assertEqual(Holdings.objects.count(), 12)
+        self.assertEqual(Token.objects.filter(user__email__startswith='bench-').count(), 2)
+        self.assertEqual(StockPrice.objects.count(), 15)
+
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, 'baseline.json')
+            call_command('run_benchmarks', iterations=2, warmup=0, output=baseline, stdout=io.StringIO())
+            out = io.StringIO()
+            call_command('run_benchmarks', iterations=2, warmup=0, compare=baseline,
+                         endpoints='portfolio_list,holdings_crud', stdout=out)
+            with open(baseline) as handle:
+                endpoints = json.load(handle)['endpoints']
+            cached = os.path.join(directory, 'cached.json')
+            call_command('run_benchmarks', iterations=2, warmup=1, cache=True, endpoints='holdings_list',
+                         output=cached, stdout=io.StringIO())
+            with open(cached) as handle:
+                cached = json.load(handle)['endpoints']
+
+        self.assertIn('Change against baseline', out.getvalue())
+        # The response cache is off, so this is the view's own query (auth is cached)
+        self.assertEqual(endpoints['holdings_list']['queries_per_request'], 1)
+        # With --cache, repeated reads are answered from the response cache
+        self.assertEqual(cached['holdings_list']['queries_per_request'], 0)
+        self.assertLessEqual(endpoints['portfolio_list']['p50_ms'], endpoints['portfolio_list']['p99_ms'])
+        self.assertFalse(CustomUser.objects.filter(email__startswith='bench-register').exists())
+
+    def test_login_benchmark_is_not_throttled(self):
+        call_command('generate_data', users=1, portfolios=1, holdings=1, stocks=1, price_days=1, stdout=io.StringIO())
+        out = io.StringIO()
+        call_command('run_benchmarks', iterations=12, warmup=0, endpoints='login', stdout=out)
+        self.assertIn('login', out.getvalue())
+        # The account limit still applies outside the runner
+        responses = [
+            self.client.post(reverse('login'), {'email': "bench-0@example.com", 'password': "wrongpassword"})
+            for _ in range(11)
+        ]
+        self.assertEqual(responses[-1].status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+@override_settings(REQUEST_PROFILING={'SAMPLE_RATE': 1})
+class ProfilingMiddlewareTestCase(APITestCase):
+    """
+    Test suite for the request profiling middleware and its report command.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="profiled@example.com",
+            username="profiled",
+            password="testpassword123",
+        )
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+        Portfolio.objects.create(user=self.user, name="Profiled")
+
+    def test_profiled_request_logs_and_sets_server_timing(self):
+        with self.assertLogs('auth_user.profiling', level='INFO') as logs:
+            response = self.client.get(reverse('portfolio-list'), format='json')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'portfolio-list')
+        self.assertEqual(record['queries'], 3)
+        self.assertEqual(record['response_bytes'], len(response.content))
+
+    def test_values_fast_path_is_timed(self):
+        portfolio = Portfolio.objects.get(user=self.user)
+        stock = Stock.objects.create(symbol="PRF", name="Profiled")
+        Holdings.objects.create(portfolio=portfolio, stock=stock, quantity=1, purchase_price=Decimal('1'))
+        # Every perf_counter reading is 1 ms after the previous one, so any timed block reads > 0
+        clock = iter(range(10_000))
+        with mock.patch('auth_user.profiling.time.perf_counter', lambda: next(clock) / 1000), \
+                self.assertLogs('auth_user.profiling', level='INFO') as logs, \
+                override_settings(RESPONSE_CACHE={'ENABLED': False}):
+            self.client.get(reverse('holdings-list'), format='json')
+        self.assertGreater(json.loads(logs.records[0].getMessage())['serialize_ms'], 0)
+
+    def test_fingerprints_and_report(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s) AND name = 'y' LIMIT 5"),
+        )
+        records = [
+            {'view': 'holdings-list', 'total_ms': 40, 'db_ms': 30, 'serialize_ms': 5, 'queries': 12,
+             'duplicates': [{'fingerprint': 'SELECT stock WHERE id = %s', 'count': 10}]},
+            {'view': 'portfolio-list', 'total_ms': 10, 'db_ms': 4, 'serialize_ms': 2, 'queries': 3, 'duplicates': []},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.log', delete=False) as handle:
+            handle.write('\n'.join('INFO ' + json.dumps(record) for record in records))
+        self.addCleanup(os.remove, handle.name)
+        out = io.StringIO()
+        call_command('profile_report', handle.name, stdout=out)
+        report = out.getvalue()
+        self.assertLess(report.index('holdings-list'), report.index('portfolio-list'))
+        self.assertIn('SELECT stock WHERE id = %s', report)
+
+
+class LoginTestCase(APITestCase):
+    """
+    Test suite for the login fast path: token reuse, hash upgrades and throttling.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.password = "testpassword123"
+        self.user = CustomUser.objects.create_user(
+            email="login@example.com",
+            username="login",
+            password=self.password,
+        )
+        self.url = reverse('login')
+
+    def login(self, email="login@example.com", password=None):
+        return self.client.post(self.url, {'email': email, 'password': password or self.password}, format='json')
+
+    def test_login_returns_existing_token_in_one_query(self):
+        token = Token.objects.get(user=self.user)
+        with self.assertNumQueries(1):
+            response = self.login()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['token'], token.key)
+
+    def test_login_rehashes_legacy_password(self):
+        self.user.password = make_password(self.password, hasher='pbkdf2_sha256')
+        self.user.save()
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(identify_hasher(self.user.password).algorithm, get_hasher().algorithm)
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+    def test_account_throttle_rejects_before_lookup(self):
+        with mock.patch.object(LoginAccountThrottle, 'rate', '2/min', create=True):
+            self.login(password="wrongpassword")
+            self.login(password="wrongpassword")
+            with self.assertNumQueries(0):
+                response = self.login()
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_ip_throttle_spans_accounts(self):
+        with mock.patch.object(LoginIPThrottle, 'rate', '2/min', create=True):
+            self.login(email="one@example.com")
+            self.login(email="two@example.com")
+            response = self.login()
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+class AsyncViewsTestCase(APITestCase):
+    """
+    Test suite for the async read endpoints, which must render exactly like the sync ones.
+    """
+
+    def setUp(self):
+        get_local_cache().clear()
+        self.user = CustomUser.objects.create_user(email="async@example.com", username="async", password="testpassword123")
+        self.token = Token.objects.get(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.portfolio = Portfolio.objects.create(user=self.user, name="Async")
+        for n, symbol in enumerate(["AAA", "BBB", "CCC"]):
+            stock = Stock.objects.create(symbol=symbol, name=symbol)
+            Holdings.objects.create(portfolio=self.portfolio, stock=stock, quantity=10 - n, purchase_price=Decimal('12.5') + n)
+            StockPrice.objects.create(stock=stock, date='2025-01-02', close=Decimal('14') + n)
+
+    def test_async_endpoints_match_sync(self):
+        pk = {'pk': self.portfolio.pk}
+        pairs = [
+            (reverse('portfolio-list'), reverse('async-portfolio-list')),
+            (reverse('portfolio-detail', kwargs=pk), reverse('async-portfolio-detail', kwargs=pk)),
+            (reverse('portfolio-valuation', kwargs=pk) + '?start=2025-01-01&end=2025-01-03',
+             reverse('async-portfolio-valuation', kwargs=pk) + '?start=2025-01-01&end=2025-01-03'),
+            (reverse('holdings-list') + '?ordering=-purchase_price&page_size=2',
+             reverse('async-holdings-list') + '?ordering=-purchase_price&page_size=2'),
+        ]
+        for sync_url, async_url in pairs:
+            expected = self.client.get(sync_url, HTTP_ACCEPT='application/json')
+            response = self.client.get(async_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, async_url)
+            self.assertEqual(response.content, expected.content.replace(b'/users/', b'/users/async/'), async_url)
+
+    def test_async_endpoints_enforce_auth_and_ownership(self):
+        other = CustomUser.objects.create_user(email="other@example.com", username="other", password="testpassword123")
+        foreign = Portfolio.objects.create(user=other, name="Other")
+        response = self.client.get(reverse('async-portfolio-detail', kwargs={'pk': foreign.pk}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.client.credentials()
+        response = self.client.get(reverse('async-holdings-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_served_through_asgi_handler(self):
+        response = await self.async_client.get(
+            reverse('async-portfolio-list'), headers={'Authorization': f'Token {self.token.key}'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'][0]['holding_count'], 3)
+
+
+class ResponseCacheTestCase(APITestCase):
+    """
+    Test suite for the per-user response cache, its write-driven invalidation and ETags.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="poll@example.com", username="poll", password="testpassword123")
+        self.token = Token.objects.get(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.portfolio = Portfolio.objects.create(user=self.user, name="Polled")
+        self.holding = Holdings.objects.create(
+            portfolio=self.portfolio, stock=Stock.objects.create(symbol="POLL"), quantity=5, purchase_price=10
+        )
+
+    def test_repeat_read_skips_database(self):
+        url = reverse('portfolio-list')
+        first = self.client.get(url, format='json')
+        with self.assertNumQueries(0):
+            second = self.client.get(url, format='json')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        url = reverse('holdings-list')
+        etag = self.client.get(url, format='json')['ETag']
+        response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_writes_invalidate_cached_reads(self):
+        url = reverse('holdings-list')
+        etag = self.client.get(url, format='json')['ETag']
+        self.holding.quantity = 7
+        self.holding.save()
+        response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['quantity'], 7)
+
+        Stock.objects.create(symbol="NEW")
+        with self.assertNumQueries(1):
+            self.client.get(url, format='json')
+
+    def test_other_users_do_not_share_entries(self):
+        url = reverse('portfolio-list')
+        self.client.get(url, format='json')
+        other = CustomUser.objects.create_user(email="other@example.com", username="other", password="testpassword123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=other).key)
+        self.assertEqual(self.client.get(url, format='json').data['results'], [])
+
+
+class SnapshotTestCase(APITestCase):
+    """
+    Test suite for the snapshot rollup command and the history endpoint.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="history@example.com", username="history", password="testpassword123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+        self.portfolio = Portfolio.objects.create(user=self.user, name="History")
+        stock = Stock.objects.create(symbol="HST")
+        Transaction.objects.create(portfolio=self.portfolio, stock=stock, kind=Transaction.BUY,
+                                   quantity=10, price=Decimal('5'), trade_date='2025-01-06')
+        Transaction.objects.create(portfolio=self.portfolio, stock=stock, kind=Transaction.SELL,
+                                   quantity=4, trade_date='2025-01-08')
+        StockPrice.objects.create(stock=stock, date='2025-01-03', close=Decimal('6'))
+        StockPrice.objects.create(stock=stock, date='2025-01-08', close=Decimal('7'))
+
+    def rollup(self, day, *args):
+        call_command('rollup_snapshots', '--workers=1', f'--date={day}', *args, stdout=io.StringIO())
+
+    def test_rollup_replays_ledger_and_fills_prices(self):
+        self.rollup('2025-01-09')
+        values = list(PortfolioSnapshot.objects.order_by('date').values_list('date', 'market_value', 'cost_basis', 'pnl'))
+        self.assertEqual([str(row[0]) for row in values], ['2025-01-06', '2025-01-07', '2025-01-08', '2025-01-09'])
+        # The close before the first trade seeds the first days; the sell lowers quantity, not cost
+        self.assertEqual(values[0][1:], (Decimal('60.0000'), Decimal('50.0000'), Decimal('10.0000')))
+        self.assertEqual(values[1][1], Decimal('60.0000'))
+        self.assertEqual(values[2][1:], (Decimal('42.0000'), Decimal('30.0000'), Decimal('12.0000')))
+        self.assertEqual(values[3][1], Decimal('42.0000'))
+
+    def test_rollup_only_adds_missing_days(self):
+        self.rollup('2025-01-07')
+        first_id = PortfolioSnapshot.objects.get(date='2025-01-06').id
+        self.rollup('2025-01-07')
+        self.assertEqual(PortfolioSnapshot.objects.count(), 2)
+        self.rollup('2025-01-10')
+        self.assertEqual(PortfolioSnapshot.objects.count(), 5)
+        self.assertEqual(PortfolioSnapshot.objects.get(date='2025-01-06').id, first_id)
+
+    def test_history_range_and_downsampling(self):
+        self.rollup('2025-02-03')
+        url = reverse('portfolio-history', kwargs={'pk': self.portfolio.pk})
+        # Token lookup, ownership check and one snapshot range scan
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'start': '2025-01-07', 'end': '2025-01-09'})
+        self.assertEqual([point['date'] for point in response.data['points']],
+                         [date(2025, 1, 7), date(2025, 1, 8), date(2025, 1, 9)])
+        weekly = self.client.get(url, {'interval': 'week'}).data['points']
+        self.assertEqual(weekly[0]['date'], date(2025, 1, 12))
+        monthly = self.client.get(url, {'interval': 'month'}).data['points']
+        self.assertEqual([point['date'] for point in monthly], [date(2025, 1, 31), date(2025, 2, 3)])
+        response = self.client.get(url, {'interval': 'year'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
+class FastListTestCase(APITestCase):
+    """
+    Test suite for the values()-based list path and the orjson renderer, which must
+    produce exactly the bytes of the serializer path they replace.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="fast@example.com", username="fast", password="testpassword123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+        for n in range(2):
+            portfolio = Portfolio.objects.create(user=self.user, name=f"Fast {n}")
+            for symbol, quantity, price in [("FA", 3, '10.1250'), ("FB", 7, '0.3333'), ("FC", 1, '99999.9999')]:
+                stock, _ = Stock.objects.get_or_create(symbol=symbol)
+                Holdings.objects.create(portfolio=portfolio, stock=stock, quantity=quantity + n, purchase_price=Decimal(price))
+        Portfolio.objects.create(user=self.user, name="Empty")
+
+    def expected(self, data):
+        return JSONRenderer().render({'next': None, 'previous': None, 'results': data})
+
+    def test_holdings_list_matches_serializer_output(self):
+        holdings = Holdings.objects.filter(portfolio__user=self.user).with_total_amount().order_by('-purchase_price', '-id')
+        response = self.client.get(reverse('holdings-list'), {'ordering': '-purchase_price'})
+        self.assertEqual(response.content, self.expected(HoldingsSerializer(holdings, many=True).data))
+
+    def test_portfolio_list_matches_serializer_output(self):
+        holdings = Holdings.objects.with_total_amount().select_related('stock').order_by('id')
+        portfolios = (Portfolio.objects.filter(user=self.user).with_totals()
+                      .prefetch_related(Prefetch('holdings_set', queryset=holdings)).order_by('id'))
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('portfolio-list'))
+        self.assertEqual(response.content, self.expected(PortfolioSerializer(portfolios, many=True).data))
+
+    def test_orjson_renderer_matches_json_renderer(self):
+        data = {
+            'text': "caf\u00e9 \u2028 \"quoted\"",
+            'amount': Decimal('1505.0000'),
+            'when': timezone.datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.get_current_timezone()),
+            'day': date(2025, 1, 2),
+            'nested': [{'n': 1, 'f': 0.1, 'none': None, 'flag': True}],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_serializer_benchmark_checks_bytes(self):
+        out = io.StringIO()
+        call_command('benchmark_serializers', rows=200, repeat=1, stdout=out)
+        self.assertIn('byte for byte identical', out.getvalue())
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
+class SparseFieldsTestCase(APITestCase):
+    """
+    Test suite for ?fields= and ?expand=, which trim both the payload and the queries.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="sparse@example.com", username="sparse", password="testpassword123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+        self.portfolio = Portfolio.objects.create(user=self.user, name="Sparse")
+        self.stock = Stock.objects.create(symbol="SPR", name="Sparse Inc")
+        self.holding = Holdings.objects.create(portfolio=self.portfolio, stock=self.stock, quantity=4, purchase_price=Decimal('2.5000'))
+
+    def test_name_only_portfolio_list_is_one_narrow_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('portfolio-list'), {'fields': 'name'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{'name': "Sparse"}])
+        # The token lookup plus one query, without the holdings join or aggregates
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('holdings', queries[-1]['sql'].lower())
+
+    def test_portfolio_retrieve_with_fields(self):
+        response = self.client.get(reverse('portfolio-detail', args=[self.portfolio.id]), {'fields': 'id,total_value'})
+        self.assertEqual(response.data, {'id': self.portfolio.id, 'total_value': '10.0000'})
+
+    def test_expand_stock_on_holdings(self):
+        response = self.client.get(reverse('holdings-list'), {'fields': 'id,quantity', 'expand': 'stock'})
+        self.assertEqual(response.data['results'], [{
+            'id': self.holding.id, 'quantity': 4,
+            'stock': {'id': self.stock.id, 'symbol': "SPR", 'name': "Sparse Inc"},
+        }])
+        response = self.client.get(reverse('holdings-detail', args=[self.holding.id]), {'expand': 'stock'})
+        self.assertEqual(response.data['stock']['symbol'], "SPR")
+
+    def test_expand_stock_nested_under_portfolios(self):
+        response = self.client.get(reverse('portfolio-list'), {'fields': 'stocks', 'expand': 'stock'})
+        self.assertEqual(response.data['results'][0]['stocks'][0]['stock']['symbol'], "SPR")
+
+    def test_ordered_holdings_page_with_sparse_fields(self):
+        Holdings.objects.create(portfolio=self.portfolio, stock=Stock.objects.create(symbol="SPX"),
+                                quantity=1, purchase_price=Decimal('1.0000'))
+        response = self.client.get(reverse('holdings-list'), {'fields': 'id', 'ordering': 'quantity', 'page_size': 1})
+        self.assertEqual(response.data['results'], [{'id': self.holding.id + 1}])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'], [{'id': self.holding.id}])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('portfolio-list'), {'fields': 'name,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('secret', str(response.data['fields']))
+
+
+class PhotoPipelineTestCase(APITestCase):
+    """
+    Test suite for queued profile photo processing: registration only stores the
+    upload, and the process_photos worker writes the resized photo and thumbnails.
+    """
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=self.media.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def make_photo(self, size=(2400, 1600), image_format='JPEG'):
+        image = Image.new('RGB', size, (200, 30, 30))
+        exif = Image.Exif()
+        exif[0x0110] = "Secret Camera"  # Model
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees on display
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, exif=exif.tobytes())
+        return SimpleUploadedFile('me.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def register(self, photo):
+        return self.client.post(reverse('register'), {
+            'username': "photo", 'email': "photo@example.com", 'password': "testpassword123",
+            'password2': "testpassword123", 'profile_photo': photo,
+        }, format='multipart')
+
+    def test_registration_queues_photo_without_processing(self):
+        response = self.register(self.make_photo())
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user = CustomUser.objects.get(email="photo@example.com")
+        self.assertFalse(user.profile_photo)
+        task = PhotoTask.objects.get(user=user)
+        self.assertEqual(task.status, PhotoTask.PENDING)
+        self.assertTrue(default_storage.exists(task.source))
+
+    def test_worker_resizes_strips_metadata_and_writes_thumbnails(self):
+        self.register(self.make_photo())
+        task = PhotoTask.objects.get()
+        out = io.StringIO()
+        # The original is deleted once the new photo is committed
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('process_photos', workers=1, once=True, stdout=out)
+        self.assertIn('Processed 1 photos, 0 failed', out.getvalue())
+
+        user = CustomUser.objects.get(email="photo@example.com")
+        with default_storage.open(user.profile_photo.name) as handle, Image.open(handle) as photo:
+            # Orientation applied (portrait now), scaled to MAX_SIZE and no EXIF left
+            self.assertEqual(photo.size, (683, 1024))
+            self.assertEqual(len(photo.getexif()), 0)
+        self.assertEqual(set(user.profile_photo_thumbnails), {'256', '128', '64'})
+        with default_storage.open(user.profile_photo_thumbnails['64']['webp']) as handle, Image.open(handle) as thumb:
+            self.assertEqual((thumb.format, max(thumb.size)), ('WEBP', 64))
+        self.assertEqual(PhotoTask.objects.get().status, PhotoTask.DONE)
+        self.assertFalse(default_storage.exists(task.source))
+
+    def test_corrupt_original_fails_without_retry(self):
+        user = CustomUser.objects.create_user(email="broken@example.com", username="broken", password="testpassword123")
+        task = enqueue_photo(user, SimpleUploadedFile('broken.jpg', b'not an image'))
+        call_command('process_photos', workers=1, once=True, stdout=io.StringIO(), stderr=io.StringIO())
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (PhotoTask.FAILED, 1))
+
+    def test_non_image_upload_is_rejected(self):
+        response = self.register(SimpleUploadedFile('me.jpg', b'not an image', content_type='image/jpeg'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('profile_photo', response.data)
+        self.assertFalse(PhotoTask.objects.exists())
+
+
+class OnboardingTestCase(APITestCase):
+    """
+    Test suite for bulk onboarding, which must leave the same state as registering
+    each user and be safe to run twice.
+    """
+
+    CSV = (
+        "email,username,password,first_name,last_name,date_of_birth\n"
+        "ann@example.com,ann,testpassword123,Ann,Lee,1990-04-01\n"
+        "bob@EXAMPLE.com,bob,,,,\n"
+        "not-an-email,carl,testpassword123,,,\n"
+        "ann@example.com,ann2,testpassword123,,,\n"
+    )
+
+    def onboard_file(self, content, **options):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('onboard_users', handle.name, workers=1, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_command_creates_users_and_tokens_like_registration(self):
+        out, err = self.onboard_file(self.CSV, batch_size=2)
+        self.assertIn('Created 2 users, skipped 0 existing, 2 rows rejected.', out)
+        self.assertIn('Row 3:', err)
+        self.assertIn('Duplicate email', err)
+
+        ann = CustomUser.objects.get(email="ann@example.com")
+        self.assertTrue(ann.check_password("testpassword123"))
+        self.assertEqual((ann.first_name, ann.date_of_birth, ann.is_active), ("Ann", date(1990, 4, 1), True))
+        # Only the domain is normalized, as in create_user
+        bob = CustomUser.objects.get(email="bob@example.com")
+        self.assertFalse(bob.has_usable_password())
+        self.assertEqual(Token.objects.filter(user__in=[ann, bob]).count(), 2)
+
+        response = self.client.post(reverse('login'), {'email': "ann@example.com", 'password': "testpassword123"})
+        self.assertEqual(response.data['token'], Token.objects.get(user=ann).key)
+
+    def test_rerun_is_idempotent_and_repairs_missing_tokens(self):
+        self.onboard_file(self.CSV)
+        Token.objects.filter(user__email="bob@example.com").delete()
+        out, err = self.onboard_file(self.CSV)
+        self.assertIn('Created 0 users, skipped 2 existing', out)
+        self.assertEqual(CustomUser.objects.count(), 2)
+        self.assertTrue(Token.objects.filter(user__email="bob@example.com").exists())
+
+    def test_command_reads_standard_input_without_closing_it(self):
+        stdin = io.StringIO(self.CSV)
+        out = io.StringIO()
+        with mock.patch('sys.stdin', stdin):
+            call_command('onboard_users', '-', workers=1, stdout=out, stderr=io.StringIO())
+        self.assertIn('Created 2 users', out.getvalue())
+        self.assertFalse(stdin.closed)
+
+    def test_taken_username_is_rejected(self):
+        CustomUser.objects.create_user(email="other@example.com", username="ann", password="testpassword123")
+        out, err = self.onboard_file(self.CSV)
+        self.assertIn('Created 1 users', out)
+        self.assertIn('A user with that username already exists.', err)
+
+    def test_api_is_admin_only(self):
+        user = CustomUser.objects.create_user(email="plain@example.com", username="plain", password="testpassword123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=user).key)
+        response = self.client.post(reverse('onboard'), self.CSV, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = CustomUser.objects.create_superuser(email="admin@example.com", username="admin", password="testpassword123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=admin).key)
+        response = self.client.post(reverse('onboard'), self.CSV, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['skipped'], len(response.data['errors'])), (2, 0, 2))
+
+    @override_settings(USER_ONBOARDING={'API_MAX_ROWS': 3})
+    def test_api_rejects_lists_over_the_row_cap(self):
+        admin = CustomUser.objects.create_superuser(email="admin@example.com", username="admin", password="testpassword123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=admin).key)
+        response = self.client.post(reverse('onboard'), self.CSV, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('onboard_users command', response.data['error'])
+        self.assertEqual(CustomUser.objects.count(), 1)
+
+        rows = [{'email': f"user{n}@example.com", 'username': f"user{n}", 'password': "testpassword123"} for n in range(3)]
+        with mock.patch('auth_user.services.ProcessPoolExecutor') as pool:
+            response = self.client.post(reverse('onboard'), rows, format='json')
+        self.assertEqual(response.data['created'], 3)
+        pool.assert_not_called()
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': False}, DATABASE_ROUTING={'REPLICAS': ['replica'], 'STICKY_SECONDS': 5})
+class ReplicaRoutingTestCase(APITransactionTestCase):
+    """
+    Test suite for primary/replica routing. TestCase would wrap every request in a
+    transaction, which pins reads to the primary, hence the transactional test case.
+    The replica alias is only chosen, never connected to: choose_replica is patched
+    to answer 'default' and record the calls.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="replica@example.com", username="replica", password="testpassword123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+        self.portfolio = Portfolio.objects.create(user=self.user, name="Replica")
+        patcher = mock.patch.object(PrimaryReplicaRouter, 'choose_replica', return_value='default')
+        self.choose_replica = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_safe_reads_use_a_replica(self):
+        for url in [reverse('portfolio-list'), reverse('portfolio-history', args=[self.portfolio.id]),
+                    reverse('holdings-list')]:
+            self.choose_replica.reset_mock()
+            self.client.get(url)
+            # Once per query
+            self.choose_replica.assert_called_with(['replica'])
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        response = self.client.post(reverse('portfolio-list'), {'name': "Fresh"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(reverse('portfolio-list'))
+        self.assertEqual(len(response.data['results']), 2)
+        self.choose_replica.assert_not_called()
+
+        # Once the window has passed, reads go back to the replicas
+        cache.clear()
+        self.client.get(reverse('portfolio-list'))
+        self.choose_replica.assert_called()
+
+    def test_router_outside_read_views(self):
+        router = PrimaryReplicaRouter()
+        # Management commands and other views never call use_replicas()
+        self.assertEqual(router.db_for_read(Portfolio), 'default')
+        with routing_state() as state:
+            use_replicas(self.user.pk)
+            self.assertTrue(state.replica_reads)
+            self.assertEqual(router.db_for_write(Portfolio), 'default')
+            self.assertEqual(router.db_for_read(Portfolio), 'default')
+        self.choose_replica.assert_not_called()
+        self.assertFalse(router.allow_migrate('replica', 'auth_user'))
+        self.assertIsNone(router.allow_migrate('default', 'auth_user'))
+
+
+class AnalyticsTestCase(APITestCase):
+    """
+    Test suite for the portfolio analytics action.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="analytics@example.com", username="analytics", password="testpassword123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+        self.portfolio = Portfolio.objects.create(user=self.user, name="Analytics")
+        self.tech = Stock.objects.create(symbol="TEC", name="Tech", sector="Technology")
+        self.oil = Stock.objects.create(symbol="OIL", name="Oil", sector="Energy")
+        self.index = Stock.objects.create(symbol="IDX", name="Index")
+        Holdings.objects.create(portfolio=self.portfolio, stock=self.tech, quantity=10, purchase_price=Decimal('10'))
+        Holdings.objects.create(portfolio=self.portfolio, stock=self.oil, quantity=5, purchase_price=Decimal('20'))
+        self.as_of = date(2025, 3, 7)
+        closes = {self.tech: [10, 12, 9, 11, 12], self.oil: [20, 20, 22, 21, 24], self.index: [100, 110, 99, 104, 112]}
+        for stock, series in closes.items():
+            for offset, close in enumerate(series):
+                StockPrice.objects.create(stock=stock, date=self.as_of - timedelta(days=4 - offset), close=Decimal(close))
+
+    def get(self, **params):
+        return self.client.get(reverse('portfolio-analytics', args=[self.portfolio.id]), {'as_of': self.as_of.isoformat(), **params})
+
+    def test_allocation_and_concentration(self):
+        response = self.get(top=1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Market values 120 and 120 on the last day
+        self.assertEqual(response.data['market_value'], '240.0000')
+        self.assertEqual([holding['weight'] for holding in response.data['holdings']], [0.5, 0.5])
+        self.assertEqual({sector['sector']: sector['weight'] for sector in response.data['sectors']},
+                         {'Technology': 0.5, 'Energy': 0.5})
+        self.assertEqual((response.data['hhi'], response.data['effective_holdings']), (0.5, 2.0))
+        self.assertEqual(response.data['top'], [{'symbol': "TEC", 'weight': 0.5}])
+
+    def test_risk_metrics(self):
+        response = self.get(benchmark='idx')
+        series = np.array([200, 220, 200, 215, 240], dtype=float)
+        returns = series[1:] / series[:-1] - 1
+        index = np.array([100, 110, 99, 104, 112], dtype=float)
+        index_returns = index[1:] / index[:-1] - 1
+        risk = response.data['risk']
+        self.assertEqual(risk['observations'], 5)
+        self.assertAlmostEqual(risk['volatility'], returns.std(ddof=1) * np.sqrt(252), places=5)
+        self.assertAlmostEqual(risk['max_drawdown'], 200 / 220 - 1, places=5)
+        expected_beta = np.cov(returns, index_returns)[0, 1] / np.var(index_returns, ddof=1)
+        self.assertAlmostEqual(risk['beta'], expected_beta, places=3)
+        self.assertEqual(response.data['benchmark'], "IDX")
+
+    def test_results_are_memoized_until_a_write(self):
+        first = self.get().data
+        # Only the ownership check; the first request cached the token too
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get().data, first)
+        holding = Holdings.objects.get(stock=self.oil)
+        holding.quantity = 15
+        holding.save()
+        self.assertEqual(self.get().data['market_value'], '480.0000')
+
+    def test_memo_is_scoped_to_the_portfolio(self):
+        self.get()
+        other = Portfolio.objects.create(user=self.user, name="Elsewhere")
+        Holdings.objects.create(portfolio=other, stock=self.index, quantity=1, purchase_price=Decimal('100'))
+        with self.assertNumQueries(1):
+            self.get()
+
+    @override_settings(RESPONSE_CACHE={'ENABLED': False})
+    def test_memo_respects_disabled_response_cache(self):
+        self.get()
+        # Ownership check, holdings and prices every time
+        with self.assertNumQueries(3):
+            self.get()
+
+    def test_window_starts_from_the_last_close_before_it(self):
+        seeded = Stock.objects.create(symbol="OLD", name="Old")
+        StockPrice.objects.create(stock=seeded, date=self.as_of - timedelta(days=400), close=Decimal('30'))
+        StockPrice.objects.create(stock=seeded, date=self.as_of - timedelta(days=2), close=Decimal('30'))
+        Holdings.objects.create(portfolio=self.portfolio, stock=seeded, quantity=2, purchase_price=Decimal('5'))
+        risk = self.get().data['risk']
+        # OLD is worth 60 from the window's first day, not 10 (its purchase price) until its next close
+        series = np.array([260, 260, 280, 260, 275, 300], dtype=float)
+        returns = series[1:] / series[:-1] - 1
+        self.assertEqual((risk['start'], risk['observations']), (self.as_of - timedelta(days=365), 6))
+        self.assertAlmostEqual(risk['volatility'], returns.std(ddof=1) * np.sqrt(252), places=5)
+        self.assertAlmostEqual(risk['max_drawdown'], 260 / 280 - 1, places=5)
+
+    def test_unknown_benchmark_and_other_users(self):
+        self.assertEqual(self.get(benchmark='NOPE').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get(top=0).status_code, status.HTTP_400_BAD_REQUEST)
+        other = CustomUser.objects.create_user(email="nosy@example.com", username="nosy", password="testpassword123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=other).key)
+        self.assertEqual(self.get().status_code, status.HTTP_404_NOT_FOUND)
+
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
+class ConsolidatedHoldingsTestCase(APITestCase):
+    """
+    Test suite for the cross-portfolio view of holdings grouped by stock.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="consolidated@example.com", username="consolidated", password="testpassword123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+        self.stocks = [Stock.objects.create(symbol=symbol, name=name) for symbol, name in (("AAA", "Alpha"), ("BBB", "Beta"), ("CCC", "Gamma"))]
+        self.portfolios = [Portfolio.objects.create(user=self.user, name=f"P{i}") for i in range(3)]
+        for portfolio, stock, quantity, price in (
+            (0, 0, 10, '100'), (1, 0, 30, '120'), (2, 0, 10, '80'),
+            (1, 1, 5, '50'), (2, 2, 20, '10'),
+        ):
+            Holdings.objects.create(portfolio=self.portfolios[portfolio], stock=self.stocks[stock], quantity=quantity, purchase_price=Decimal(price))
+        other = CustomUser.objects.create_user(email="other@example.com", username="other", password="testpassword123")
+        Holdings.objects.create(portfolio=Portfolio.objects.create(user=other, name="Other"), stock=self.stocks[0], quantity=99, purchase_price=Decimal('1'))
+
+    def test_totals_and_breakdown_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('consolidated-holdings-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Token, the grouped totals and the page's breakdown, whatever the number of portfolios
+        self.assertEqual(len(queries), 3)
+        alpha = response.data['results'][0]
+        self.assertEqual((alpha['symbol'], alpha['quantity'], alpha['portfolio_count']), ("AAA", 50, 3))
+        self.assertEqual(alpha['cost_basis'], '5400.0000')
+        self.assertEqual(alpha['average_cost'], '108.0000')
+        self.assertEqual([row['portfolio_name'] for row in alpha['portfolios']], ["P0", "P1", "P2"])
+        self.assertEqual(alpha['portfolios'][1]['total_amount'], '3600.0000')
+
+    def test_ordering_on_combined_figures_pages_with_cursor(self):
+        response = self.client.get(reverse('consolidated-holdings-list'), {'ordering': '-purchase_price', 'page_size': 2})
+        symbols = [row['symbol'] for row in response.data['results']]
+        response = self.client.get(response.data['next'])
+        symbols += [row['symbol'] for row in response.data['results']]
+        self.assertEqual(symbols, ["AAA", "BBB", "CCC"])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(reverse('consolidated-holdings-list'), {'ordering': 'quantity'})
+        self.assertEqual([row['symbol'] for row in response.data['results']], ["BBB", "CCC", "AAA"])
+
+    def test_filters_and_search_select_combined_holdings(self):
+        response = self.client.get(reverse('consolidated-holdings-list'), {'search': "alp", 'purchase_price__gte': '90'})
+        [alpha] = response.data['results']
+        self.assertEqual((alpha['quantity'], alpha['average_cost']), (40, '115.0000'))
+        self.assertEqual([row['portfolio_name'] for row in alpha['portfolios']], ["P0", "P1"])
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
+class HoldingsConcurrencyTestCase(APITestCase):
+    """
+    Test suite for Idempotency-Key replays, version preconditions and batch mutations.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="versions@example.com", username="versions", password="testpassword123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+        self.portfolio = Portfolio.objects.create(user=self.user, name="Main")
+        self.stock = Stock.objects.create(symbol="VER", name="Versioned")
+        self.holding = Holdings.objects.create(portfolio=self.portfolio, stock=self.stock, quantity=10, purchase_price=Decimal('5'))
+        self.detail_url = reverse('holdings-detail', args=[self.holding.id])
+
+    def test_retried_create_is_replayed_without_running_again(self):
+        data = {'portfolio_name': "Main", 'symbol': "NEW", 'quantity': 3, 'purchase_price': '2.00'}
+        first = self.client.post(reverse('holdings-list'), data, format='json', HTTP_IDEMPOTENCY_KEY="create-1")
+        retry = self.client.post(reverse('holdings-list'), data, format='json', HTTP_IDEMPOTENCY_KEY="create-1")
+        self.assertEqual((first.status_code, retry.status_code), (status.HTTP_201_CREATED, status.HTTP_201_CREATED))
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Holdings.objects.filter(stock__symbol="NEW").count(), 1)
+        self.assertEqual(Transaction.objects.filter(stock__symbol="NEW").count(), 1)
+
+        # The same key on a different request is refused
+        response = self.client.post(reverse('holdings-list'), {**data, 'quantity': 4}, format='json', HTTP_IDEMPOTENCY_KEY="create-1")
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_failed_write_stores_nothing_under_its_key(self):
+        data = {'portfolio_name': "Main", 'symbol': "VER", 'quantity': 1, 'purchase_price': '1.00'}
+        response = self.client.post(reverse('holdings-list'), data, format='json', HTTP_IDEMPOTENCY_KEY="dup")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.filter(key="dup").exists())
+
+    def test_stale_if_match_is_refused(self):
+        response = self.client.patch(self.detail_url, {'quantity': 12}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], 2)
+
+        # A second device still holding version 1 loses the race instead of overwriting
+        response = self.client.patch(self.detail_url, {'quantity': 7}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(response.data['version'], 2)
+        response = self.client.delete(self.detail_url, {'version': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.holding.refresh_from_db()
+        self.assertEqual((self.holding.quantity, self.holding.version), (12, 2))
+
+    def test_ledger_writes_bump_the_version(self):
+        record_transaction(self.portfolio, self.stock, Transaction.BUY, quantity=5, price=Decimal('5'))
+        self.holding.refresh_from_db()
+        self.assertEqual(self.holding.version, 2)
+
+    def test_batch_applies_all_operations(self):
+        other = Holdings.objects.create(portfolio=self.portfolio, stock=Stock.objects.create(symbol="OTH", name="Other"),
+                                        quantity=2, purchase_price=Decimal('1'))
+        operations = [
+            {'op': 'create', 'portfolio_name': "Main", 'symbol': "BAT", 'quantity': 4, 'purchase_price': '3.00'},
+            {'op': 'update', 'id': self.holding.id, 'version': 1, 'quantity': 11},
+            {'op': 'delete', 'id': other.id},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('holdings-batch'), {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['op'] for result in response.data['results']], ['create', 'update', 'delete'])
+        self.assertEqual(response.data['results'][1]['holding']['version'], 2)
+        self.assertFalse(Holdings.objects.filter(pk=other.pk).exists())
+        self.assertTrue(Holdings.objects.filter(stock__symbol="BAT").exists())
+        # Updated and deleted rows are locked together by one query
+        locks = [query['sql'] for query in queries if query['sql'].startswith('SELECT') and '"auth_user_holdings"."id" IN (' in query['sql']]
+        self.assertEqual(len(locks), 1)
+        self.assertIn('ORDER BY "auth_user_holdings"."id"', locks[0])
+
+    def test_batch_is_all_or_nothing(self):
+        operations = [
+            {'op': 'update', 'id': self.holding.id, 'quantity': 20},
+            {'op': 'create', 'portfolio_name': "Unknown", 'symbol': "BAT", 'quantity': 4, 'purchase_price': '3.00'},
+        ]
+        response = self.client.post(reverse('holdings-batch'), {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+
+        operations = [{'op': 'update', 'id': self.holding.id, 'quantity': 20}, {'op': 'delete', 'id': self.holding.id, 'version': 1}]
+        response = self.client.post(reverse('holdings-batch'), {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(response.data['conflicts'], [{'index': 1, 'id': self.holding.id, 'version': 2}])
+        self.holding.refresh_from_db()
+        self.assertEqual((self.holding.quantity, self.holding.version), (10, 1))
+
+
+class SyncStocksTestCase(TestCase):
+    """
+    Test suite for the sync_stocks security-master command.
+    """
+    CSV = (
+        "symbol,name,exchange,sector,currency\n"
+        "aapl,Apple Inc.,xnas,Technology,usd\n"
+        "XOM,Exxon Mobil,XNYS,Energy,USD\n"
+        ",No Symbol,XNYS,Energy,USD\n"
+        "MSFT,Microsoft,XNAS,Technology,USDOLLAR\n"
+    )
+
+    def sync_file(self, content, suffix='.csv', **options):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('sync_stocks', handle.name, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_creates_and_updates_only_what_changed(self):
+        Stock.objects.create(symbol="XOM", name="XOM")
+        out, err = self.sync_file(self.CSV)
+        self.assertIn("Created 1 stocks, updated 1, 0 unchanged, 2 rows rejected.", out)
+        self.assertIn("Row 3:", err)
+        self.assertIn("Row 4:", err)
+        apple = Stock.objects.get(symbol="AAPL")
+        self.assertEqual((apple.name, apple.exchange, apple.sector, apple.currency), ("Apple Inc.", "XNAS", "Technology", "USD"))
+        self.assertEqual(Stock.objects.get(symbol="XOM").name, "Exxon Mobil")
+
+        # A second run finds nothing to write
+        with CaptureQueriesContext(connection) as queries:
+            out, _ = self.sync_file(self.CSV)
+        self.assertIn("Created 0 stocks, updated 0, 2 unchanged", out)
+        self.assertEqual(len(queries), 1)
+
+    def test_standard_input_is_left_open(self):
+        stdin = io.StringIO('{"symbol": "NVDA", "name": "NVIDIA"}\n')
+        out = io.StringIO()
+        with mock.patch('sys.stdin', stdin):
+            call_command('sync_stocks', '-', format='ndjson', stdout=out)
+        self.assertIn("Created 1 stocks", out.getvalue())
+        self.assertFalse(stdin.closed)
+
+    def test_missing_columns_keep_stored_values(self):
+        Stock.objects.create(symbol="XOM", name="Exxon Mobil", sector="Energy")
+        out, _ = self.sync_file(json.dumps([{'symbol': "XOM", 'exchange': "XNYS"}]), suffix='.json')
+        self.assertIn("updated 1", out)
+        stock = Stock.objects.get(symbol="XOM")
+        self.assertEqual((stock.name, stock.exchange, stock.sector), ("Exxon Mobil", "XNYS", "Energy"))
 
-   
\ No newline at end of file
+    def test_dry_run_writes_nothing(self):
+        out, _ = self.sync_file(self.CSV, dry_run=True)
+        self.assertIn("Would have created 2 stocks", out)
+        self.assertFalse(Stock.objects.exists())
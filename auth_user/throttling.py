@@ -0,0 +1,40 @@
+import hashlib
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class SettingsRateThrottle(SimpleRateThrottle):
+    """
+    Reads DEFAULT_THROTTLE_RATES when the throttle is built rather than when DRF is
+    imported, so override_settings(REST_FRAMEWORK=...) reaches the rates. A rate of
+    None turns the scope off.
+    """
+    @property
+    def THROTTLE_RATES(self):
+        return api_settings.DEFAULT_THROTTLE_RATES
+
+
+class LoginIPThrottle(SettingsRateThrottle):
+    """
+    Limits login attempts per client address (honours NUM_PROXIES).
+    """
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginAccountThrottle(SettingsRateThrottle):
+    """
+    Limits login attempts per email, whichever address they come from.
+    """
+    scope = 'login_account'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        # Hashed so arbitrary input is always a valid cache key
+        ident = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
@@ -1,16 +1,30 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserAuthViewSet, PortfolioViewSet, HoldingsViewSet
+from .views import (
+    UserAuthViewSet, PortfolioViewSet, HoldingsViewSet, ConsolidatedHoldingsViewSet, StockViewSet, TransactionViewSet,
+)
+from . import async_views
 
 # Create a router to automatically handle URL patterns for viewsets.
 router = DefaultRouter()
 router.register(r'portfolio', PortfolioViewSet, basename='portfolio')
+# Registered ahead of holdings, whose detail route would otherwise match 'consolidated' as an id
+router.register(r'holdings/consolidated', ConsolidatedHoldingsViewSet, basename='consolidated-holdings')
 router.register(r'holdings', HoldingsViewSet, basename='holdings')
+router.register(r'stocks', StockViewSet, basename='stocks')
+router.register(r'transactions', TransactionViewSet, basename='transactions')
 
 urlpatterns = [
     path('register/', UserAuthViewSet.as_view({'post': 'register'}), name='register'),
     path('login/', UserAuthViewSet.as_view({'post': 'login'}), name='login'),
+    path('onboard/', UserAuthViewSet.as_view({'post': 'onboard'}), name='onboard'),
+
+    # Async read endpoints, for ASGI deployments
+    path('async/portfolio/', async_views.portfolio_list, name='async-portfolio-list'),
+    path('async/portfolio/<int:pk>/', async_views.portfolio_detail, name='async-portfolio-detail'),
+    path('async/portfolio/<int:pk>/valuation/', async_views.portfolio_valuation, name='async-portfolio-valuation'),
+    path('async/holdings/', async_views.holdings_list, name='async-holdings-list'),
     
     # Includes the default router URLs
     path('', include(router.urls)),
@@ -0,0 +1,10 @@
+from itertools import islice
+
+
+def batched(iterable, size):
+    """
+    Yields lists of up to size items from iterable, consuming it lazily.
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
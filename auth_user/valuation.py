@@ -0,0 +1,155 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import DateField, OuterRef, Subquery, Value
+from django.utils import timezone
+
+from .models import Stock, StockPrice
+
+
+DEFAULT_WINDOW_DAYS = 30
+MONEY_QUANTUM = Decimal('0.0001')
+
+
+def price_rows(stock_ids, start, end):
+    """
+    (date, stock_id, close) rows for the stocks between start and end (inclusive), in
+    one query. Each stock's last close at or before start is dated start, so a stock
+    that did not trade on the first day of the window carries its previous close
+    instead of falling back to the purchase price until its first close in the window.
+    """
+    last_close = StockPrice.objects.filter(
+        stock_id=OuterRef('pk'), date__lte=start
+    ).order_by('-date').values('pk')[:1]
+    # One index seek per stock, rather than testing every stored close against a subquery
+    seeds = StockPrice.objects.filter(
+        pk__in=Stock.objects.filter(pk__in=stock_ids).annotate(last_close=Subquery(last_close)).values('last_close')
+    ).values_list(Value(start, output_field=DateField()), 'stock_id', 'close')
+    window = StockPrice.objects.filter(
+        stock_id__in=stock_ids, date__gt=start, date__lte=end
+    ).values_list('date', 'stock_id', 'close')
+    return seeds.union(window, all=True)
+
+
+def load_price_matrix(stock_ids, start, end):
+    """
+    Loads closing prices for the stocks between start and end (inclusive), seeded with
+    the last close before the window, in one query.
+    """
+    if not stock_ids:
+        return [], np.empty((0, 0))
+    return build_price_matrix(list(price_rows(stock_ids, start, end)), stock_ids)
+
+
+def build_price_matrix(rows, stock_ids):
+    """
+    Returns (dates, matrix) where matrix has one row per date and one column per entry
+    of stock_ids. Days a stock did not trade are forward filled from its previous close;
+    cells before a stock's first close in the window stay NaN. Rows for stocks outside
+    stock_ids are ignored.
+    """
+    if not stock_ids:
+        return [], np.empty((0, 0))
+    column_of = {stock_id: column for column, stock_id in enumerate(stock_ids)}
+    rows = [row for row in rows if row[1] in column_of]
+    if not rows:
+        return [], np.empty((0, len(stock_ids)))
+
+    row_dates, row_stocks, row_closes = zip(*rows)
+    dates, date_index = np.unique(np.array(row_dates, dtype='datetime64[D]'), return_inverse=True)
+    stock_index = np.fromiter((column_of[stock_id] for stock_id in row_stocks), dtype=np.intp, count=len(rows))
+
+    matrix = np.full((len(dates), len(stock_ids)), np.nan)
+    matrix[date_index, stock_index] = np.array(row_closes, dtype=float)
+    return dates.astype(object).tolist(), forward_fill(matrix)
+
+
+def valuation_window(start=None, end=None):
+    """
+    Fills in the default window: DEFAULT_WINDOW_DAYS ending today.
+    """
+    end = end or timezone.localdate()
+    return start or end - timedelta(days=DEFAULT_WINDOW_DAYS), end
+
+
+def forward_fill(matrix):
+    """
+    Replaces NaN cells with the last non-NaN value above them in the same column.
+    """
+    if not matrix.size:
+        return matrix
+    rows = np.where(np.isnan(matrix), 0, np.arange(matrix.shape[0])[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return matrix[rows, np.arange(matrix.shape[1])]
+
+
+def value_portfolio(holdings, start=None, end=None, rows=None):
+    """
+    Values a portfolio's holdings against the stored price history.
+
+    All arithmetic runs on NumPy arrays: market value per day is the price matrix times
+    the quantity vector, and daily returns are the ratio of consecutive market values.
+    Amounts come back as strings quantized to 4 places (see money); returns are floats.
+    A holding without any close in the window is valued at its purchase price.
+    Callers that already fetched the window's price rows pass them as `rows`.
+    """
+    holdings = list(holdings)
+    start, end = valuation_window(start, end)
+
+    quantities = np.array([h.quantity for h in holdings], dtype=float)
+    purchase_prices = np.array([h.purchase_price for h in holdings], dtype=float)
+    cost_basis = quantities * purchase_prices
+
+    stock_ids = [h.stock_id for h in holdings]
+    if rows is None:
+        dates, prices = load_price_matrix(stock_ids, start, end)
+    else:
+        dates, prices = build_price_matrix(rows, stock_ids)
+    # Cells with no close yet fall back to the purchase price, column by column
+    prices = np.where(np.isnan(prices), purchase_prices, prices)
+    series = prices @ quantities
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.nan_to_num(series[1:] / series[:-1] - 1, posinf=0.0, neginf=0.0)
+    last_prices = prices[-1] if len(dates) else purchase_prices
+    market_values = quantities * last_prices
+
+    return {
+        'start': start,
+        'end': end,
+        'cost_basis': money(cost_basis.sum()),
+        'market_value': money(market_values.sum()),
+        'unrealized_pnl': money((market_values - cost_basis).sum()),
+        'holdings': [
+            {
+                'id': holding.id,
+                'symbol': holding.stock.symbol,
+                'quantity': holding.quantity,
+                'cost_basis': money(cost_basis[i]),
+                'price': money(last_prices[i]),
+                'market_value': money(market_values[i]),
+                'unrealized_pnl': money(market_values[i] - cost_basis[i]),
+            }
+            for i, holding in enumerate(holdings)
+        ],
+        'series': [
+            {
+                'date': date,
+                'market_value': money(series[i]),
+                'daily_return': _round(returns[i - 1], 6) if i else None,
+            }
+            for i, date in enumerate(dates)
+        ],
+    }
+
+
+def money(value):
+    """
+    A float amount as a string with 4 decimal places, the way the API renders every
+    DecimalField, so amounts survive JSON without float noise.
+    """
+    return str(Decimal(str(float(value))).quantize(MONEY_QUANTUM))
+
+
+def _round(value, places=4):
+    return round(float(value), places)
@@ -1,14 +1,108 @@
-from rest_framework import viewsets, status
+from collections import defaultdict
+from datetime import date
+from itertools import islice
+from rest_framework import viewsets, status, mixins
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework.decorators import action
 from django.shortcuts import get_object_or_404
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.utils import timezone
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.authtoken.models import Token
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.db.models import Count, ExpressionWrapper, F, Min, Prefetch, Sum
+from django.db.models.functions import NullIf
 from rest_framework.filters import SearchFilter, OrderingFilter
-from .models import CustomUser, Portfolio, Holdings, Stock
-from .serializers import PortfolioSerializer, HoldingsSerializer, LoginSerializer, UserSerializer
+from django_filters.rest_framework import DjangoFilterBackend
+from .models import AMOUNT_FIELD, CustomUser, Portfolio, PortfolioSnapshot, Holdings, Stock, Transaction
+from .serializers import (
+    PortfolioSerializer, HoldingsSerializer, LoginSerializer, UserSerializer, StockSerializer, TransactionSerializer,
+    ConsolidatedHoldingSerializer, ValuesRowSerializer, get_query_list,
+)
+from .ledger import adjust_holding, record_transaction
+from .authentication import cache_token
+from .throttling import LoginIPThrottle, LoginAccountThrottle
+from .services import (
+    apply_holdings_batch, get_onboarding_config, import_holdings, iter_csv_rows, iter_ndjson_rows, onboard_users,
+)
+from .filters import AliasedOrderingFilter, HoldingsFilter, StocksFilter
+from .pagination import ConsolidatedPagination
+from .exports import EXPORT_FORMATS, stream_queryset
+from .valuation import value_portfolio
+from .analytics import MAX_TOP, cached_analytics, get_config as get_analytics_config
+from .snapshots import downsample
+from .response_cache import CachedReadMixin
+from .profiling import timed_serialization
+from .idempotency import IdempotentWriteMixin, check_version, get_expected_version
+from .routers import use_replicas
+
+
+HISTORY_INTERVALS = ('day', 'week', 'month')
+# Actions whose querysets follow ?fields= and ?expand=
+SPARSE_ACTIONS = ('list', 'retrieve')
+
+
+def get_date_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise serializers.ValidationError({name: "Enter a date in YYYY-MM-DD format."})
+
+
+def get_int_param(request, name, minimum, maximum):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        value = None
+    if value is None or not minimum <= value <= maximum:
+        raise serializers.ValidationError({name: f"Enter a whole number from {minimum} to {maximum}."})
+    return value
+
+
+def get_export_format(request):
+    # `format` is reserved by DRF for renderer selection, so exports use `as`
+    export_format = request.query_params.get('as', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        raise serializers.ValidationError({"as": f"Choose one of: {', '.join(EXPORT_FORMATS)}."})
+    return export_format
+
+
+class SparseFieldsViewMixin:
+    """
+    Reads ?fields= and ?expand= for the read actions, so get_queryset can load only
+    what the serializer will render.
+    """
+    def get_sparse_fields(self):
+        # None means the full representation
+        if self.action not in SPARSE_ACTIONS:
+            return None
+        return get_query_list(self.request, 'fields')
+
+    def is_expanded(self, name):
+        return self.action in SPARSE_ACTIONS and name in (get_query_list(self.request, 'expand') or ())
+
+    def get_values_columns(self, request, queryset, columns):
+        # Keyset pagination reads the cursor position from each row, so the ordering fields ride along
+        ordering = self.paginator.get_ordering(request, queryset, self) if self.paginator else ()
+        return list(dict.fromkeys([*columns, *(field.lstrip('-') for field in ordering)]))
+
+
+class ReplicaReadMixin:
+    """
+    Lets the read-only actions in replica_actions read from a database replica.
+    """
+    replica_actions = SPARSE_ACTIONS
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and self.action in self.replica_actions:
+            use_replicas(request.user.pk)
 
 
 class UserAuthViewSet(viewsets.GenericViewSet):
@@ -16,6 +110,17 @@ class UserAuthViewSet(viewsets.GenericViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = LoginSerializer
 
+    def get_permissions(self):
+        if self.action == 'onboard':
+            return [IsAdminUser()]
+        return super().get_permissions()
+
+    def get_throttles(self):
+        # Throttles run in initial(), so abusive attempts are rejected before any hashing
+        if self.action == 'login':
+            return [LoginIPThrottle(), LoginAccountThrottle()]
+        return super().get_throttles()
+
     @action(detail=False, methods=['post'])
     def register(self, request):
         serializer = UserSerializer(data=request.data)
@@ -37,32 +142,234 @@ class UserAuthViewSet(viewsets.GenericViewSet):
         serializer = LoginSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
-        token, created = Token.objects.get_or_create(user=user)
+        try:
+            # Loaded alongside the user by EmailTokenBackend, so this costs no query
+            token = user.auth_token
+        except Token.DoesNotExist:
+            token, created = Token.objects.get_or_create(user=user)
+        # Clients usually call the API right after logging in; spare them the token lookup
+        cache_token(token)
         return Response({'token': token.key, 'user_id': user.id}, status=status.HTTP_200_OK)
 
 
-class PortfolioViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def onboard(self, request):
+        """
+        Admin-only bulk creation of users and their tokens from a CSV (text/csv) body
+        streamed line by line, or a JSON array. Existing emails are skipped.
+
+        Passwords are hashed inline, so a request is capped at API_MAX_ROWS users;
+        bigger lists go through the onboard_users command, which hashes in a pool.
+        """
+        content_type = request.content_type.split(';')[0].strip()
+        if content_type == 'text/csv':
+            rows = iter_csv_rows(request.stream or [])
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            raise serializers.ValidationError({"error": "Expected a CSV or JSON array body."})
+
+        max_rows = get_onboarding_config()['API_MAX_ROWS']
+        rows = list(islice(rows, max_rows + 1))
+        if len(rows) > max_rows:
+            raise serializers.ValidationError({
+                "error": f"At most {max_rows} users per request; use the onboard_users command for larger lists."
+            })
+        created, skipped, errors = onboard_users(rows)
+        return Response(
+            {'created': created, 'skipped': skipped, 'errors': errors},
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+
+class PortfolioViewSet(ReplicaReadMixin, SparseFieldsViewMixin, CachedReadMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = PortfolioSerializer
+    replica_actions = ('list', 'retrieve', 'valuation', 'history', 'analytics')
 
     def get_queryset(self):
-        # Restrict queryset to portfolios owned by the current user
-        return Portfolio.objects.filter(user=self.request.user)
+        # Restrict queryset to portfolios owned by the current user.
+        # Holdings are prefetched in one query so listing stays constant in queries;
+        # with ?fields= the totals and holdings are only loaded when asked for.
+        fields = self.get_sparse_fields()
+        queryset = Portfolio.objects.filter(user=self.request.user)
+        if fields is not None:
+            queryset = queryset.only('id', *(fields & {'name', 'user'}))
+        if fields is None or fields & {'holding_count', 'cost_basis', 'total_value'}:
+            queryset = queryset.with_totals()
+        if fields is None or 'stocks' in fields or self.request.query_params.get('include'):
+            queryset = queryset.prefetch_related(Prefetch('holdings_set', queryset=self.get_holdings_queryset()))
+        return queryset.order_by('id')
+
+    def get_holdings_queryset(self):
+        # The holdings rendered under each portfolio's `stocks`. Their stocks are needed for
+        # ?expand=stock, quotes (?include=) and valuation, but not for a plain read.
+        queryset = Holdings.objects.with_total_amount().order_by('id')
+        if (self.action not in SPARSE_ACTIONS or self.is_expanded('stock')
+                or self.request.query_params.get('include')):
+            queryset = queryset.select_related('stock')
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # ?include= extras need model instances, so they keep the serializer path
+        if request.query_params.get('include'):
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(request, lambda: self.list_values(request))
+
+    def list_values(self, request):
+        # Read-only fast path: values() rows for the page and, when `stocks` is
+        # rendered, one query for their holdings
+        rows = ValuesRowSerializer(self.get_serializer())
+        portfolios = self.get_queryset().prefetch_related(None)
+        portfolios = portfolios.values(*self.get_values_columns(request, portfolios, rows.columns))
+        page = self.paginate_queryset(portfolios)
+        portfolios = list(portfolios) if page is None else page
+
+        if 'holdings_set' in rows.nested:
+            holdings = defaultdict(list)
+            for holding in self.get_holdings_queryset().filter(
+                portfolio_id__in=[portfolio['id'] for portfolio in portfolios]
+            ).values('portfolio_id', *rows.nested['holdings_set'].columns):
+                holdings[holding['portfolio_id']].append(holding)
+            for portfolio in portfolios:
+                portfolio['holdings_set'] = holdings[portfolio['id']]
+
+        with timed_serialization():
+            data = rows.to_representation(portfolios)
+        return Response(data) if page is None else self.get_paginated_response(data)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        portfolio = serializer.save(user=self.request.user)
+        # Reload through get_queryset so the response carries the annotated totals
+        serializer.instance = self.get_queryset().get(pk=portfolio.pk)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Streams the user's portfolios with their totals as CSV or NDJSON (?as=ndjson).
+        """
+        export_format = get_export_format(request)
+        queryset = Portfolio.objects.filter(user=request.user).with_totals().order_by('id')
+        fields = ['id', 'name', 'holding_count', 'cost_basis', 'total_value']
+        return stream_queryset(queryset, fields, export_format, 'portfolios')
 
+    @action(detail=True, methods=['get'])
+    def valuation(self, request, pk=None):
+        """
+        Values the portfolio against stored prices between ?start= and ?end= (YYYY-MM-DD):
+        market value, unrealized P&L per holding and the daily value/return series.
+        """
+        portfolio = self.get_object()
+        start, end = get_date_param(request, 'start'), get_date_param(request, 'end')
+        # Holdings (with their stocks) come from the prefetch in get_queryset
+        result = value_portfolio(portfolio.holdings_set.all(), start=start, end=end)
+        return Response({'portfolio': portfolio.id, **result})
 
-class HoldingsViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'])
+    def analytics(self, request, pk=None):
+        """
+        Weights per holding and sector, Herfindahl concentration, the ?top= largest
+        exposures and, from stored prices, volatility, Sharpe ratio, max drawdown and
+        beta against ?benchmark= (a symbol), all as of ?as_of= (YYYY-MM-DD, default today).
+        """
+        as_of = get_date_param(request, 'as_of') or timezone.localdate()
+        top = get_int_param(request, 'top', 1, MAX_TOP)
+        benchmark_id = None
+        benchmark = request.query_params.get('benchmark') or get_analytics_config()['BENCHMARK']
+        if benchmark:
+            benchmark_id = Stock.objects.filter(symbol=benchmark.strip().upper()).values_list('id', flat=True).first()
+            if benchmark_id is None:
+                raise serializers.ValidationError({"benchmark": "Unknown symbol."})
+
+        portfolio = get_object_or_404(Portfolio.objects.filter(user=request.user).only('id'), pk=pk)
+        result = cached_analytics(portfolio.id, as_of, benchmark_id, top)
+        return Response({'portfolio': portfolio.id, 'benchmark': benchmark and benchmark.strip().upper(), **result})
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """
+        Daily value history from the precomputed snapshots between ?start= and ?end=,
+        downsampled to the last day of each period with ?interval=week|month.
+        """
+        interval = request.query_params.get('interval', 'day')
+        if interval not in HISTORY_INTERVALS:
+            raise serializers.ValidationError({"interval": f"Choose one of: {', '.join(HISTORY_INTERVALS)}."})
+        start, end = get_date_param(request, 'start'), get_date_param(request, 'end')
+        portfolio = get_object_or_404(Portfolio.objects.filter(user=request.user).only('id'), pk=pk)
+
+        # One range scan of the (portfolio, date) unique index
+        snapshots = PortfolioSnapshot.objects.filter(portfolio=portfolio)
+        if start:
+            snapshots = snapshots.filter(date__gte=start)
+        if end:
+            snapshots = snapshots.filter(date__lte=end)
+        rows = snapshots.order_by('date').values_list('date', 'market_value', 'cost_basis', 'pnl')
+        fields = ('date', 'market_value', 'cost_basis', 'pnl')
+        return Response({
+            'portfolio': portfolio.id,
+            'interval': interval,
+            'points': [dict(zip(fields, row)) for row in downsample(rows, interval)],
+        })
+
+
+class StockViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only stock lookup. ?prefix= serves symbol autocomplete; StocksFilter
+    also offers exact and icontains lookups on symbol and name.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = StockSerializer
+    queryset = Stock.objects.all()
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_class = StocksFilter
+    ordering_fields = ['symbol', 'name']
+    ordering = ['symbol']
+
+
+class HoldingsViewSet(ReplicaReadMixin, SparseFieldsViewMixin, CachedReadMixin, IdempotentWriteMixin,
+                      viewsets.ModelViewSet):
+    """
+    CRUD on the user's holdings. Writes honour Idempotency-Key, and updates and deletes
+    sent with If-Match (or a `version` field) are refused once the holding has changed.
+    """
     permission_classes = [IsAuthenticated]
     serializer_class = HoldingsSerializer
-    filter_backends = [SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filterset_class = HoldingsFilter
     search_fields = ['stock__symbol', 'stock__name']
     ordering_fields = ['quantity', 'purchase_price', 'purchase_date']
 
     def get_queryset(self):
-        # Restrict queryset to holdings within the user's portfolio
-        return Holdings.objects.filter(portfolio__user=self.request.user)
+        # Restrict queryset to holdings within the user's portfolio.
+        # Reads load the stock only for ?expand=stock; writes need it for the ledger.
+        fields = self.get_sparse_fields()
+        join_stock = self.action not in SPARSE_ACTIONS or self.is_expanded('stock')
+        queryset = Holdings.objects.filter(portfolio__user=self.request.user)
+        if fields is not None:
+            # Ordering fields stay loaded, since pagination reads the cursor position from them
+            ordering = OrderingFilter().get_ordering(self.request, queryset, self) or ()
+            columns = fields & {'quantity', 'purchase_price', 'purchase_date', 'version'}
+            columns |= {field.lstrip('-') for field in ordering}
+            queryset = queryset.only('id', *columns, *(['stock'] if join_stock else []))
+        if fields is None or 'total_amount' in fields:
+            queryset = queryset.with_total_amount()
+        if join_stock:
+            queryset = queryset.select_related('stock')
+        return queryset.order_by('id')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: self.list_values(request))
+
+    def list_values(self, request):
+        # Read-only fast path: filtered and paginated values() rows instead of model instances
+        rows = ValuesRowSerializer(self.get_serializer())
+        holdings = self.filter_queryset(self.get_queryset())
+        holdings = holdings.values(*self.get_values_columns(request, holdings, rows.columns))
+        page = self.paginate_queryset(holdings)
+        holdings = list(holdings) if page is None else page
+        with timed_serialization():
+            data = rows.to_representation(holdings)
+        return Response(data) if page is None else self.get_paginated_response(data)
 
     def perform_create(self, serializer):
         # Get the portfolio name and symbol from the request data
@@ -92,5 +399,193 @@ class HoldingsViewSet(viewsets.ModelViewSet):
         validated_data.pop('portfolio_name', None)
         validated_data.pop('symbol', None)
         
-        # Save the serializer instance with the correct related objects
-        serializer.save(portfolio=user_portfolio, stock=stock)
+        # Save the serializer instance with the correct related objects, recording the
+        # opening buy in the ledger. The savepoint lets a duplicate holding fail cleanly.
+        try:
+            with transaction.atomic():
+                holding = serializer.save(portfolio=user_portfolio, stock=stock)
+                Transaction.objects.create(
+                    portfolio=user_portfolio, stock=stock, kind=Transaction.BUY,
+                    quantity=holding.quantity, price=holding.purchase_price
+                )
+        except IntegrityError:
+            raise serializers.ValidationError({"error": "This stock already exists in your portfolio."})
+
+    def perform_update(self, serializer):
+        # The row is re-read under a lock, so the version check and the write see the same state.
+        # Quantity and price are the only writable fields, and they change through the ledger.
+        expected = get_expected_version(self.request)
+        data = serializer.validated_data
+        with transaction.atomic():
+            holding = get_object_or_404(
+                Holdings.objects.select_for_update(of=('self',)).select_related('portfolio', 'stock'),
+                pk=serializer.instance.pk,
+            )
+            check_version(holding, expected)
+            serializer.instance = adjust_holding(holding, data.get('quantity'), data.get('purchase_price'))
+
+    def perform_destroy(self, instance):
+        expected = get_expected_version(self.request)
+        with transaction.atomic():
+            holding = get_object_or_404(
+                Holdings.objects.select_for_update(of=('self',)).select_related('portfolio', 'stock'), pk=instance.pk
+            )
+            check_version(holding, expected)
+            # Closing a position is a sale of every remaining share
+            record_transaction(holding.portfolio, holding.stock, Transaction.SELL, quantity=holding.quantity)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Applies a list of create, update and delete operations in one transaction,
+        all or nothing: {"operations": [{"op": "update", "id": 7, "version": 3, "quantity": 5}, ...]}.
+        """
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        return self.idempotent_response(
+            request, lambda: Response({'results': apply_holdings_batch(request.user, operations)})
+        )
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_import(self, request):
+        """
+        Imports many holdings at once from a JSON array, or a CSV (text/csv) or
+        NDJSON (application/x-ndjson) body that is read line by line.
+        """
+        content_type = request.content_type.split(';')[0].strip()
+        if content_type == 'text/csv':
+            rows = iter_csv_rows(request.stream or [])
+        elif content_type in ('application/x-ndjson', 'application/jsonl'):
+            rows = iter_ndjson_rows(request.stream or [])
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            raise serializers.ValidationError({"error": "Expected a JSON array, CSV or NDJSON body."})
+
+        created, errors = import_holdings(request.user, rows)
+        return Response(
+            {'created': created, 'errors': errors},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Streams the user's holdings as CSV or NDJSON (?as=ndjson), honouring the
+        HoldingsFilter ranges as well as search and ordering.
+        """
+        export_format = get_export_format(request)
+        queryset = self.filter_queryset(self.get_queryset()).annotate(
+            portfolio_name=F('portfolio__name'), symbol=F('stock__symbol')
+        )
+        fields = ['id', 'portfolio_name', 'symbol', 'quantity', 'purchase_price', 'purchase_date', 'total_amount']
+        return stream_queryset(queryset, fields, export_format, 'holdings')
+
+
+class ConsolidatedHoldingsViewSet(ReplicaReadMixin, CachedReadMixin, viewsets.GenericViewSet):
+    """
+    The user's holdings across all portfolios, one row per stock: total quantity,
+    quantity-weighted average cost, cost basis and the per-portfolio breakdown.
+
+    Filters, search and ordering names are those of HoldingsViewSet. Filters and search
+    pick the holdings that are combined; ordering applies to the combined figures
+    (quantity sorts by total quantity, purchase_price by average cost, purchase_date by
+    the first purchase). The totals for a page are one GROUP BY query and its breakdown
+    one more, however many portfolios the user has.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = ConsolidatedHoldingSerializer
+    pagination_class = ConsolidatedPagination
+    filter_backends = [DjangoFilterBackend, SearchFilter, AliasedOrderingFilter]
+    filterset_class = HoldingsFilter
+    search_fields = HoldingsViewSet.search_fields
+    ordering_fields = HoldingsViewSet.ordering_fields
+    ordering_aliases = {
+        'quantity': 'total_quantity',
+        'purchase_price': 'average_cost',
+        'purchase_date': 'first_purchase_date',
+    }
+
+    def get_queryset(self):
+        # Filters on holdings columns stay in the WHERE clause, ahead of the grouping
+        cost = ExpressionWrapper(F('quantity') * F('purchase_price'), output_field=AMOUNT_FIELD)
+        return (
+            Holdings.objects.filter(portfolio__user=self.request.user)
+            .values('stock_id')
+            .annotate(
+                symbol=F('stock__symbol'),
+                name=F('stock__name'),
+                total_quantity=Sum('quantity'),
+                cost_basis=Sum(cost),
+                first_purchase_date=Min('purchase_date'),
+                portfolio_count=Count('portfolio_id'),
+            )
+            .annotate(average_cost=ExpressionWrapper(
+                F('cost_basis') / NullIf(F('total_quantity'), 0), output_field=AMOUNT_FIELD
+            ))
+            .order_by('stock_id')
+        )
+
+    def filter_holdings(self, queryset):
+        # The filter and search backends, without the ordering on combined figures
+        for backend in self.filter_backends:
+            if not issubclass(backend, OrderingFilter):
+                queryset = backend().filter_queryset(self.request, queryset, self)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: self.list_positions(request))
+
+    def list_positions(self, request):
+        positions = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(positions)
+        positions = list(positions) if page is None else page
+
+        holdings = self.filter_holdings(
+            Holdings.objects.filter(portfolio__user=request.user, stock_id__in=[row['stock_id'] for row in positions])
+        ).with_total_amount().order_by('stock_id', 'portfolio__name', 'portfolio_id').values(
+            'stock_id', 'portfolio_id', 'quantity', 'purchase_price', 'purchase_date', 'total_amount',
+            portfolio_name=F('portfolio__name'),
+        )
+        breakdown = defaultdict(list)
+        for row in holdings:
+            breakdown[row.pop('stock_id')].append(row)
+        for row in positions:
+            row['portfolios'] = breakdown[row['stock_id']]
+
+        data = self.get_serializer(positions, many=True).data
+        return Response(data) if page is None else self.get_paginated_response(data)
+
+
+class TransactionViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                         viewsets.GenericViewSet):
+    """
+    Append-only ledger of buys, sells, dividends and splits. Recording a transaction
+    updates the matching holding in place; entries are never edited or deleted.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = TransactionSerializer
+    filter_backends = [SearchFilter, OrderingFilter]
+    search_fields = ['stock__symbol', 'portfolio__name']
+    ordering_fields = ['trade_date']
+
+    def get_queryset(self):
+        # Restrict queryset to transactions within the user's portfolios
+        return (
+            Transaction.objects.filter(portfolio__user=self.request.user)
+            .select_related('portfolio', 'stock')
+            .order_by('id')
+        )
+
+    def perform_create(self, serializer):
+        data = dict(serializer.validated_data)
+        portfolio_name = data.pop('portfolio')['name']
+        symbol = data.pop('stock')['symbol'].strip().upper()
+
+        try:
+            portfolio = get_object_or_404(Portfolio, name=portfolio_name, user=self.request.user)
+        except Exception:
+            raise serializers.ValidationError({"portfolio_name": "Invalid portfolio name or you do not have permission to access this portfolio."})
+        stock, created = Stock.objects.get_or_create(symbol=symbol, defaults={'name': symbol})
+
+        serializer.instance = record_transaction(portfolio, stock, **data)
+
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'auth_user.middleware.RequestProfilingMiddleware',
+    'auth_user.middleware.DatabaseRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,9 +87,28 @@ DATABASES = {
         'PASSWORD': 'Roselineofori1.', 
         'HOST': 'localhost',
         'PORT': '5432',  
+        # Keep connections open across requests instead of reconnecting each time, and
+        # check them before reuse so a connection dropped by the server is replaced
+        'CONN_MAX_AGE': 300,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas of default, e.g. DATABASE_REPLICA_HOSTS=10.0.0.5,10.0.0.6. Under tests
+# they mirror default, so they see the test data.
+for number, host in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['auth_user.routers.PrimaryReplicaRouter']
+
+# Safe portfolio/holdings reads go to REPLICAS. A user who wrote reads from the primary for
+# STICKY_SECONDS; keep it above the replica lag. CACHE must be shared across processes.
+DATABASE_ROUTING = {
+    'REPLICAS': [alias for alias in DATABASES if alias != 'default'],
+    'STICKY_SECONDS': 5,
+    'CACHE': 'default',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -107,6 +129,25 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# https://docs.djangoproject.com/en/5.2/topics/auth/passwords/
+# The first hasher is used for new passwords. The rest only verify older hashes, which
+# are re-hashed with the first one on the user's next successful login. Put
+# ScryptPasswordHasher first to avoid the argon2-cffi dependency.
+
+PASSWORD_HASHERS = [
+    'auth_user.hashers.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+# Fetches the user's token in the same query as the credential check
+AUTHENTICATION_BACKENDS = [
+    'auth_user.backends.EmailTokenBackend',
+]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -135,11 +176,108 @@ AUTH_USER_MODEL = 'auth_user.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'auth_user.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'auth_user.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'auth_user.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 50,
+    # Login throttles count in the default cache; use a shared one with several workers
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '60/min',
+        'login_account': '10/min',
+    },
+}
+
+# Token lookup cache used by CachedTokenAuthentication. Set SHARED_CACHE to a CACHES alias
+# (e.g. a Redis/Memcached backend) to share entries and evictions across processes.
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    'SHARED_CACHE': None,
+    'SHARED_TTL': 300,
+}
+
+# Per-user cache of portfolio/holdings reads with ETags. CACHE must name a shared backend
+# (Redis/Memcached) in CACHES when more than one process serves the API.
+RESPONSE_CACHE = {
+    'ENABLED': True,
+    'CACHE': 'default',
+    'TTL': 300,
+}
+
+# Quote source for ?include=market_value. LocalQuoteProvider reads a JSON ({"AAPL": "190.5"})
+# or CSV (symbol,price) file; point BACKEND at another QuoteProvider for live prices.
+QUOTE_PROVIDER = {
+    'BACKEND': 'auth_user.quotes.LocalQuoteProvider',
+    'OPTIONS': {'path': BASE_DIR / 'quotes.json'},
+    'TTL': 15,
+    'MAX_SIZE': 10000,
+    'BATCH_SIZE': 100,
+}
+
+# Defaults for /portfolio/{id}/analytics/. BENCHMARK is the symbol beta is measured against
+# when the request gives no ?benchmark=; None leaves beta out.
+PORTFOLIO_ANALYTICS = {
+    'WINDOW_DAYS': 365,
+    'TOP': 5,
+    'BENCHMARK': None,
+    'RISK_FREE_RATE': 0.0,
+}
+
+# Idempotency-Key replays for holdings writes. A stored response is kept for TTL seconds;
+# clients retrying later than that run the write again.
+IDEMPOTENCY = {
+    'TTL': 24 * 60 * 60,
+}
+
+# Profile photo pipeline run by `manage.py process_photos`. Uploads are validated from their
+# header, stored as-is and queued; the worker writes a MAX_SIZE photo plus thumbnails.
+PROFILE_PHOTOS = {
+    'MAX_SIZE': 1024,
+    'THUMBNAIL_SIZES': (256, 128, 64),
+    'THUMBNAIL_FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 82,
+}
+
+# Bulk onboarding through POST /onboard/ (admins only). The API hashes passwords in the request
+# and takes at most API_MAX_ROWS users; the onboard_users command hashes across --workers processes.
+USER_ONBOARDING = {
+    'BATCH_SIZE': 1000,
+    'API_MAX_ROWS': 100,
+}
+
+# Per-request SQL/timing instrumentation. SAMPLE_RATE is the fraction of requests profiled;
+# 0 removes the middleware entirely. Profiled requests log one JSON line to LOGGER.
+REQUEST_PROFILING = {
+    'SAMPLE_RATE': 0,
+    'LOGGER': 'auth_user.profiling',
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'profiling': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'auth_user.profiling': {
+            'handlers': ['profiling'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
 
 #YAHOO_FINANCE_API_KEY = 'lDsVOlmP4xIv4adyCEE7du8aSt41_ORg'
\ No newline at end of file